@@ -23,6 +23,8 @@ from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins import base as plugins_base
 from cloudbaseinit.plugins import factory as plugins_factory
+from cloudbaseinit.plugins import scheduler as plugins_scheduler
+from cloudbaseinit.utils import tracing
 
 opts = [
     cfg.BoolOpt('allow_reboot', default=True, help='Allows OS reboots '
@@ -30,6 +32,14 @@ opts = [
     cfg.BoolOpt('stop_service_on_exit', default=True, help='In case of '
                 'execution as a service, specifies if the service '
                 'must be gracefully stopped before exiting'),
+    cfg.IntOpt('plugins_max_workers', default=1, help='Maximum number of '
+               'plugins executed concurrently. Plugins are executed in '
+               'parallel only if the shared data and services they declare '
+               'do not conflict'),
+    cfg.BoolOpt('coalesce_reboots', default=False, help='When a plugin '
+                'requests a reboot, keeps on executing the following '
+                'plugins that can safely run before the reboot, '
+                'coalescing multiple reboot requests in a single reboot'),
 ]
 
 CONF = cfg.CONF
@@ -41,13 +51,28 @@ LOG = logging.getLogger(__name__)
 class InitManager(object):
     _PLUGINS_CONFIG_SECTION = 'Plugins'
 
+    def __init__(self):
+        self._plugins_status = None
+        self._reboot_requests = []
+
+    def _load_plugins_status(self, osutils):
+        try:
+            self._plugins_status = osutils.get_config_values(
+                self._PLUGINS_CONFIG_SECTION)
+        except NotImplementedError:
+            self._plugins_status = None
+
     def _get_plugin_status(self, osutils, plugin_name):
+        if self._plugins_status is not None:
+            return self._plugins_status.get(plugin_name)
         return osutils.get_config_value(plugin_name,
                                         self._PLUGINS_CONFIG_SECTION)
 
     def _set_plugin_status(self, osutils, plugin_name, status):
         osutils.set_config_value(plugin_name, status,
                                  self._PLUGINS_CONFIG_SECTION)
+        if self._plugins_status is not None:
+            self._plugins_status[plugin_name] = status
 
     def _exec_plugin(self, osutils, service, plugin, shared_data):
         plugin_name = plugin.get_name()
@@ -60,9 +85,12 @@ class InitManager(object):
             LOG.info('Executing plugin \'%(plugin_name)s\'' %
                      locals())
             try:
-                (status, reboot_required) = plugin.execute(service,
-                                                           shared_data)
+                with tracing.span(plugin_name, 'plugin'):
+                    (status, reboot_required) = plugin.execute(service,
+                                                               shared_data)
                 self._set_plugin_status(osutils, plugin_name, status)
+                if reboot_required:
+                    self._reboot_requests.append(plugin_name)
                 return reboot_required
             except Exception, ex:
                 LOG.error('plugin \'%(plugin_name)s\' failed '
@@ -89,32 +117,84 @@ class InitManager(object):
                               'supported' % plugin_name)
         return supported
 
-    def configure_host(self):
-        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
-        osutils.wait_for_boot_completion()
+    def _can_run_before_reboot(self, osutils, plugin):
+        # Plugins already executed are skipped in any case
+        return (plugin.get_reboot_policy() ==
+                plugins_base.PLUGIN_REBOOT_TOLERANT or
+                self._get_plugin_status(osutils, plugin.get_name()) ==
+                plugins_base.PLUGIN_EXECUTION_DONE)
+
+    def _exec_plugins_parallel(self, osutils, service, plugins, shared_data,
+                               coalesce_reboots=False):
+        if coalesce_reboots:
+            can_run_before_reboot = (
+                lambda plugin: self._can_run_before_reboot(osutils, plugin))
+        else:
+            can_run_before_reboot = None
 
-        mdsf = metadata_factory.MetadataServiceFactory()
-        service = mdsf.get_metadata_service()
-        LOG.info('Metadata service loaded: \'%s\'' %
-                 service.get_name())
+        plugin_scheduler = plugins_scheduler.PluginScheduler(
+            plugins, CONF.plugins_max_workers)
+        return plugin_scheduler.execute(
+            lambda plugin: self._exec_plugin(osutils, service, plugin,
+                                             shared_data),
+            CONF.allow_reboot, can_run_before_reboot)
 
-        plugins = plugins_factory.PluginFactory().load_plugins()
+    def configure_host(self):
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        with tracing.span('wait_for_boot_completion'):
+            osutils.wait_for_boot_completion()
+
+        plugins = [p for p in plugins_factory.PluginFactory().load_plugins()
+                   if self._check_plugin_os_requirements(osutils, p)]
+
+        self._load_plugins_status(osutils)
+        pending_plugins = [p for p in plugins if self._get_plugin_status(
+            osutils, p.get_name()) != plugins_base.PLUGIN_EXECUTION_DONE]
+        if pending_plugins:
+            # A failed discovery is raised before executing any plugin
+            mdsf = metadata_factory.MetadataServiceFactory()
+            service = mdsf.get_metadata_service()
+            LOG.info('Metadata service loaded: \'%s\'' %
+                     service.get_name())
+        else:
+            LOG.info('All plugins already executed, skipping metadata '
+                     'service discovery')
+            plugins = []
+            service = None
 
         plugins_shared_data = {}
+        coalesce_reboots = CONF.allow_reboot and CONF.coalesce_reboots
 
         reboot_required = False
         try:
-            for plugin in plugins:
-                if self._check_plugin_os_requirements(osutils, plugin):
+            if CONF.plugins_max_workers > 1:
+                reboot_required = self._exec_plugins_parallel(
+                    osutils, service, plugins, plugins_shared_data,
+                    coalesce_reboots)
+            else:
+                for plugin in plugins:
+                    if (reboot_required and coalesce_reboots and
+                            not self._can_run_before_reboot(osutils, plugin)):
+                        LOG.info('Plugin \'%s\' will be executed after the '
+                                 'pending reboot' % plugin.get_name())
+                        break
                     if self._exec_plugin(osutils, service, plugin,
                                          plugins_shared_data):
                         reboot_required = True
-                        if CONF.allow_reboot:
+                        if CONF.allow_reboot and not coalesce_reboots:
                             break
         finally:
-            service.cleanup()
+            if service is not None:
+                service.cleanup()
+            tracing.save()
 
         if reboot_required and CONF.allow_reboot:
+            reboot_requests = len(self._reboot_requests)
+            if coalesce_reboots and reboot_requests > 1:
+                LOG.info('Coalesced %(reboot_requests)d reboot requests in '
+                         'a single reboot, %(saved)d reboots saved' %
+                         {'reboot_requests': reboot_requests,
+                          'saved': reboot_requests - 1})
             try:
                 osutils.reboot()
             except Exception, ex:
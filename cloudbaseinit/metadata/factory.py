@@ -14,10 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 from oslo.config import cfg
 
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.utils import classloader
+from cloudbaseinit.utils import threadpool
+from cloudbaseinit.utils import tracing
 
 opts = [
     cfg.ListOpt('metadata_services',
@@ -30,7 +34,12 @@ opts = [
                 help='List of enabled metadata service classes, '
                 'to be tested fro availability in the provided order. '
                 'The first available service will be used to retrieve '
-                'metadata')
+                'metadata'),
+    cfg.BoolOpt('metadata_services_parallel_discovery', default=False,
+                help='Tests the availability of all the enabled metadata '
+                'services concurrently. The first available service in the '
+                'order provided in "metadata_services" is used, regardless '
+                'of which service completes loading first'),
 ]
 
 CONF = cfg.CONF
@@ -40,14 +49,78 @@ LOG = logging.getLogger(__name__)
 
 class MetadataServiceFactory(object):
     def get_metadata_service(self):
+        if CONF.metadata_services_parallel_discovery:
+            return self._get_metadata_service_parallel()
+
         # Return the first service that loads correctly
         cl = classloader.ClassLoader()
         for class_path in CONF.metadata_services:
             service = cl.load_class(class_path)()
             try:
-                if service.load():
+                if self._load_service(service):
                     return service
             except Exception, ex:
                 LOG.error('Failed to load metadata service \'%(class_path)s\'')
                 LOG.exception(ex)
         raise Exception("No available service found")
+
+    def _load_service(self, service):
+        with tracing.span('%s.load' % service.get_name(), 'metadata'):
+            return service.load()
+
+    def _discard_service(self, service):
+        try:
+            service.cleanup()
+        except Exception, ex:
+            LOG.error('Failed to cleanup metadata service \'%s\'' %
+                      service.get_name())
+            LOG.exception(ex)
+
+    def _get_metadata_service_parallel(self):
+        cl = classloader.ClassLoader()
+        services = [cl.load_class(class_path)()
+                    for class_path in CONF.metadata_services]
+        if not services:
+            raise Exception("No available service found")
+
+        lock = threading.Lock()
+        loaded = [threading.Event() for service in services]
+        results = [False] * len(services)
+        selected = []
+
+        def _load_service(i):
+            service = services[i]
+            try:
+                results[i] = self._load_service(service)
+            except Exception, ex:
+                LOG.error('Failed to load metadata service \'%s\'' %
+                          service.get_name())
+                LOG.exception(ex)
+
+            with lock:
+                discard = bool(selected) and service is not selected[0]
+                loaded[i].set()
+            if discard:
+                # Completed after another service has been selected
+                self._discard_service(service)
+
+        # Services still loading after the selection are not waited for
+        for i in range(len(services)):
+            threadpool.start_thread(_load_service, i)
+
+        for (i, service) in enumerate(services):
+            loaded[i].wait()
+            if results[i]:
+                with lock:
+                    selected.append(service)
+                    discarded = [s for (j, s) in enumerate(services)
+                                 if j != i and loaded[j].is_set()]
+
+                for other_service in services:
+                    if other_service is not service:
+                        other_service.cancel()
+                for other_service in discarded:
+                    self._discard_service(other_service)
+                return service
+
+        raise Exception("No available service found")
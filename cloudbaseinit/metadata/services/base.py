@@ -16,20 +16,44 @@
 
 import abc
 import json
+import os
 import posixpath
-import time
 
 from oslo.config import cfg
 
+from cloudbaseinit.metadata.services import cache
+from cloudbaseinit.metadata.services import retrypolicy
 from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.utils import tracing
 
 opts = [
     cfg.IntOpt('retry_count', default=5,
                help='Max. number of attempts for fetching metadata in '
                'case of transient errors'),
     cfg.FloatOpt('retry_count_interval', default=4,
-                 help='Interval between attempts in case of transient errors, '
-                 'expressed in seconds'),
+                 help='Base interval between attempts in case of transient '
+                 'errors, expressed in seconds. The interval is doubled '
+                 'after each attempt and randomized to avoid many hosts '
+                 'retrying at the same time'),
+    cfg.FloatOpt('retry_max_interval', default=30,
+                 help='Max. interval between attempts in case of transient '
+                 'errors, expressed in seconds'),
+    cfg.FloatOpt('retry_deadline', default=300,
+                 help='Time after which failed metadata requests are no '
+                 'longer retried, expressed in seconds. Set to 0 for no '
+                 'deadline'),
+    cfg.FloatOpt('metadata_request_timeout', default=30,
+                 help='Timeout of a single metadata request, expressed in '
+                 'seconds'),
+    cfg.StrOpt('metadata_cache_dir', default=None,
+               help='Local directory where the metadata is cached across '
+               'reboots. The cache is invalidated when the instance id '
+               'changes. User data and metadata containing passwords are '
+               'never cached. The directory is created accessible only by '
+               'SYSTEM and the Administrators, the cache is disabled if an '
+               'existing directory is not. Set to None (default) to '
+               'disable.'),
 ]
 
 CONF = cfg.CONF
@@ -37,21 +61,28 @@ CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
+# Metadata keys containing secrets, which must not be written to disk
+_SECRET_KEYS = ['admin_pass']
 
-class NotExistingMetadataException(Exception):
+
+class NotExistingMetadataException(retrypolicy.FatalError):
     pass
 
 
 class BaseMetadataService(object):
     def __init__(self):
         self._cache = {}
+        self._disk_cache = None
+        self._enable_disk_cache = False
         self._enable_retry = False
+        self._cancelled = False
 
     def get_name(self):
         return self.__class__.__name__
 
     def load(self):
         self._cache = {}
+        self._disk_cache = None
 
     @property
     def can_post_password(self):
@@ -61,28 +92,89 @@ class BaseMetadataService(object):
     def _get_data(self, path):
         pass
 
-    def _exec_with_retry(self, action):
-        i = 0
-        while True:
+    def _get_retry_policy(self):
+        if not self._enable_retry:
+            return retrypolicy.RetryPolicy(0, 0)
+        return retrypolicy.RetryPolicy(CONF.retry_count,
+                                       CONF.retry_count_interval,
+                                       CONF.retry_max_interval,
+                                       CONF.retry_deadline)
+
+    def _exec_with_retry(self, action, span_name=None):
+        with tracing.span(span_name or 'metadata request', 'metadata') as span:
+            return self._get_retry_policy().execute(
+                action, lambda: self._cancelled,
+                lambda retry: span.set_arg('retries', retry))
+
+    def get_instance_id(self):
+        return self.get_meta_data('openstack').get('uuid')
+
+    def _create_disk_cache_dir(self):
+        cache_dir = os.path.join(CONF.metadata_cache_dir, self.get_name())
+        # The cached data is trusted on the next boots, e.g. the public keys
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        osutils.create_private_directory(cache_dir)
+        return cache_dir
+
+    def _get_disk_cache(self):
+        if self._disk_cache is None:
+            # Avoids recursion, as the instance id is retrieved from the
+            # metadata itself
+            self._disk_cache = False
+            if self._enable_disk_cache and CONF.metadata_cache_dir:
+                try:
+                    instance_id = self.get_instance_id()
+                    if instance_id:
+                        disk_cache = cache.MetadataDiskCache(
+                            self._create_disk_cache_dir())
+                        disk_cache.validate(instance_id)
+                        self._disk_cache = disk_cache
+                except Exception, ex:
+                    LOG.error('Failed to load the metadata cache')
+                    LOG.exception(ex)
+        return self._disk_cache
+
+    def _is_disk_cacheable(self, path, data):
+        if posixpath.basename(path) in ['user_data', 'password']:
+            # Passwords, and user data can contain any kind of secret
+            return False
+        if isinstance(data, str) and path.endswith('.json'):
             try:
-                return action()
-            except NotExistingMetadataException:
-                raise
-            except:
-                if self._enable_retry and i < CONF.retry_count:
-                    i += 1
-                    time.sleep(CONF.retry_count_interval)
-                else:
-                    raise
+                data = json.loads(data)
+            except ValueError:
+                return False
+        if isinstance(data, dict):
+            return not [k for k in _SECRET_KEYS if data.get(k)]
+        return True
 
     def _get_cache_data(self, path):
         if path in self._cache:
             LOG.debug("Using cached copy of metadata: '%s'" % path)
             return self._cache[path]
-        else:
-            data = self._exec_with_retry(lambda: self._get_data(path))
-            self._cache[path] = data
-            return data
+
+        disk_cache = self._get_disk_cache()
+        if path in self._cache:
+            # Fetched while validating the disk cache
+            return self._cache[path]
+
+        data = None
+        if disk_cache:
+            data = disk_cache.get(path)
+            if data is not None:
+                LOG.debug("Using disk cached copy of metadata: '%s'" % path)
+
+        if data is None:
+            data = self._exec_with_retry(lambda: self._get_data(path),
+                                         '_get_data %s' % path)
+            if disk_cache and data and self._is_disk_cacheable(path, data):
+                try:
+                    disk_cache.set(path, data)
+                except Exception, ex:
+                    LOG.error("Failed to cache metadata: '%s'" % path)
+                    LOG.exception(ex)
+
+        self._cache[path] = data
+        return data
 
     def get_content(self, data_type, name):
         path = posixpath.normpath(
@@ -118,7 +210,12 @@ class BaseMetadataService(object):
     def post_password(self, enc_password_b64, version='latest'):
         path = self._get_password_path(version)
         action = lambda: self._post_data(path, enc_password_b64)
-        return self._exec_with_retry(action)
+        return self._exec_with_retry(action, '_post_data %s' % path)
+
+    def cancel(self):
+        # Stops retrying pending requests, e.g. when another service has
+        # already been selected during a concurrent discovery
+        self._cancelled = True
 
     def cleanup(self):
         pass
@@ -0,0 +1,121 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class MetadataDiskCache(object):
+    """Metadata cache persisted across reboots.
+
+    The cached data is trusted, so cache_dir must already exist and be
+    accessible only by privileged users.
+    """
+
+    _INDEX_FILE_NAME = 'index.json'
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, self._INDEX_FILE_NAME)
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _get_file_path(self, path):
+        return os.path.join(self._cache_dir, self._get_hash(path))
+
+    def _write_file(self, path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        # os.rename does not overwrite existing files on Windows
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, 'rb') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _save_index(self):
+        self._write_file(self._index_path, json.dumps(self._index))
+
+    def _clear_cache_dir(self):
+        # The directory itself is kept along with its permissions
+        for name in os.listdir(self._cache_dir):
+            path = os.path.join(self._cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def validate(self, instance_id):
+        with self._lock:
+            index = self._read_index()
+            if index and index.get('instance_id') == instance_id:
+                LOG.debug('Using metadata cache: \'%s\'' % self._cache_dir)
+                self._index = index
+            else:
+                if index:
+                    LOG.info('Instance id changed, invalidating the metadata '
+                             'cache: \'%s\'' % self._cache_dir)
+                self._clear_cache_dir()
+                self._index = {'instance_id': instance_id, 'entries': {}}
+                self._save_index()
+
+    def get(self, path):
+        with self._lock:
+            entry = self._index['entries'].get(path)
+            if not entry:
+                return None
+
+            try:
+                with open(self._get_file_path(path), 'rb') as f:
+                    data = f.read()
+            except IOError:
+                data = None
+
+            if data is None or self._get_hash(data) != entry['hash']:
+                LOG.warning('Invalid metadata cache entry: \'%s\'' % path)
+                del self._index['entries'][path]
+                self._save_index()
+                return None
+
+            if entry['json']:
+                data = json.loads(data)
+            return data
+
+    def set(self, path, data):
+        is_json = not isinstance(data, str)
+        if is_json:
+            data = json.dumps(data)
+
+        with self._lock:
+            self._write_file(self._get_file_path(path), data)
+            self._index['entries'][path] = {'hash': self._get_hash(data),
+                                            'json': is_json}
+            self._save_index()
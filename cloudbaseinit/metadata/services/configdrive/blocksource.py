@@ -0,0 +1,224 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import mmap
+import os
+import threading
+
+
+class BaseBlockSource(object):
+    """Random access, read only view of a disk or image."""
+
+    @abc.abstractmethod
+    def read_at(self, offset, size):
+        """Returns up to size bytes starting from offset."""
+        pass
+
+    def close(self):
+        pass
+
+
+class FileBlockSource(BaseBlockSource):
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+
+    def read_at(self, offset, size):
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+class BufferBlockSource(BaseBlockSource):
+    """Block source for strings and buffers, including mmap objects."""
+
+    def __init__(self, buf):
+        self._buf = buf
+
+    def read_at(self, offset, size):
+        return self._buf[offset:offset + size]
+
+
+class MemoryBlockSource(BufferBlockSource):
+    """Snapshot of the first size bytes of a block source.
+
+    The data is kept in anonymous memory, which is not backed by any file
+    and is released when the block source is closed.
+    """
+
+    _COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, block_source, size):
+        buf = mmap.mmap(-1, size)
+        try:
+            offset = 0
+            while offset < size:
+                data = block_source.read_at(
+                    offset, min(self._COPY_CHUNK_SIZE, size - offset))
+                if not data:
+                    raise IOError('Unexpected end of the block source')
+                buf.write(data)
+                offset += len(data)
+        except Exception:
+            buf.close()
+            raise
+        super(MemoryBlockSource, self).__init__(buf)
+
+    def close(self):
+        self._buf.close()
+
+
+class BaseBlockDevice(object):
+    """Backend providing sector aligned reads into preallocated buffers."""
+
+    @abc.abstractmethod
+    def get_sector_size(self):
+        pass
+
+    @abc.abstractmethod
+    def get_size(self):
+        """Returns the device size in bytes, reads must not go beyond."""
+        pass
+
+    def allocate_buffer(self, size):
+        return bytearray(size)
+
+    @abc.abstractmethod
+    def seek(self, offset):
+        pass
+
+    @abc.abstractmethod
+    def readinto(self, buf, size):
+        """Reads up to size bytes in buf, returning the bytes read."""
+        pass
+
+    def close(self):
+        pass
+
+
+class FileBlockDevice(BaseBlockDevice):
+    def __init__(self, path, sector_size=512):
+        self._file = open(path, 'rb')
+        self._sector_size = sector_size
+
+    def get_sector_size(self):
+        return self._sector_size
+
+    def get_size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def seek(self, offset):
+        self._file.seek(offset)
+
+    def readinto(self, buf, size):
+        return self._file.readinto(memoryview(buf)[:size])
+
+    def close(self):
+        self._file.close()
+
+
+class PhysicalDiskBlockDevice(BaseBlockDevice):
+    """Backend reading through the Win32 handle of an open PhysicalDisk."""
+
+    def __init__(self, phys_disk):
+        self._phys_disk = phys_disk
+
+    def get_sector_size(self):
+        return self._phys_disk.get_geometry().BytesPerSector
+
+    def get_size(self):
+        return self._phys_disk.get_size()
+
+    def allocate_buffer(self, size):
+        return self._phys_disk.allocate_buffer(size)
+
+    def seek(self, offset):
+        self._phys_disk.seek(offset)
+
+    def readinto(self, buf, size):
+        return self._phys_disk.read_into(buf, size)
+
+    def close(self):
+        self._phys_disk.close()
+
+
+class BlockReader(BaseBlockSource):
+    """Block source reading a block device in large aligned chunks.
+
+    Every device read fills a single preallocated buffer with a whole
+    chunk, so sequential reads are served from memory until the chunk
+    is consumed. The device is not seeked when the next chunk follows
+    the previous one.
+    """
+
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, block_device, chunk_size=DEFAULT_CHUNK_SIZE):
+        self._lock = threading.Lock()
+        self._block_device = block_device
+        self._sector_size = block_device.get_sector_size()
+        self._device_size = block_device.get_size()
+        self._chunk_size = max(chunk_size // self._sector_size, 1) * (
+            self._sector_size)
+        self._buf = block_device.allocate_buffer(self._chunk_size)
+        self._buf_offset = 0
+        self._buf_length = 0
+        self._device_offset = None
+        self._stats = {'device_reads': 0, 'device_seeks': 0}
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _read_chunk(self, offset):
+        chunk_offset = offset // self._sector_size * self._sector_size
+        self._buf_offset = chunk_offset
+        if offset >= self._device_size:
+            self._buf_length = 0
+            return
+        # Raw disk reads crossing the end of the device fail
+        size = min(self._chunk_size, self._device_size - chunk_offset)
+
+        if chunk_offset != self._device_offset:
+            self._block_device.seek(chunk_offset)
+            self._stats['device_seeks'] += 1
+
+        self._buf_length = self._block_device.readinto(self._buf, size)
+        self._device_offset = chunk_offset + self._buf_length
+        self._stats['device_reads'] += 1
+
+    def read_at(self, offset, size):
+        data = []
+        with self._lock:
+            while size > 0:
+                if not (self._buf_offset <= offset <
+                        self._buf_offset + self._buf_length):
+                    self._read_chunk(offset)
+                    if offset >= self._buf_offset + self._buf_length:
+                        # End of device
+                        break
+
+                start = offset - self._buf_offset
+                length = min(size, self._buf_length - start)
+                data.append(str(self._buf[start:start + length]))
+                offset += length
+                size -= length
+        return ''.join(data)
+
+    def close(self):
+        self._block_device.close()
@@ -30,6 +30,18 @@ opts = [
                 help='Look for an ISO config drive in raw HDDs'),
     cfg.BoolOpt('config_drive_cdrom', default=True,
                 help='Look for a config drive in the attached cdrom drives'),
+    cfg.BoolOpt('config_drive_lazy_load', default=False,
+                help='Reads the config drive files on demand from the '
+                'drive, instead of copying all of them to a temporary '
+                'folder when the service is loaded'),
+    cfg.BoolOpt('config_drive_in_memory', default=False,
+                help='Copies raw HDD config drives in memory instead of '
+                'extracting their files to a temporary folder. Config '
+                'drives larger than config_drive_in_memory_max_size are '
+                'extracted to disk, unless config_drive_lazy_load is set'),
+    cfg.IntOpt('config_drive_in_memory_max_size', default=64,
+               help='Max. size of a config drive copied in memory, '
+               'expressed in MB'),
 ]
 
 CONF = cfg.CONF
@@ -42,10 +54,25 @@ class ConfigDriveService(base.BaseMetadataService):
     def __init__(self):
         super(ConfigDriveService, self).__init__()
         self._metadata_path = None
+        self._config_drive = None
 
     def load(self):
         super(ConfigDriveService, self).load()
 
+        if CONF.config_drive_lazy_load or CONF.config_drive_in_memory:
+            snapshot_max_size = None
+            if CONF.config_drive_in_memory:
+                snapshot_max_size = (CONF.config_drive_in_memory_max_size *
+                                     1024 * 1024)
+
+            mgr = manager.ConfigDriveManager()
+            self._config_drive = mgr.get_config_drive(
+                CONF.config_drive_raw_hhd, CONF.config_drive_cdrom,
+                snapshot_max_size, CONF.config_drive_lazy_load)
+            if self._config_drive or CONF.config_drive_lazy_load:
+                return self._config_drive is not None
+            LOG.debug('Extracting the config drive files to disk')
+
         target_path = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()))
 
         mgr = manager.ConfigDriveManager()
@@ -59,6 +86,12 @@ class ConfigDriveService(base.BaseMetadataService):
         return found
 
     def _get_data(self, path):
+        if self._config_drive:
+            try:
+                return self._config_drive.read_file(path)
+            except IOError:
+                raise base.NotExistingMetadataException()
+
         norm_path = os.path.normpath(os.path.join(self._metadata_path, path))
         try:
             with open(norm_path, 'rb') as f:
@@ -67,6 +100,10 @@ class ConfigDriveService(base.BaseMetadataService):
             raise base.NotExistingMetadataException()
 
     def cleanup(self):
+        if self._config_drive:
+            LOG.debug('Closing the config drive')
+            self._config_drive.close()
+            self._config_drive = None
         if self._metadata_path:
             LOG.debug('Deleting metadata folder: \'%s\'' % self._metadata_path)
             shutil.rmtree(self._metadata_path, True)
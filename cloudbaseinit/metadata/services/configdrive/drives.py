@@ -0,0 +1,79 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import errno
+import os
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class BaseConfigDrive(object):
+    """Config drive whose files are read on demand from the source."""
+
+    @abc.abstractmethod
+    def read_file(self, path):
+        pass
+
+    def close(self):
+        pass
+
+
+class DirectoryConfigDrive(BaseConfigDrive):
+    """Config drive available as a directory, e.g. a cdrom mount point."""
+
+    def __init__(self, path):
+        self._path = path
+        self._index = self._build_index(path)
+        LOG.debug('Indexed %(count)d config drive files in: \'%(path)s\'' %
+                  {'count': len(self._index), 'path': path})
+
+    @staticmethod
+    def _get_key(path):
+        return '/'.join([p for p in path.replace('\\', '/').split('/')
+                         if p]).lower()
+
+    def _build_index(self, path):
+        index = {}
+        for (dir_path, dir_names, file_names) in os.walk(path):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                index[self._get_key(os.path.relpath(file_path, path))] = (
+                    file_path)
+        return index
+
+    def read_file(self, path):
+        file_path = self._index.get(self._get_key(path))
+        if not file_path:
+            raise IOError(errno.ENOENT, 'File not found', path)
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+
+class ImageConfigDrive(BaseConfigDrive):
+    """Config drive read from an ISO 9660 or VFAT image, e.g. a raw disk."""
+
+    def __init__(self, image_reader, close_callback=None):
+        self._image_reader = image_reader
+        self._close_callback = close_callback
+
+    def read_file(self, path):
+        return self._image_reader.read_file(path)
+
+    def close(self):
+        if self._close_callback:
+            self._close_callback()
+            self._close_callback = None
@@ -0,0 +1,224 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import re
+import struct
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+SECTOR_SIZE = 2048
+ISO_ID = 'CD001'
+
+_VOLUME_DESCRIPTORS_OFFSET = 16 * SECTOR_SIZE
+_MAX_VOLUME_DESCRIPTORS = 32
+_PRIMARY_VOLUME_DESCRIPTOR = 1
+_SUPPLEMENTARY_VOLUME_DESCRIPTOR = 2
+_VOLUME_DESCRIPTOR_TERMINATOR = 255
+_JOLIET_ESCAPE_SEQUENCES = ['%/@', '%/C', '%/E']
+
+_FILE_FLAG_DIRECTORY = 2
+_EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+
+class InvalidISOImageException(Exception):
+    pass
+
+
+class DirectoryRecord(object):
+    def __init__(self, name, extent, size, is_dir):
+        self.name = name
+        self.extent = extent
+        self.size = size
+        self.is_dir = is_dir
+
+
+class ISO9660Reader(object):
+    """Reads files from an ISO 9660 image through a block source.
+
+    Joliet names are used when available, falling back to the Rock Ridge
+    alternate names and then to the plain ISO 9660 names. Lookups are case
+    insensitive, as on Windows mounted drives.
+    """
+
+    def __init__(self, block_source):
+        self._block_source = block_source
+        self._directories = {}
+        self._load_volume_descriptors()
+
+    def _read_volume_descriptor(self, index):
+        data = self._block_source.read_at(
+            _VOLUME_DESCRIPTORS_OFFSET + index * SECTOR_SIZE, SECTOR_SIZE)
+        if len(data) < SECTOR_SIZE or data[1:6] != ISO_ID:
+            raise InvalidISOImageException('Invalid volume descriptor')
+        return data
+
+    def _load_volume_descriptors(self):
+        primary = None
+        joliet = None
+        for i in range(_MAX_VOLUME_DESCRIPTORS):
+            data = self._read_volume_descriptor(i)
+            descriptor_type = ord(data[0])
+            if descriptor_type == _VOLUME_DESCRIPTOR_TERMINATOR:
+                break
+            elif descriptor_type == _PRIMARY_VOLUME_DESCRIPTOR:
+                primary = data
+            elif (descriptor_type == _SUPPLEMENTARY_VOLUME_DESCRIPTOR and
+                    data[88:91] in _JOLIET_ESCAPE_SEQUENCES):
+                joliet = data
+
+        if not primary:
+            raise InvalidISOImageException(
+                'Primary volume descriptor not found')
+
+        self._joliet = joliet is not None
+        self._block_size = struct.unpack_from('<H', primary, 128)[0]
+        self._size = (struct.unpack_from('<I', primary, 80)[0] *
+                      self._block_size)
+
+        if self._joliet:
+            self._volume_label = joliet[40:72].decode(
+                'utf-16-be').strip(u' \0')
+            descriptor = joliet
+        else:
+            self._volume_label = primary[40:72].strip(' \0')
+            descriptor = primary
+        self._root = self._parse_record(descriptor[156:190])
+
+    def get_volume_label(self):
+        return self._volume_label
+
+    def get_size(self):
+        return self._size
+
+    def _get_rock_ridge_name(self, system_use):
+        name = None
+        i = 0
+        # System Use Sharing Protocol entries: signature, length, version
+        while i + 4 <= len(system_use):
+            length = ord(system_use[i + 2])
+            if length < 4:
+                break
+            if system_use[i:i + 2] == 'NM':
+                name = (name or '') + system_use[i + 5:i + length]
+            i += length
+        return name
+
+    def _parse_record(self, record):
+        (extent, ) = struct.unpack_from('<I', record, 2)
+        (size, ) = struct.unpack_from('<I', record, 10)
+        is_dir = bool(ord(record[25]) & _FILE_FLAG_DIRECTORY)
+        name_length = ord(record[32])
+        raw_name = record[33:33 + name_length]
+
+        if raw_name in ['\0', '\1']:
+            # Current and parent directory
+            name = None
+        elif self._joliet:
+            name = raw_name.decode('utf-16-be')
+        else:
+            system_use_offset = 33 + name_length + (1 - name_length % 2)
+            name = (self._get_rock_ridge_name(record[system_use_offset:]) or
+                    raw_name)
+
+        if name and not is_dir:
+            # Removes the file version and the empty extension separator
+            name = re.sub(r';\d+$', '', name)
+            if name.endswith('.'):
+                name = name[:-1]
+
+        return DirectoryRecord(name, extent, size, is_dir)
+
+    def _read_extent(self, record):
+        return self._block_source.read_at(record.extent * self._block_size,
+                                          record.size)
+
+    def _copy_extent(self, record, f):
+        offset = record.extent * self._block_size
+        end = offset + record.size
+        while offset < end:
+            data = self._block_source.read_at(
+                offset, min(_EXTRACT_CHUNK_SIZE, end - offset))
+            if not data:
+                raise InvalidISOImageException('Unexpected end of image')
+            f.write(data)
+            offset += len(data)
+
+    def _get_directory(self, record):
+        entries = self._directories.get(record.extent)
+        if entries is None:
+            entries = {}
+            data = self._read_extent(record)
+            pos = 0
+            while pos < len(data):
+                length = ord(data[pos])
+                if not length:
+                    # Records do not span across blocks
+                    pos = (pos // self._block_size + 1) * self._block_size
+                    continue
+                child = self._parse_record(data[pos:pos + length])
+                if child.name:
+                    entries[child.name.lower()] = child
+                pos += length
+            self._directories[record.extent] = entries
+        return entries
+
+    def _get_record(self, path):
+        record = self._root
+        for name in re.split(r'[/\\]', path):
+            if not name:
+                continue
+            child = None
+            if record.is_dir:
+                child = self._get_directory(record).get(name.lower())
+            if not child:
+                raise IOError(errno.ENOENT, 'File not found', path)
+            record = child
+        return record
+
+    def exists(self, path):
+        try:
+            self._get_record(path)
+            return True
+        except IOError:
+            return False
+
+    def list_dir(self, path=''):
+        record = self._get_record(path)
+        if not record.is_dir:
+            raise IOError(errno.ENOTDIR, 'Not a directory', path)
+        return [e.name for e in self._get_directory(record).values()]
+
+    def read_file(self, path):
+        record = self._get_record(path)
+        if record.is_dir:
+            raise IOError(errno.EISDIR, 'Is a directory', path)
+        return self._read_extent(record)
+
+    def _extract_directory(self, record, target_path):
+        os.makedirs(target_path)
+        for child in self._get_directory(record).values():
+            child_path = os.path.join(target_path, child.name)
+            if child.is_dir:
+                self._extract_directory(child, child_path)
+            else:
+                with open(child_path, 'wb') as f:
+                    self._copy_extent(child, f)
+
+    def extract(self, target_path):
+        LOG.debug('Extracting ISO files to: \'%s\'' % target_path)
+        self._extract_directory(self._root, target_path)
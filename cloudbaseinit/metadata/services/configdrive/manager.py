@@ -14,32 +14,46 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import ctypes
 import os
 import shutil
-import sys
-import tempfile
-import uuid
-import wmi
 
-from ctypes import wintypes
+from oslo.config import cfg
 
 from cloudbaseinit.openstack.common import log as logging
 
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import drives
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.metadata.services.configdrive import prober
+from cloudbaseinit.metadata.services.configdrive import vfat
 from cloudbaseinit.metadata.services.configdrive.windows.disk \
     import physical_disk
-from cloudbaseinit.metadata.services.configdrive.windows.disk \
-    import virtual_disk
 from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.utils import wmisession
+
+opts = [
+    cfg.IntOpt('config_drive_probe_workers', default=4,
+               help='Max. number of raw HDDs probed concurrently when '
+               'looking for a config drive'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
 
 class ConfigDriveManager(object):
+    _CONFIG_DRIVE_DISK_PATH = 'ConfigDriveDiskPath'
+    _IMAGE_READERS = [
+        (iso9660.ISO9660Reader, iso9660.InvalidISOImageException),
+        (vfat.VFATReader, vfat.InvalidVFATImageException),
+    ]
+
     def _get_physical_disks_path(self):
         l = []
-        conn = wmi.WMI(moniker='//./root/cimv2')
-        q = conn.query('SELECT DeviceID FROM Win32_DiskDrive')
+        q = wmisession.get_session().query_properties(
+            'SELECT DeviceID FROM Win32_DiskDrive', ['DeviceID'])
         for r in q:
             l.append(r.DeviceID)
         return l
@@ -56,112 +70,29 @@ class ConfigDriveManager(object):
                 return drive
         return None
 
-    def _c_char_array_to_c_ushort(self, buf, offset):
-        low = ctypes.cast(buf[offset],
-                          ctypes.POINTER(wintypes.WORD)).contents
-        high = ctypes.cast(buf[offset + 1],
-                           ctypes.POINTER(wintypes.WORD)).contents
-        return (high.value << 8) + low.value
-
-    def _get_iso_disk_size(self, phys_disk):
+    def _get_disk_image_reader(self, phys_disk):
         geom = phys_disk.get_geometry()
-
         if geom.MediaType != physical_disk.Win32_DiskGeometry.FixedMedia:
             return None
 
-        disk_size = geom.Cylinders * geom.TracksPerCylinder * \
-            geom.SectorsPerTrack * geom.BytesPerSector
-
-        boot_record_off = 0x8000
-        id_off = 1
-        volume_size_off = 80
-        block_size_off = 128
-        iso_id = 'CD001'
-
-        offset = boot_record_off / geom.BytesPerSector * geom.BytesPerSector
-        bytes_to_read = geom.BytesPerSector
-
-        if disk_size <= offset + bytes_to_read:
-            return None
-
-        phys_disk.seek(offset)
-        (buf, bytes_read) = phys_disk.read(bytes_to_read)
-
-        buf_off = boot_record_off - offset + id_off
-        if iso_id != buf[buf_off: buf_off + len(iso_id)]:
-            return None
-
-        buf_off = boot_record_off - offset + volume_size_off
-        num_blocks = self._c_char_array_to_c_ushort(buf, buf_off)
-
-        buf_off = boot_record_off - offset + block_size_off
-        block_size = self._c_char_array_to_c_ushort(buf, buf_off)
-
-        return num_blocks * block_size
-
-    def _write_iso_file(self, phys_disk, path, iso_file_size):
-        with open(path, 'wb') as f:
-            geom = phys_disk.get_geometry()
-            disk_size = geom.Cylinders * geom.TracksPerCylinder * \
-                geom.SectorsPerTrack * geom.BytesPerSector
-
-            offset = 0
-            # Get a multiple of the sector byte size
-            bytes_to_read = 4096 / geom.BytesPerSector * geom.BytesPerSector
-
-            while offset < iso_file_size:
-                phys_disk.seek(offset)
-                bytes_to_read = min(bytes_to_read, iso_file_size - offset)
-                (buf, bytes_read) = phys_disk.read(bytes_to_read)
-                f.write(buf)
-                offset += bytes_read
-
-    def _copy_iso_files(self, iso_file_path, target_path):
-        virt_disk = virtual_disk.VirtualDisk(iso_file_path)
-        virt_disk.open()
-        try:
-            virt_disk.attach()
-            cdrom_mount_point = virt_disk.get_cdrom_drive_mount_point()
-            shutil.copytree(cdrom_mount_point, target_path)
-        finally:
-            try:
-                virt_disk.detach()
-            except:
-                pass
-            virt_disk.close()
-
-    def _extract_iso_disk_file(self, iso_file_path):
-        iso_disk_found = False
-        for path in self._get_physical_disks_path():
-            phys_disk = physical_disk.PhysicalDisk(path)
+        block_source = blocksource.BlockReader(
+            blocksource.PhysicalDiskBlockDevice(phys_disk))
+        for (reader_class, exception_class) in self._IMAGE_READERS:
             try:
-                phys_disk.open()
-                iso_file_size = self._get_iso_disk_size(phys_disk)
-                if iso_file_size:
-                    self._write_iso_file(phys_disk, iso_file_path,
-                                         iso_file_size)
-                    iso_disk_found = True
-                    break
-            except:
-                # Ignore exception
-                pass
-            finally:
-                phys_disk.close()
-        return iso_disk_found
+                reader = reader_class(block_source)
+            except exception_class:
+                continue
 
-    def _os_supports_iso_virtual_disks(self):
-        # Feature supported starting from Windows 8 / 2012
-        ver = sys.getwindowsversion()
-        supported = (ver[0] >= 6 and ver[1] >= 2)
-        if not supported:
-            LOG.debug('ISO virtual disks are not supported on '
-                      'this version of Windows')
-        return supported
+            if reader.get_volume_label().lower() != 'config-2':
+                LOG.debug('Skipping image with volume label: \'%s\'' %
+                          reader.get_volume_label())
+                return None
+            return reader
 
     def get_config_drive_files(self, target_path, check_raw_hhd=True,
                                check_cdrom=True):
         config_drive_found = False
-        if check_raw_hhd and self._os_supports_iso_virtual_disks():
+        if check_raw_hhd:
             LOG.debug('Looking for Config Drive in raw HDDs')
             config_drive_found = self._get_conf_drive_from_raw_hdd(
                 target_path)
@@ -179,15 +110,116 @@ class ConfigDriveManager(object):
             return True
         return False
 
+    def _probe_config_drive_disk(self, path):
+        phys_disk = physical_disk.PhysicalDisk(path)
+        try:
+            phys_disk.open()
+            reader = self._get_disk_image_reader(phys_disk)
+            if reader:
+                return (phys_disk, reader)
+        except Exception:
+            phys_disk.close()
+            raise
+        phys_disk.close()
+
+    def _release_config_drive_disk(self, probe_result):
+        (phys_disk, reader) = probe_result
+        phys_disk.close()
+
+    def _find_config_drive_disk(self):
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        # The disk holding the config drive on the previous boot is
+        # probed first
+        try:
+            preferred_path = osutils.get_config_value(
+                self._CONFIG_DRIVE_DISK_PATH)
+        except NotImplementedError:
+            preferred_path = None
+
+        disk_prober = prober.DiskProber(CONF.config_drive_probe_workers)
+        found = disk_prober.probe(self._get_physical_disks_path(),
+                                  self._probe_config_drive_disk,
+                                  self._release_config_drive_disk,
+                                  preferred_path)
+        if not found:
+            return (None, None)
+
+        (path, (phys_disk, reader)) = found
+        LOG.debug('Config drive found on disk: \'%s\'' % path)
+        if path != preferred_path:
+            try:
+                osutils.set_config_value(self._CONFIG_DRIVE_DISK_PATH, path)
+            except NotImplementedError:
+                pass
+        return (phys_disk, reader)
+
     def _get_conf_drive_from_raw_hdd(self, target_path):
-        config_drive_found = False
-        iso_file_path = os.path.join(tempfile.gettempdir(),
-                                     str(uuid.uuid4()) + '.iso')
+        # The ISO or VFAT files are read directly from the raw disk,
+        # without copying the image or attaching it as a virtual disk
+        (phys_disk, reader) = self._find_config_drive_disk()
+        if not reader:
+            return False
+
         try:
-            if self._extract_iso_disk_file(iso_file_path):
-                self._copy_iso_files(iso_file_path, target_path)
-                config_drive_found = True
+            reader.extract(target_path)
+            return True
+        except Exception, ex:
+            LOG.debug('Failed to extract the config drive files: %s' % ex)
+            if os.path.exists(target_path):
+                shutil.rmtree(target_path, True)
+            return False
         finally:
-            if os.path.exists(iso_file_path):
-                os.remove(iso_file_path)
-        return config_drive_found
+            phys_disk.close()
+
+    def _get_disk_image_snapshot(self, phys_disk, reader_class, size):
+        block_source = blocksource.MemoryBlockSource(
+            blocksource.BlockReader(
+                blocksource.PhysicalDiskBlockDevice(phys_disk)), size)
+        LOG.debug('Config drive copied in memory, size: %d' % size)
+        return drives.ImageConfigDrive(reader_class(block_source),
+                                       block_source.close)
+
+    def _get_config_drive_from_raw_hdd(self, snapshot_max_size=None,
+                                       read_in_place=True):
+        (phys_disk, reader) = self._find_config_drive_disk()
+        if not reader:
+            return None
+
+        size = reader.get_size()
+        if snapshot_max_size is not None and size <= snapshot_max_size:
+            try:
+                return self._get_disk_image_snapshot(phys_disk,
+                                                     reader.__class__, size)
+            finally:
+                phys_disk.close()
+
+        if snapshot_max_size is not None:
+            LOG.info('The config drive size exceeds the in memory limit: '
+                     '%(size)d > %(max_size)d' %
+                     {'size': size, 'max_size': snapshot_max_size})
+        if read_in_place:
+            # The disk is kept open until the drive is closed
+            return drives.ImageConfigDrive(reader, phys_disk.close)
+
+        phys_disk.close()
+        return None
+
+    def get_config_drive(self, check_raw_hhd=True, check_cdrom=True,
+                         snapshot_max_size=None, read_in_place=True):
+        """Returns the config drive files without copying them to disk.
+
+        Raw HDD images up to snapshot_max_size bytes are copied in memory,
+        the others are read in place if read_in_place is set.
+        """
+        config_drive = None
+        if check_raw_hhd:
+            LOG.debug('Looking for Config Drive in raw HDDs')
+            config_drive = self._get_config_drive_from_raw_hdd(
+                snapshot_max_size, read_in_place)
+
+        if not config_drive and check_cdrom:
+            LOG.debug('Looking for Config Drive in cdrom drives')
+            cdrom_mount_point = self._get_config_drive_cdrom_mount_point()
+            if cdrom_mount_point:
+                config_drive = drives.DirectoryConfigDrive(cdrom_mount_point)
+        return config_drive
@@ -0,0 +1,87 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import threadpool
+
+LOG = logging.getLogger(__name__)
+
+
+class DiskProber(object):
+    """Probes disks concurrently, stopping at the first positive result.
+
+    probe_disk(path) returns a result, e.g. an open disk, or None if the
+    disk does not match. Matching results that are not selected, as
+    another disk matched first, are passed to release(result).
+    """
+
+    def __init__(self, max_workers):
+        self._max_workers = max_workers
+
+    def _probe_disk(self, probe_disk, path):
+        try:
+            return probe_disk(path)
+        except Exception, ex:
+            LOG.debug('Failed to probe disk \'%(path)s\': %(ex)s' %
+                      {'path': path, 'ex': ex})
+
+    def _probe_disks(self, disk_paths, probe_disk, release):
+        cond = threading.Condition()
+        pending = list(disk_paths)
+        status = {'result': None, 'running': 0}
+
+        def _worker():
+            while True:
+                with cond:
+                    if not pending or status['result']:
+                        status['running'] -= 1
+                        cond.notify()
+                        return
+                    path = pending.pop(0)
+
+                result = self._probe_disk(probe_disk, path)
+                if result is not None:
+                    with cond:
+                        if not status['result']:
+                            status['result'] = (path, result)
+                            cond.notify()
+                            continue
+                    if release:
+                        release(result)
+
+        with cond:
+            for i in range(min(self._max_workers, len(pending))):
+                status['running'] += 1
+                # Slow disks still being probed after a match are not
+                # waited for
+                threadpool.start_thread(_worker)
+
+            while status['running'] and not status['result']:
+                cond.wait()
+            return status['result']
+
+    def probe(self, disk_paths, probe_disk, release=None,
+              preferred_path=None):
+        """Returns a (path, result) tuple, or None if no disk matched."""
+        disk_paths = list(disk_paths)
+        if preferred_path in disk_paths:
+            LOG.debug('Probing disk \'%s\' first' % preferred_path)
+            result = self._probe_disk(probe_disk, preferred_path)
+            if result is not None:
+                return (preferred_path, result)
+            disk_paths.remove(preferred_path)
+
+        return self._probe_disks(disk_paths, probe_disk, release)
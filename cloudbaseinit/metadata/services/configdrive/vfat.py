@@ -0,0 +1,332 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import re
+import struct
+import threading
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+FAT12 = 12
+FAT16 = 16
+FAT32 = 32
+
+_BOOT_SECTOR_SIZE = 512
+_DIR_ENTRY_SIZE = 32
+
+_ATTR_VOLUME_ID = 0x08
+_ATTR_DIRECTORY = 0x10
+_ATTR_LONG_NAME = 0x0F
+
+_LFN_LAST_ENTRY = 0x40
+_LFN_CHAR_OFFSETS = [(1, 11), (14, 26), (28, 32)]
+
+# Windows NT flags for lowercase 8.3 names
+_NT_LOWERCASE_BASE = 0x08
+_NT_LOWERCASE_EXT = 0x10
+
+_END_OF_CHAIN = {FAT12: 0xFF8, FAT16: 0xFFF8, FAT32: 0x0FFFFFF8}
+_EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+
+class InvalidVFATImageException(Exception):
+    pass
+
+
+class DirectoryEntry(object):
+    def __init__(self, name, cluster, size, is_dir):
+        self.name = name
+        self.cluster = cluster
+        self.size = size
+        self.is_dir = is_dir
+
+
+def _get_lfn_checksum(short_name):
+    checksum = 0
+    for c in short_name:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + ord(c)) & 0xFF
+    return checksum
+
+
+class VFATReader(object):
+    """Reads files from a FAT12, FAT16 or FAT32 image via a block source.
+
+    Long file names (VFAT) are used when available. Lookups are case
+    insensitive, as on Windows mounted drives.
+    """
+
+    def __init__(self, block_source):
+        self._block_source = block_source
+        self._lock = threading.Lock()
+        self._fat = None
+        self._directories = {}
+        self._load_boot_sector()
+
+    def _load_boot_sector(self):
+        data = self._block_source.read_at(0, _BOOT_SECTOR_SIZE)
+        if len(data) < _BOOT_SECTOR_SIZE or data[510:512] != '\x55\xaa':
+            raise InvalidVFATImageException('Invalid boot sector')
+
+        (self._bytes_per_sector, self._sectors_per_cluster,
+         reserved_sectors, self._num_fats, root_entries,
+         total_sectors) = struct.unpack_from('<HBHBHH', data, 11)
+        (fat_size, ) = struct.unpack_from('<H', data, 22)
+        if not total_sectors:
+            (total_sectors, ) = struct.unpack_from('<I', data, 32)
+        if not fat_size:
+            (fat_size, ) = struct.unpack_from('<I', data, 36)
+
+        if (self._bytes_per_sector not in [512, 1024, 2048, 4096] or
+                not self._sectors_per_cluster or not self._num_fats or
+                not fat_size):
+            raise InvalidVFATImageException('Invalid BIOS parameter block')
+
+        self._cluster_size = self._bytes_per_sector * self._sectors_per_cluster
+        self._fat_offset = reserved_sectors * self._bytes_per_sector
+        self._fat_size = fat_size * self._bytes_per_sector
+        self._root_dir_offset = (self._fat_offset +
+                                 self._num_fats * self._fat_size)
+        root_dir_size = root_entries * _DIR_ENTRY_SIZE
+        root_dir_sectors = ((root_dir_size + self._bytes_per_sector - 1) //
+                            self._bytes_per_sector)
+        self._data_offset = (self._root_dir_offset +
+                             root_dir_sectors * self._bytes_per_sector)
+        self._size = total_sectors * self._bytes_per_sector
+
+        # The FAT type depends only on the number of clusters
+        clusters = ((self._size - self._data_offset) //
+                    self._cluster_size)
+        if clusters < 4085:
+            self._fat_type = FAT12
+        elif clusters < 65525:
+            self._fat_type = FAT16
+        else:
+            self._fat_type = FAT32
+
+        if self._fat_type == FAT32:
+            (root_cluster, ) = struct.unpack_from('<I', data, 44)
+            label_offset = 71
+            self._root = DirectoryEntry('', root_cluster, 0, True)
+        else:
+            label_offset = 43
+            # The FAT12/16 root directory is not part of the data area
+            self._root = DirectoryEntry('', None, root_dir_size, True)
+
+        self._volume_label = data[label_offset:label_offset + 11].strip()
+        if self._volume_label.upper() == 'NO NAME':
+            self._volume_label = self._get_root_volume_label()
+
+    def get_fat_type(self):
+        return self._fat_type
+
+    def get_volume_label(self):
+        return self._volume_label
+
+    def get_size(self):
+        return self._size
+
+    def _get_fat(self):
+        with self._lock:
+            if self._fat is None:
+                self._fat = self._block_source.read_at(self._fat_offset,
+                                                       self._fat_size)
+            return self._fat
+
+    def _get_next_cluster(self, fat, cluster):
+        if self._fat_type == FAT12:
+            (value, ) = struct.unpack_from('<H', fat, cluster + cluster // 2)
+            return value >> 4 if cluster & 1 else value & 0xFFF
+        elif self._fat_type == FAT16:
+            return struct.unpack_from('<H', fat, cluster * 2)[0]
+        else:
+            return struct.unpack_from('<I', fat, cluster * 4)[0] & 0x0FFFFFFF
+
+    def _get_cluster_runs(self, cluster):
+        # Contiguous clusters are merged, reducing the number of reads
+        fat = self._get_fat()
+        max_cluster = len(fat) * 8 // self._fat_type
+        end_of_chain = _END_OF_CHAIN[self._fat_type]
+        runs = []
+        visited = set()
+        while 2 <= cluster < min(end_of_chain, max_cluster):
+            if cluster in visited:
+                raise InvalidVFATImageException('Cluster chain loop')
+            visited.add(cluster)
+            if runs and runs[-1][0] + runs[-1][1] == cluster:
+                runs[-1][1] += 1
+            else:
+                runs.append([cluster, 1])
+            cluster = self._get_next_cluster(fat, cluster)
+        return runs
+
+    def _iter_extents(self, entry):
+        """Yields the (offset, size) disk extents of a file or directory."""
+        if entry.cluster is None:
+            yield (self._root_dir_offset, entry.size)
+            return
+
+        size_left = entry.size if not entry.is_dir else None
+        for (cluster, count) in self._get_cluster_runs(entry.cluster):
+            size = count * self._cluster_size
+            if size_left is not None:
+                size = min(size, size_left)
+                size_left -= size
+            yield (self._data_offset + (cluster - 2) * self._cluster_size,
+                   size)
+            if size_left == 0:
+                return
+
+        if size_left:
+            raise InvalidVFATImageException('Truncated file: %s' % entry.name)
+
+    def _read_entry(self, entry):
+        return ''.join([self._block_source.read_at(offset, size)
+                        for (offset, size) in self._iter_extents(entry)])
+
+    def _copy_entry(self, entry, f):
+        for (offset, size) in self._iter_extents(entry):
+            end = offset + size
+            while offset < end:
+                data = self._block_source.read_at(
+                    offset, min(_EXTRACT_CHUNK_SIZE, end - offset))
+                if not data:
+                    raise InvalidVFATImageException('Unexpected end of image')
+                f.write(data)
+                offset += len(data)
+
+    def _get_short_name(self, raw_name, nt_flags):
+        if raw_name[0] == '\x05':
+            raw_name = '\xe5' + raw_name[1:]
+        base = raw_name[:8].rstrip()
+        ext = raw_name[8:].rstrip()
+        if nt_flags & _NT_LOWERCASE_BASE:
+            base = base.lower()
+        if nt_flags & _NT_LOWERCASE_EXT:
+            ext = ext.lower()
+        return base + ('.' + ext if ext else '')
+
+    def _get_lfn_part(self, data):
+        return ''.join([data[start:end] for (start, end) in
+                        _LFN_CHAR_OFFSETS]).decode('utf-16-le')
+
+    def _iter_raw_entries(self, data):
+        lfn_parts = []
+        lfn_checksum = None
+        for pos in range(0, len(data) - _DIR_ENTRY_SIZE + 1, _DIR_ENTRY_SIZE):
+            raw_entry = data[pos:pos + _DIR_ENTRY_SIZE]
+            first = ord(raw_entry[0])
+            if first == 0:
+                break
+            attributes = ord(raw_entry[11])
+            if first == 0xE5:
+                lfn_parts = []
+                continue
+
+            if attributes & _ATTR_LONG_NAME == _ATTR_LONG_NAME:
+                if first & _LFN_LAST_ENTRY:
+                    lfn_parts = []
+                    lfn_checksum = ord(raw_entry[13])
+                lfn_parts.insert(0, self._get_lfn_part(raw_entry))
+                continue
+
+            name = None
+            if (lfn_parts and
+                    _get_lfn_checksum(raw_entry[:11]) == lfn_checksum):
+                name = u''.join(lfn_parts).split(u'\0')[0]
+            lfn_parts = []
+            yield (raw_entry, attributes, name)
+
+    def _get_root_volume_label(self):
+        for (raw_entry, attributes, name) in self._iter_raw_entries(
+                self._read_entry(self._root)):
+            if attributes & _ATTR_VOLUME_ID:
+                return raw_entry[:11].strip()
+        return ''
+
+    def _get_directory(self, entry):
+        key = entry.cluster
+        entries = self._directories.get(key)
+        if entries is None:
+            entries = {}
+            for (raw_entry, attributes, name) in self._iter_raw_entries(
+                    self._read_entry(entry)):
+                if attributes & _ATTR_VOLUME_ID:
+                    continue
+                if not name:
+                    name = self._get_short_name(raw_entry[:11],
+                                                ord(raw_entry[12]))
+                if name in ['.', '..']:
+                    continue
+
+                (cluster_high, ) = struct.unpack_from('<H', raw_entry, 20)
+                (cluster_low, size) = struct.unpack_from('<HI', raw_entry, 26)
+                child = DirectoryEntry(name, (cluster_high << 16) +
+                                       cluster_low, size,
+                                       bool(attributes & _ATTR_DIRECTORY))
+                entries[name.lower()] = child
+            self._directories[key] = entries
+        return entries
+
+    def _get_entry(self, path):
+        entry = self._root
+        for name in re.split(r'[/\\]', path):
+            if not name:
+                continue
+            child = None
+            if entry.is_dir:
+                child = self._get_directory(entry).get(name.lower())
+            if not child:
+                raise IOError(errno.ENOENT, 'File not found', path)
+            entry = child
+        return entry
+
+    def exists(self, path):
+        try:
+            self._get_entry(path)
+            return True
+        except IOError:
+            return False
+
+    def list_dir(self, path=''):
+        entry = self._get_entry(path)
+        if not entry.is_dir:
+            raise IOError(errno.ENOTDIR, 'Not a directory', path)
+        return [e.name for e in self._get_directory(entry).values()]
+
+    def read_file(self, path):
+        entry = self._get_entry(path)
+        if entry.is_dir:
+            raise IOError(errno.EISDIR, 'Is a directory', path)
+        if not entry.size:
+            return ''
+        return self._read_entry(entry)
+
+    def _extract_directory(self, entry, target_path):
+        os.makedirs(target_path)
+        for child in self._get_directory(entry).values():
+            child_path = os.path.join(target_path, child.name)
+            if child.is_dir:
+                self._extract_directory(child, child_path)
+            else:
+                with open(child_path, 'wb') as f:
+                    if child.size:
+                        self._copy_entry(child, f)
+
+    def extract(self, target_path):
+        LOG.debug('Extracting VFAT files to: \'%s\'' % target_path)
+        self._extract_directory(self._root, target_path)
@@ -34,6 +34,12 @@ class Win32_DiskGeometry(ctypes.Structure):
     ]
 
 
+class Win32_GetLengthInformation(ctypes.Structure):
+    _fields_ = [
+        ('Length', wintypes.LARGE_INTEGER),
+    ]
+
+
 class PhysicalDisk(object):
     GENERIC_READ = 0x80000000
     FILE_SHARE_READ = 1
@@ -41,6 +47,7 @@ class PhysicalDisk(object):
     FILE_ATTRIBUTE_READONLY = 1
     INVALID_HANDLE_VALUE = -1
     IOCTL_DISK_GET_DRIVE_GEOMETRY = 0x70000
+    IOCTL_DISK_GET_LENGTH_INFO = 0x7405C
     FILE_BEGIN = 0
     INVALID_SET_FILE_POINTER = 0xFFFFFFFFL
 
@@ -48,6 +55,7 @@ class PhysicalDisk(object):
         self._path = path
         self._handle = 0
         self._geom = None
+        self._size = None
 
     def open(self):
         if self._handle:
@@ -69,6 +77,7 @@ class PhysicalDisk(object):
         kernel32.CloseHandle(self._handle)
         self._handle = 0
         self._geom = None
+        self._size = None
 
     def get_geometry(self):
         if not self._geom:
@@ -88,6 +97,29 @@ class PhysicalDisk(object):
             self._geom = geom
         return self._geom
 
+    def get_size(self):
+        if self._size is None:
+            length_info = Win32_GetLengthInformation()
+            bytes_returned = wintypes.DWORD()
+            ret_val = kernel32.DeviceIoControl(
+                self._handle,
+                self.IOCTL_DISK_GET_LENGTH_INFO,
+                0,
+                0,
+                ctypes.byref(length_info),
+                ctypes.sizeof(length_info),
+                ctypes.byref(bytes_returned),
+                0)
+            if ret_val:
+                self._size = length_info.Length
+            else:
+                # The geometry does not include the trailing sectors which
+                # do not make a whole cylinder
+                geom = self.get_geometry()
+                self._size = (geom.Cylinders * geom.TracksPerCylinder *
+                              geom.SectorsPerTrack * geom.BytesPerSector)
+        return self._size
+
     def seek(self, offset):
         high = wintypes.DWORD(offset >> 32)
         low = wintypes.DWORD(offset & 0xFFFFFFFFL)
@@ -98,11 +130,18 @@ class PhysicalDisk(object):
         if ret_val == self.INVALID_SET_FILE_POINTER:
             raise Exception("Seek error")
 
-    def read(self, bytes_to_read):
-        buf = ctypes.create_string_buffer(bytes_to_read)
+    def allocate_buffer(self, size):
+        return ctypes.create_string_buffer(size)
+
+    def read_into(self, buf, bytes_to_read):
         bytes_read = wintypes.DWORD()
         ret_val = kernel32.ReadFile(self._handle, buf, bytes_to_read,
                                     ctypes.byref(bytes_read), 0)
         if not ret_val:
             raise Exception("Read exception")
-        return (buf, bytes_read.value)
+        return bytes_read.value
+
+    def read(self, bytes_to_read):
+        buf = self.allocate_buffer(bytes_to_read)
+        bytes_read = self.read_into(buf, bytes_to_read)
+        return (buf, bytes_read)
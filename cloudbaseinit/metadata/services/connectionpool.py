@@ -0,0 +1,178 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import httplib
+import socket
+import StringIO
+import threading
+import urllib
+import urllib2
+import urlparse
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class HTTPConnectionPool(object):
+    """Keeps persistent HTTP connections open for reuse across requests.
+
+    Idle connections are kept per scheme, host and port. A connection is
+    used by a single request at a time, so the pool can be shared by
+    multiple threads. Redirects are followed as urllib2 does and requests
+    going through a proxy, e.g. set in the http_proxy environment
+    variable, are sent with urllib2 without pooling.
+    """
+
+    _CONNECTION_CLASSES = {'http': httplib.HTTPConnection,
+                           'https': httplib.HTTPSConnection}
+    _REDIRECT_CODES = [301, 302, 303, 307]
+    # Same limit as urllib2.HTTPRedirectHandler
+    _MAX_REDIRECTS = 10
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._idle_connections = {}
+        self._stats = {'requests': 0,
+                       'connections_created': 0,
+                       'connections_reused': 0,
+                       'reconnects': 0}
+
+    def _inc_stat(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _get_connection(self, key):
+        with self._lock:
+            connections = self._idle_connections.get(key)
+            if connections:
+                self._stats['connections_reused'] += 1
+                return (connections.pop(), True)
+            self._stats['connections_created'] += 1
+
+        (scheme, host, port) = key
+        return (self._CONNECTION_CLASSES[scheme](host, port,
+                                                 timeout=self._timeout),
+                False)
+
+    def _release_connection(self, key, conn):
+        with self._lock:
+            self._idle_connections.setdefault(key, []).append(conn)
+
+    def _send_request(self, conn, method, path, data, headers):
+        conn.request(method, path, data, headers)
+        response = conn.getresponse()
+        # The response must be fully read before reusing the connection
+        return (response, response.read())
+
+    @staticmethod
+    def _get_proxy(parsed_url):
+        proxy = urllib.getproxies().get(parsed_url.scheme)
+        if proxy and not urllib.proxy_bypass(parsed_url.netloc):
+            return proxy
+
+    def _proxy_request(self, url, data, headers):
+        LOG.debug('Requesting through a proxy: %s' % url)
+        request = urllib2.Request(url, data, headers)
+        return urllib2.urlopen(request, timeout=self._timeout).read()
+
+    def _pooled_request(self, parsed_url, method, data, headers):
+        key = (parsed_url.scheme, parsed_url.hostname, parsed_url.port)
+        path = parsed_url.path or '/'
+        if parsed_url.query:
+            path += '?' + parsed_url.query
+
+        (conn, reused) = self._get_connection(key)
+        try:
+            try:
+                (response, body) = self._send_request(conn, method, path,
+                                                      data, headers)
+            except socket.timeout:
+                raise
+            except (httplib.HTTPException, socket.error):
+                if not reused:
+                    raise
+                # The server closed the idle connection in the meantime
+                LOG.debug('Reconnecting to: %s' % parsed_url.netloc)
+                self._inc_stat('reconnects')
+                conn.close()
+                (response, body) = self._send_request(conn, method, path,
+                                                      data, headers)
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release_connection(key, conn)
+        return (response, body)
+
+    def request(self, url, data=None, headers={}):
+        headers = dict(headers)
+        redirects = 0
+        while True:
+            parsed_url = urlparse.urlparse(url)
+            if parsed_url.scheme.lower() not in self._CONNECTION_CLASSES:
+                raise ValueError('Unsupported URL scheme: %s' %
+                                 parsed_url.scheme)
+            parsed_url = parsed_url._replace(
+                scheme=parsed_url.scheme.lower())
+
+            self._inc_stat('requests')
+            if self._get_proxy(parsed_url):
+                return self._proxy_request(url, data, headers)
+
+            if data is not None:
+                method = 'POST'
+                headers.setdefault('Content-Type',
+                                   'application/x-www-form-urlencoded')
+            else:
+                method = 'GET'
+
+            (response, body) = self._pooled_request(parsed_url, method,
+                                                    data, headers)
+            location = response.getheader('location')
+            # As in urllib2, only GET requests are redirected with 307
+            if (response.status in self._REDIRECT_CODES and location and
+                    (method == 'GET' or response.status != 307) and
+                    redirects < self._MAX_REDIRECTS):
+                redirects += 1
+                url = urlparse.urljoin(url, location)
+                LOG.debug('Redirected to: %s' % url)
+                if method == 'POST':
+                    # The request is repeated as a GET, without its data
+                    data = None
+                    headers.pop('Content-Type', None)
+                continue
+
+            if response.status >= 300:
+                raise urllib2.HTTPError(url, response.status,
+                                        response.reason, response.msg,
+                                        StringIO.StringIO(body))
+            return body
+
+    def close(self):
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+
+        for connections in idle_connections.values():
+            for conn in connections:
+                conn.close()
@@ -15,19 +15,22 @@
 #    under the License.
 
 import posixpath
-import urllib2
 import traceback
-import os
 
 from oslo.config import cfg
 
 from cloudbaseinit.metadata.services import base
+from cloudbaseinit.metadata.services import connectionpool
 from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import threadpool
 
 opts = [
     cfg.StrOpt('ec2_metadata_base_url',
                default='http://169.254.169.254/2009-04-04/',
                help='The base URL where the service looks for metadata'),
+    cfg.IntOpt('ec2_metadata_workers', default=8,
+               help='Max. number of concurrent requests used for fetching '
+               'the EC2 metadata values'),
 ]
 
 ec2nodes = [
@@ -49,10 +52,15 @@ class EC2Service(base.BaseMetadataService):
     def __init__(self):
         super(EC2Service, self).__init__()
         self._enable_retry = True
+        self._enable_disk_cache = True
+        self._connection_pool = connectionpool.HTTPConnectionPool(
+            CONF.metadata_request_timeout)
+        self._ec2_available = None
         self.error_count = 0
 
     def load(self):
         super(EC2Service, self).load()
+        self._ec2_available = None
         try:
             self.get_meta_data('openstack')
             return True
@@ -63,6 +71,11 @@ class EC2Service(base.BaseMetadataService):
                       CONF.ec2_metadata_base_url)
             return False
 
+    def get_instance_id(self):
+        # Avoids crawling the whole metadata for validating the cache
+        return self._exec_with_retry(
+            lambda: self._get_EC2_value('instance-id'))
+
     def _get_data(self, path):
         data = {}
         LOG.debug("Check for EC2 interface availability...")
@@ -71,12 +84,7 @@ class EC2Service(base.BaseMetadataService):
 
         LOG.debug('Getting data for the path: %s' % path)
         if path.endswith('meta_data.json'):
-            for key in ec2nodes:
-                LOG.debug('Getting metadata from: %s' % key)
-                try:
-                    data[key] = self._get_EC2_value(key)
-                except:
-                    LOG.info("EC2 value %s is not available. Skip it." % key)
+            data = self._get_EC2_values(ec2nodes)
             # Saving keys to the local folder
             self._load_public_keys(data)
 
@@ -84,41 +92,74 @@ class EC2Service(base.BaseMetadataService):
             norm_path = posixpath.join(CONF.ec2_metadata_base_url, 'user-data')
             LOG.debug('Getting metadata from: %(norm_path)s' % locals())
             try:
-                req = urllib2.Request(norm_path)
-                response = urllib2.urlopen(req)
-                data = response.read()
+                data = self._connection_pool.request(norm_path)
                 LOG.debug("Got data: %s" % data)
             except:
                 LOG.error("EC2 user-data is not available.")
         return data
 
     def _check_EC2(self):
-        try:
-            data = self._get_EC2_value('')
-            return True
-        except:
-            return False
+        # Only a successful check is reused by the following requests, a
+        # failed one is repeated on each retry
+        if not self._ec2_available:
+            try:
+                self._get_EC2_value('')
+                self._ec2_available = True
+            except:
+                return False
+        return True
 
     def _get_EC2_value(self, key):
         meta_path = posixpath.join(
             CONF.ec2_metadata_base_url, 'meta-data', key)
-        req = urllib2.Request(meta_path)
-        response = urllib2.urlopen(req)
-        return response.read()
+        return self._connection_pool.request(meta_path)
 
-    def _load_public_keys(self, data):
+    def _get_EC2_values(self, keys):
+        # Fetches the values concurrently, skipping the unavailable ones
+        def _get_value(key):
+            LOG.debug('Getting metadata from: %s' % key)
+            try:
+                return (key, self._get_EC2_value(key))
+            except Exception:
+                LOG.info("EC2 value %s is not available. Skip it." % key)
+                return (key, None)
+
+        if not keys:
+            return {}
+
+        pool = threadpool.get_thread_pool(
+            min(CONF.ec2_metadata_workers, len(keys)))
         try:
-            key_list = self._get_EC2_value('public-keys/')
-            LOG.debug("Got a list of keys %s" % key_list)
-            data['public_keys'] = {}
-
-            for key_name in key_list.split('\n'):
-                key_index = key_name.split('=')[0]
-                LOG.debug('Loading key %s' % key_index)
-                key = self._get_EC2_value(
-                    'public-keys/%s/openssh-key' % key_index)
-                data['public_keys'].update({key_index: key})
-
-        except Exception, ex:
-            LOG.debug("Can't save public key %s" % ex)
-            LOG.debug(traceback.format_exc())
+            values = pool.map(_get_value, keys)
+        finally:
+            pool.close()
+            pool.join()
+
+        return dict([(k, v) for (k, v) in values if v is not None])
+
+    def _load_public_keys(self, data):
+        key_list = data.get('public-keys/')
+        if key_list is None:
+            LOG.debug("Can't save public keys, the key list is not available")
+            return
+
+        LOG.debug("Got a list of keys %s" % key_list)
+        # The key list entries have the format: <index>=<key name>
+        key_indexes = [k.split('=')[0] for k in key_list.split('\n') if k]
+        key_paths = dict([(i, 'public-keys/%s/openssh-key' % i)
+                          for i in key_indexes])
+        # The first key is usually already part of the metadata values
+        keys = self._get_EC2_values([key_paths[i] for i in key_indexes
+                                     if key_paths[i] not in data])
+        keys.update(data)
+
+        data['public_keys'] = {}
+        for key_index in key_indexes:
+            key = keys.get(key_paths[key_index])
+            if key is not None:
+                data['public_keys'][key_index] = key
+
+    def cleanup(self):
+        LOG.debug('Metadata connection pool stats: %s' %
+                  self._connection_pool.get_stats())
+        self._connection_pool.close()
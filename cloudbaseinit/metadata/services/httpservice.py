@@ -21,6 +21,7 @@ import urlparse
 from oslo.config import cfg
 
 from cloudbaseinit.metadata.services import base
+from cloudbaseinit.metadata.services import connectionpool
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import factory as osutils_factory
 
@@ -39,6 +40,9 @@ class HttpService(base.BaseMetadataService):
     def __init__(self):
         super(HttpService, self).__init__()
         self._enable_retry = True
+        self._enable_disk_cache = True
+        self._connection_pool = connectionpool.HTTPConnectionPool(
+            CONF.metadata_request_timeout)
 
     def _check_metadata_ip_route(self):
         '''
@@ -83,9 +87,9 @@ class HttpService(base.BaseMetadataService):
     def can_post_password(self):
         return True
 
-    def _get_response(self, req):
+    def _get_response(self, url, data=None):
         try:
-            return urllib2.urlopen(req)
+            return self._connection_pool.request(url, data)
         except urllib2.HTTPError as ex:
             if ex.code == 404:
                 raise base.NotExistingMetadataException()
@@ -95,15 +99,12 @@ class HttpService(base.BaseMetadataService):
     def _get_data(self, path):
         norm_path = posixpath.join(CONF.metadata_base_url, path)
         LOG.debug('Getting metadata from: %(norm_path)s' % locals())
-        req = urllib2.Request(norm_path)
-        response = self._get_response(req)
-        return response.read()
+        return self._get_response(norm_path)
 
     def _post_data(self, path, data):
         norm_path = posixpath.join(CONF.metadata_base_url, path)
         LOG.debug('Posting metadata to: %(norm_path)s' % locals())
-        req = urllib2.Request(norm_path, data=data)
-        self._get_response(req)
+        self._get_response(norm_path, data)
         return True
 
     def post_password(self, enc_password_b64, version='latest'):
@@ -116,3 +117,8 @@ class HttpService(base.BaseMetadataService):
                 return False
             else:
                 raise
+
+    def cleanup(self):
+        LOG.debug('Metadata connection pool stats: %s' %
+                  self._connection_pool.get_stats())
+        self._connection_pool.close()
@@ -0,0 +1,87 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import time
+import urllib2
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class FatalError(Exception):
+    """Base class for errors that must not be retried."""
+    pass
+
+
+class RetryPolicy(object):
+    """Retries failed actions with exponential backoff and full jitter.
+
+    The interval before the n-th retry is a random value between 0 and
+    min(max_interval, interval * 2 ** (n - 1)), which spreads the requests
+    of hosts failing at the same time. No retry is attempted after the
+    deadline, expressed in seconds since the first attempt.
+    """
+
+    # Request timeout and too many requests
+    _RETRYABLE_HTTP_CLIENT_ERRORS = [408, 429]
+
+    def __init__(self, max_retries, interval, max_interval=None,
+                 deadline=None):
+        self._max_retries = max_retries
+        self._interval = interval
+        self._max_interval = max_interval
+        self._deadline = deadline
+
+    def is_retryable(self, ex):
+        if isinstance(ex, FatalError):
+            return False
+        if isinstance(ex, urllib2.HTTPError):
+            return (ex.code >= 500 or
+                    ex.code in self._RETRYABLE_HTTP_CLIENT_ERRORS)
+        # Connection errors, timeouts and unknown errors
+        return True
+
+    def get_interval(self, retry):
+        interval = self._interval * 2 ** (retry - 1)
+        if self._max_interval is not None:
+            interval = min(interval, self._max_interval)
+        return random.uniform(0, interval)
+
+    def execute(self, action, is_cancelled=None, on_retry=None):
+        start = time.time()
+        retry = 0
+        while True:
+            try:
+                return action()
+            except Exception, ex:
+                if (retry >= self._max_retries or
+                        not self.is_retryable(ex) or
+                        (is_cancelled and is_cancelled())):
+                    raise
+
+                retry += 1
+                interval = self.get_interval(retry)
+                if (self._deadline and
+                        time.time() + interval - start > self._deadline):
+                    LOG.debug('Retry deadline of %s seconds exceeded' %
+                              self._deadline)
+                    raise
+
+                LOG.debug('Retrying in %(interval).2f seconds after error: '
+                          '%(ex)s' % {'interval': interval, 'ex': ex})
+                if on_retry:
+                    on_retry(retry)
+                time.sleep(interval)
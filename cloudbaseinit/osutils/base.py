@@ -15,8 +15,15 @@
 #    under the License.
 
 import base64
+import collections
 import os
-import subprocess
+
+from cloudbaseinit.utils import processexecutor
+
+# Immutable snapshot of the OS properties which do not change while running
+OSCapabilities = collections.namedtuple(
+    'OSCapabilities',
+    ['os_version', 'logical_drives', 'cdrom_drives', 'volume_labels'])
 
 
 class BaseOSUtils(object):
@@ -36,12 +43,11 @@ class BaseOSUtils(object):
         return b64_password.replace('/', '').replace('+', '')[:length]
 
     def execute_process(self, args, shell=True):
-        p = subprocess.Popen(args,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             shell=shell)
-        (out, err) = p.communicate()
-        return (out, err, p.returncode)
+        executor = processexecutor.ProcessExecutor(self.kill_process_tree)
+        return executor.execute(args, shell)
+
+    def kill_process_tree(self, pid):
+        raise NotImplementedError()
 
     def sanitize_shell_input(self, value):
         raise NotImplementedError()
@@ -75,6 +81,9 @@ class BaseOSUtils(object):
     def get_config_value(self, name, section=None):
         raise NotImplementedError()
 
+    def get_config_values(self, section=None):
+        raise NotImplementedError()
+
     def wait_for_boot_completion(self):
         pass
 
@@ -91,12 +100,18 @@ class BaseOSUtils(object):
                          metric):
         raise NotImplementedError()
 
+    def get_capabilities(self):
+        raise NotImplementedError()
+
     def check_os_version(self, major, minor, build=0):
         raise NotImplementedError()
 
     def get_volume_label(self, drive):
         raise NotImplementedError()
 
+    def create_private_directory(self, path):
+        raise NotImplementedError()
+
     def firewall_create_rule(self, name, port, protocol, allow=True):
         raise NotImplementedError()
 
@@ -15,9 +15,14 @@
 #    under the License.
 
 import os
+import threading
 
 from cloudbaseinit.utils import classloader
 
+# The osutils instances are shared by the whole process
+_os_utils = {}
+_os_utils_lock = threading.Lock()
+
 
 class OSUtilsFactory(object):
     def get_os_utils(self):
@@ -26,5 +31,9 @@ class OSUtilsFactory(object):
             'posix': 'cloudbaseinit.osutils.posix.PosixUtils'
         }
 
-        cl = classloader.ClassLoader()
-        return cl.load_class(osutils_class_paths[os.name])()
+        class_path = osutils_class_paths[os.name]
+        with _os_utils_lock:
+            if class_path not in _os_utils:
+                cl = classloader.ClassLoader()
+                _os_utils[class_path] = cl.load_class(class_path)()
+            return _os_utils[class_path]
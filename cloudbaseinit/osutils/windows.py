@@ -16,11 +16,15 @@
 
 import _winreg
 import ctypes
+import ntsecuritycon
+import os
 import re
+import subprocess
+import threading
 import time
+import win32file
 import win32process
 import win32security
-import wmi
 
 from ctypes import windll
 from ctypes import wintypes
@@ -28,6 +32,8 @@ from win32com import client
 
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import base
+from cloudbaseinit.utils import routingtable
+from cloudbaseinit.utils import wmisession
 
 LOG = logging.getLogger(__name__)
 
@@ -36,7 +42,7 @@ kernel32 = windll.kernel32
 netapi32 = windll.netapi32
 userenv = windll.userenv
 iphlpapi = windll.iphlpapi
-Ws2_32 = windll.Ws2_32
+ntdll = windll.ntdll
 
 
 class Win32_PROFILEINFO(ctypes.Structure):
@@ -92,23 +98,18 @@ class Win32_OSVERSIONINFOEX_W(ctypes.Structure):
         ('dwBuildNumber', wintypes.DWORD),
         ('dwPlatformId', wintypes.DWORD),
         ('szCSDVersion', wintypes.WCHAR * 128),
-        ('wServicePackMajor', wintypes.DWORD),
-        ('wServicePackMinor', wintypes.DWORD),
-        ('wSuiteMask', wintypes.DWORD),
+        ('wServicePackMajor', wintypes.WORD),
+        ('wServicePackMinor', wintypes.WORD),
+        ('wSuiteMask', wintypes.WORD),
         ('wProductType', wintypes.BYTE),
         ('wReserved', wintypes.BYTE)
     ]
 
 
-kernel32.VerifyVersionInfoW.argtypes = [
-    ctypes.POINTER(Win32_OSVERSIONINFOEX_W),
-    wintypes.DWORD, wintypes.ULARGE_INTEGER]
-kernel32.VerifyVersionInfoW.restype = wintypes.BOOL
-
-kernel32.VerSetConditionMask.argtypes = [wintypes.ULARGE_INTEGER,
-                                         wintypes.DWORD,
-                                         wintypes.BYTE]
-kernel32.VerSetConditionMask.restype = wintypes.ULARGE_INTEGER
+# Unlike GetVersionEx and VerifyVersionInfo, RtlGetVersion returns the
+# actual OS version regardless of the application manifest
+ntdll.RtlGetVersion.argtypes = [ctypes.POINTER(Win32_OSVERSIONINFOEX_W)]
+ntdll.RtlGetVersion.restype = wintypes.DWORD
 
 kernel32.SetComputerNameExW.argtypes = [ctypes.c_int, wintypes.LPCWSTR]
 kernel32.SetComputerNameExW.restype = wintypes.BOOL
@@ -119,32 +120,12 @@ kernel32.GetLogicalDriveStringsW.restype = wintypes.DWORD
 kernel32.GetDriveTypeW.argtypes = [wintypes.LPCWSTR]
 kernel32.GetDriveTypeW.restype = wintypes.UINT
 
-kernel32.GetProcessHeap.argtypes = []
-kernel32.GetProcessHeap.restype = wintypes.HANDLE
-
-# Note: wintypes.ULONG must be replaced with a 64 bit variable on x64
-kernel32.HeapAlloc.argtypes = [wintypes.HANDLE, wintypes.DWORD,
-                               wintypes.ULONG]
-kernel32.HeapAlloc.restype = wintypes.LPVOID
-
-kernel32.HeapFree.argtypes = [wintypes.HANDLE, wintypes.DWORD,
-                              wintypes.LPVOID]
-kernel32.HeapFree.restype = wintypes.BOOL
-
 iphlpapi.GetIpForwardTable.argtypes = [
     ctypes.POINTER(Win32_MIB_IPFORWARDTABLE),
     ctypes.POINTER(wintypes.ULONG),
     wintypes.BOOL]
 iphlpapi.GetIpForwardTable.restype = wintypes.DWORD
 
-Ws2_32.inet_ntoa.restype = ctypes.c_char_p
-
-VER_MAJORVERSION = 1
-VER_MINORVERSION = 2
-VER_BUILDNUMBER = 4
-
-VER_GREATER_EQUAL = 3
-
 
 class WindowsUtils(base.BaseOSUtils):
     NERR_GroupNotFound = 2220
@@ -181,6 +162,12 @@ class WindowsUtils(base.BaseOSUtils):
     _FW_SCOPE_ALL = 0
     _FW_SCOPE_LOCAL_SUBNET = 1
 
+    def __init__(self):
+        self._capabilities = None
+        self._capabilities_lock = threading.Lock()
+        self._routing_table = None
+        self._ip_forward_table_size = ctypes.sizeof(Win32_MIB_IPFORWARDTABLE)
+
     def _enable_shutdown_privilege(self):
         process = win32process.GetCurrentProcess()
         token = win32security.OpenProcessToken(
@@ -201,10 +188,10 @@ class WindowsUtils(base.BaseOSUtils):
             raise Exception("Reboot failed")
 
     def _get_user_wmi_object(self, username):
-        conn = wmi.WMI(moniker='//./root/cimv2')
         username_san = self._sanitize_wmi_input(username)
-        q = conn.query('SELECT * FROM Win32_Account where name = '
-                       '\'%(username_san)s\'' % locals())
+        q = wmisession.get_session().query(
+            'SELECT * FROM Win32_Account where name = '
+            '\'%(username_san)s\'' % locals())
         if len(q) > 0:
             return q[0]
         return None
@@ -339,7 +326,6 @@ class WindowsUtils(base.BaseOSUtils):
 
     def get_network_adapters(self):
         l = []
-        conn = wmi.WMI(moniker='//./root/cimv2')
         # Get Ethernet adapters only
         wql = ('SELECT * FROM Win32_NetworkAdapter WHERE '
                'AdapterTypeId = 0 AND MACAddress IS NOT NULL')
@@ -347,24 +333,29 @@ class WindowsUtils(base.BaseOSUtils):
         if self.check_os_version(6, 0):
             wql += ' AND PhysicalAdapter = True'
 
-        q = conn.query(wql)
+        q = wmisession.get_session().query_properties(wql, ['Name'])
         for r in q:
             l.append(r.Name)
         return l
 
     def set_static_network_config(self, adapter_name, address, netmask,
                                   broadcast, gateway, dnsnameservers):
-        conn = wmi.WMI(moniker='//./root/cimv2')
+        session = wmisession.get_session()
 
         adapter_name_san = self._sanitize_wmi_input(adapter_name)
-        q = conn.query('SELECT * FROM Win32_NetworkAdapter WHERE '
-                       'MACAddress IS NOT NULL AND '
-                       'Name = \'%(adapter_name_san)s\'' % locals())
+        q = session.query('SELECT * FROM Win32_NetworkAdapter WHERE '
+                          'MACAddress IS NOT NULL AND '
+                          'Name = \'%(adapter_name_san)s\'' % locals())
         if not len(q):
             raise Exception("Network adapter not found")
 
         adapter_config = q[0].associators(
             wmi_result_class='Win32_NetworkAdapterConfiguration')[0]
+        # The network configuration is changed regardless of the result
+        session.invalidate('Win32_NetworkAdapter',
+                           'Win32_NetworkAdapterConfiguration')
+        # The default gateway routes change as well
+        self._routing_table = None
 
         LOG.debug("Setting static IP address")
         (ret_val,) = adapter_config.EnableStatic([address], [netmask])
@@ -414,6 +405,21 @@ class WindowsUtils(base.BaseOSUtils):
         except WindowsError:
             return None
 
+    def get_config_values(self, section=None):
+        key_name = self._get_config_key_name(section)
+
+        values = {}
+        try:
+            with _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE,
+                                 key_name) as key:
+                num_values = _winreg.QueryInfoKey(key)[1]
+                for i in range(num_values):
+                    (name, value, regtype) = _winreg.EnumValue(key, i)
+                    values[name] = value
+        except WindowsError:
+            pass
+        return values
+
     def wait_for_boot_completion(self):
         try:
             with _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE,
@@ -435,7 +441,7 @@ class WindowsUtils(base.BaseOSUtils):
                 raise ex
 
     def _get_service(self, service_name):
-        conn = wmi.WMI(moniker='//./root/cimv2')
+        conn = wmisession.get_session().get_connection()
         service_list = conn.Win32_Service(Name=service_name)
         if len(service_list):
             return service_list[0]
@@ -481,70 +487,53 @@ class WindowsUtils(base.BaseOSUtils):
         time.sleep(3)
         self.stop_service(self._service_name)
 
+    def kill_process_tree(self, pid):
+        # /T terminates the child processes started by pid as well
+        ret_val = subprocess.call(['taskkill.exe', '/F', '/T', '/PID',
+                                   str(pid)])
+        if ret_val:
+            raise Exception('Killing the process tree of %(pid)d failed with '
+                            'return value: %(ret_val)d' % locals())
+
     def get_default_gateway(self):
-        default_routes = [r for r in self._get_ipv4_routing_table()
-                          if r[0] == '0.0.0.0']
+        default_routes = self.get_routing_table().get_routes('0.0.0.0')
         if default_routes:
-            return (default_routes[0][3], default_routes[0][2])
+            return (default_routes[0].interface_index,
+                    default_routes[0].next_hop)
         else:
             return (None, None)
 
     def _get_ipv4_routing_table(self):
-        routing_table = []
-
-        heap = kernel32.GetProcessHeap()
-
-        size = wintypes.ULONG(ctypes.sizeof(Win32_MIB_IPFORWARDTABLE))
-        p = kernel32.HeapAlloc(heap, 0, size)
-        if not p:
-            raise Exception('Unable to allocate memory for the IP forward '
-                            'table')
-        p_forward_table = ctypes.cast(
-            p, ctypes.POINTER(Win32_MIB_IPFORWARDTABLE))
-
-        try:
+        size = wintypes.ULONG(self._ip_forward_table_size)
+        while True:
+            buf = ctypes.create_string_buffer(size.value)
+            p_forward_table = ctypes.cast(
+                buf, ctypes.POINTER(Win32_MIB_IPFORWARDTABLE))
             err = iphlpapi.GetIpForwardTable(p_forward_table,
                                              ctypes.byref(size), 0)
-            if err == self.ERROR_INSUFFICIENT_BUFFER:
-                kernel32.HeapFree(heap, 0, p_forward_table)
-                p = kernel32.HeapAlloc(heap, 0, size)
-                if not p:
-                    raise Exception('Unable to allocate memory for the IP '
-                                    'forward table')
-                p_forward_table = ctypes.cast(
-                    p, ctypes.POINTER(Win32_MIB_IPFORWARDTABLE))
+            # The buffer size is kept, the table is read with a single
+            # call when the number of routes did not increase
+            self._ip_forward_table_size = size.value
+            if err != self.ERROR_INSUFFICIENT_BUFFER:
+                break
+
+        if err == self.ERROR_NO_DATA:
+            return routingtable.RoutingTable([], [], [], [], [])
+        if err:
+            raise Exception('Unable to get IP forward table. '
+                            'Error: %s' % err)
 
-            err = iphlpapi.GetIpForwardTable(p_forward_table,
-                                             ctypes.byref(size), 0)
-            if err != self.ERROR_NO_DATA:
-                if err:
-                    raise Exception('Unable to get IP forward table. '
-                                    'Error: %s' % err)
-
-                forward_table = p_forward_table.contents
-                table = ctypes.cast(
-                    ctypes.addressof(forward_table.table),
-                    ctypes.POINTER(Win32_MIB_IPFORWARDROW *
-                                   forward_table.dwNumEntries)).contents
-
-                i = 0
-                while i < forward_table.dwNumEntries:
-                    row = table[i]
-                    routing_table.append((
-                        Ws2_32.inet_ntoa(row.dwForwardDest),
-                        Ws2_32.inet_ntoa(row.dwForwardMask),
-                        Ws2_32.inet_ntoa(row.dwForwardNextHop),
-                        row.dwForwardIfIndex,
-                        row.dwForwardMetric1))
-                    i += 1
-
-            return routing_table
-        finally:
-            kernel32.HeapFree(heap, 0, p_forward_table)
+        num_entries = p_forward_table.contents.dwNumEntries
+        return routingtable.RoutingTable.from_mib_ipforwardrows(
+            buf.raw[Win32_MIB_IPFORWARDTABLE.table.offset:], num_entries)
+
+    def get_routing_table(self, refresh=False):
+        if refresh or not self._routing_table:
+            self._routing_table = self._get_ipv4_routing_table()
+        return self._routing_table
 
     def check_static_route_exists(self, destination):
-        return len([r for r in self._get_ipv4_routing_table()
-                    if r[0] == destination]) > 0
+        return self.get_routing_table().has_destination(destination)
 
     def add_static_route(self, destination, mask, next_hop, interface_index,
                          metric):
@@ -553,34 +542,17 @@ class WindowsUtils(base.BaseOSUtils):
         # Cannot use the return value to determine the outcome
         if err:
             raise Exception('Unable to add route: %(err)s' % locals())
+        self._routing_table = None
 
-    def check_os_version(self, major, minor, build=0):
+    def _get_os_version(self):
         vi = Win32_OSVERSIONINFOEX_W()
         vi.dwOSVersionInfoSize = ctypes.sizeof(Win32_OSVERSIONINFOEX_W)
-
-        vi.dwMajorVersion = major
-        vi.dwMinorVersion = minor
-        vi.dwBuildNumber = build
-
-        mask = 0
-        for type_mask in [VER_MAJORVERSION, VER_MINORVERSION, VER_BUILDNUMBER]:
-            mask = kernel32.VerSetConditionMask(mask, type_mask,
-                                                VER_GREATER_EQUAL)
-
-        type_mask = VER_MAJORVERSION | VER_MINORVERSION | VER_BUILDNUMBER
-        ret_val = kernel32.VerifyVersionInfoW(ctypes.byref(vi), type_mask,
-                                              mask)
+        ret_val = ntdll.RtlGetVersion(ctypes.byref(vi))
         if ret_val:
-            return True
-        else:
-            err = kernel32.GetLastError()
-            if err == self.ERROR_OLD_WIN_VERSION:
-                return False
-            else:
-                raise Exception("VerifyVersionInfo failed with error: %s" %
-                                err)
+            raise Exception("RtlGetVersion failed with status: %s" % ret_val)
+        return (vi.dwMajorVersion, vi.dwMinorVersion, vi.dwBuildNumber)
 
-    def get_volume_label(self, drive):
+    def _get_volume_label(self, drive):
         max_label_size = 261
         label = ctypes.create_unicode_buffer(max_label_size)
         ret_val = kernel32.GetVolumeInformationW(unicode(drive), label,
@@ -588,6 +560,108 @@ class WindowsUtils(base.BaseOSUtils):
         if ret_val:
             return label.value
 
+    def _collect_capabilities(self):
+        logical_drives = tuple(self._get_logical_drives())
+        cdrom_drives = tuple([d for d in logical_drives if
+                              kernel32.GetDriveTypeW(d) == self.DRIVE_CDROM])
+        # Only the config drive labels are needed at boot, the other drives
+        # can be slow to query, e.g. network or floppy drives. Missing
+        # labels, e.g. of media not ready yet, are queried again later
+        volume_labels = []
+        for drive in cdrom_drives:
+            label = self._get_volume_label(drive)
+            if label is not None:
+                volume_labels.append((drive, label))
+        volume_labels = tuple(volume_labels)
+        return base.OSCapabilities(os_version=self._get_os_version(),
+                                   logical_drives=logical_drives,
+                                   cdrom_drives=cdrom_drives,
+                                   volume_labels=volume_labels)
+
+    def get_capabilities(self):
+        with self._capabilities_lock:
+            if not self._capabilities:
+                self._capabilities = self._collect_capabilities()
+                LOG.debug('OS capabilities: %s' % (self._capabilities,))
+            return self._capabilities
+
+    def check_os_version(self, major, minor, build=0):
+        return self.get_capabilities().os_version >= (major, minor, build)
+
+    def get_volume_label(self, drive):
+        volume_labels = dict(self.get_capabilities().volume_labels)
+        if drive in volume_labels:
+            return volume_labels[drive]
+        return self._get_volume_label(drive)
+
+    def _get_private_sids(self):
+        token = win32security.OpenProcessToken(
+            win32process.GetCurrentProcess(), win32security.TOKEN_QUERY)
+        user_sid = win32security.GetTokenInformation(
+            token, win32security.TokenUser)[0]
+        system_sid = win32security.CreateWellKnownSid(
+            win32security.WinLocalSystemSid)
+        admins_sid = win32security.CreateWellKnownSid(
+            win32security.WinBuiltinAdministratorsSid)
+        return [system_sid, admins_sid, user_sid]
+
+    def _check_private_directory(self, path, sids):
+        sd = win32security.GetNamedSecurityInfo(
+            path, win32security.SE_FILE_OBJECT,
+            win32security.OWNER_SECURITY_INFORMATION |
+            win32security.DACL_SECURITY_INFORMATION)
+        if sd.GetSecurityDescriptorOwner() not in sids:
+            return False
+        control = sd.GetSecurityDescriptorControl()[0]
+        if not control & ntsecuritycon.SE_DACL_PROTECTED:
+            return False
+        dacl = sd.GetSecurityDescriptorDacl()
+        if dacl is None:
+            # A NULL DACL grants full access to everyone
+            return False
+        for i in xrange(dacl.GetAceCount()):
+            ace = dacl.GetAce(i)
+            # The SID is the last member of all the ACE types
+            if (ace[0][0] != ntsecuritycon.ACCESS_DENIED_ACE_TYPE and
+                    ace[-1] not in sids):
+                return False
+        return True
+
+    def create_private_directory(self, path):
+        """Creates a directory accessible only by SYSTEM, the
+        Administrators and the current user.
+
+        An existing directory is accepted only if it is owned by one of
+        them and its DACL does not grant access to anyone else.
+        """
+        sids = self._get_private_sids()
+        if os.path.isdir(path):
+            if not self._check_private_directory(path, sids):
+                raise Exception('Directory is not private: \'%s\'' % path)
+            return
+
+        parent_dir = os.path.dirname(path)
+        if parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+
+        dacl = win32security.ACL()
+        for sid in sids:
+            dacl.AddAccessAllowedAceEx(
+                ntsecuritycon.ACL_REVISION,
+                ntsecuritycon.OBJECT_INHERIT_ACE |
+                ntsecuritycon.CONTAINER_INHERIT_ACE,
+                ntsecuritycon.FILE_ALL_ACCESS, sid)
+        sd = win32security.SECURITY_DESCRIPTOR()
+        sd.SetSecurityDescriptorDacl(True, dacl, False)
+        # Permissions are not inherited from the parent directory
+        sd.SetSecurityDescriptorControl(ntsecuritycon.SE_DACL_PROTECTED,
+                                        ntsecuritycon.SE_DACL_PROTECTED)
+        sa = win32security.SECURITY_ATTRIBUTES()
+        sa.SECURITY_DESCRIPTOR = sd
+        # The directory is created with its DACL, leaving no window in
+        # which other users could add files to it
+        win32file.CreateDirectory(path, sa)
+
     def generate_random_password(self, length):
         while True:
             pwd = super(WindowsUtils, self).generate_random_password(length)
@@ -621,9 +695,7 @@ class WindowsUtils(base.BaseOSUtils):
         return drives
 
     def get_cdrom_drives(self):
-        drives = self._get_logical_drives()
-        return [d for d in drives if kernel32.GetDriveTypeW(d) ==
-                self.DRIVE_CDROM]
+        return list(self.get_capabilities().cdrom_drives)
 
     def _get_fw_protocol(self, protocol):
         if protocol == self.PROTOCOL_TCP:
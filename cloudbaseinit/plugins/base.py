@@ -17,6 +17,12 @@
 PLUGIN_EXECUTION_DONE = 1
 PLUGIN_EXECUTE_ON_NEXT_BOOT = 2
 
+# The plugin must not run while a reboot requested by a previous plugin
+# is pending
+PLUGIN_REBOOT_BARRIER = 1
+# The plugin can safely run before a pending reboot
+PLUGIN_REBOOT_TOLERANT = 2
+
 
 class BasePlugin(object):
     def get_name(self):
@@ -25,5 +31,20 @@ class BasePlugin(object):
     def get_os_requirements(self):
         return (None, None)
 
+    def get_shared_data_requirements(self):
+        # Returns a (read_keys, written_keys) tuple with the shared_data keys
+        # accessed by the plugin. None means that the accessed keys are not
+        # known, in which case the plugin is never executed in parallel
+        # with other plugins
+        return None
+
+    def get_reboot_policy(self):
+        return PLUGIN_REBOOT_BARRIER
+
+    def get_required_services(self):
+        # System services or resources that the plugin needs exclusive
+        # access to. Plugins sharing a service are never executed in parallel
+        return []
+
     def execute(self, service, shared_data):
         pass
@@ -0,0 +1,116 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import threadpool
+
+LOG = logging.getLogger(__name__)
+
+
+class PluginScheduler(object):
+    def __init__(self, plugins, max_workers):
+        self._plugins = plugins
+        self._max_workers = max_workers
+
+    def _get_requirements(self, plugin):
+        return (plugin.get_shared_data_requirements(),
+                set(plugin.get_required_services()))
+
+    def _are_dependent(self, requirements1, requirements2):
+        (shared_data1, services1) = requirements1
+        (shared_data2, services2) = requirements2
+
+        if shared_data1 is None or shared_data2 is None:
+            return True
+        if services1 & services2:
+            return True
+
+        (reads1, writes1) = map(set, shared_data1)
+        (reads2, writes2) = map(set, shared_data2)
+        return bool(writes1 & (reads2 | writes2) or reads1 & writes2)
+
+    def get_dependencies(self):
+        # A plugin depends on all the preceding plugins it conflicts with,
+        # which preserves the configured order for dependent plugins
+        requirements = [self._get_requirements(p) for p in self._plugins]
+
+        dependencies = []
+        for i in range(len(self._plugins)):
+            dependencies.append(set(
+                [j for j in range(i) if self._are_dependent(requirements[j],
+                                                            requirements[i])]))
+        return dependencies
+
+    def execute(self, exec_plugin, stop_on_reboot=True,
+                can_run_before_reboot=None):
+        dependencies = self.get_dependencies()
+        for (i, plugin) in enumerate(self._plugins):
+            LOG.debug('Plugin \'%(plugin_name)s\' depends on: %(deps)s' %
+                      {'plugin_name': plugin.get_name(),
+                       'deps': [self._plugins[j].get_name()
+                                for j in sorted(dependencies[i])]})
+
+        cond = threading.Condition()
+        pending = range(len(self._plugins))
+        running = set()
+        completed = set()
+        status = {'reboot_required': False}
+
+        def _run_plugin(i):
+            reboot_required = False
+            try:
+                reboot_required = exec_plugin(self._plugins[i])
+            except Exception, ex:
+                LOG.exception(ex)
+            finally:
+                with cond:
+                    running.discard(i)
+                    completed.add(i)
+                    if reboot_required:
+                        status['reboot_required'] = True
+                    cond.notify()
+
+        pool = threadpool.get_thread_pool(self._max_workers)
+        try:
+            with cond:
+                while True:
+                    reboot_pending = (stop_on_reboot and
+                                      status['reboot_required'])
+                    if not reboot_pending or can_run_before_reboot:
+                        for i in list(pending):
+                            if len(running) >= self._max_workers:
+                                break
+                            if (reboot_pending and not
+                                    can_run_before_reboot(self._plugins[i])):
+                                # As in a serial execution, the following
+                                # plugins are deferred as well
+                                break
+                            if dependencies[i] <= completed:
+                                pending.remove(i)
+                                running.add(i)
+                                pool.apply_async(_run_plugin, (i,))
+                    if not running:
+                        break
+                    cond.wait()
+        finally:
+            pool.close()
+            pool.join()
+
+        if pending:
+            LOG.info('Plugins deferred to the next boot: %s' %
+                     [self._plugins[i].get_name() for i in pending])
+
+        return status['reboot_required']
@@ -72,3 +72,10 @@ class CreateUserPlugin(base.BasePlugin):
                 LOG.error('Cannot add user to group "%s"' % group_name)
 
         return (base.PLUGIN_EXECUTION_DONE, False)
+
+    def get_shared_data_requirements(self):
+        return ([], [constants.SHARED_DATA_USERNAME,
+                     constants.SHARED_DATA_PASSWORD])
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -172,3 +172,9 @@ class ExtendVolumesPlugin(base.BasePlugin):
 
     def get_os_requirements(self):
         return ('win32', (5, 2))
+
+    def get_shared_data_requirements(self):
+        return ([], [])
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -84,3 +84,6 @@ class NetworkConfigPlugin(base.BasePlugin):
             gateway, dnsnameservers)
 
         return (base.PLUGIN_EXECUTION_DONE, reboot_required)
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
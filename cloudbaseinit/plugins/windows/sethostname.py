@@ -59,3 +59,9 @@ class SetHostNamePlugin(base.BasePlugin):
         reboot_required = osutils.set_host_name(new_host_name)
 
         return (base.PLUGIN_EXECUTION_DONE, reboot_required)
+
+    def get_shared_data_requirements(self):
+        return ([], [])
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -133,3 +133,10 @@ class SetUserPasswordPlugin(base.BasePlugin):
                     self._set_metadata_password(password, service)
 
         return (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, False)
+
+    def get_shared_data_requirements(self):
+        return ([constants.SHARED_DATA_USERNAME],
+                [constants.SHARED_DATA_PASSWORD])
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -21,6 +21,7 @@ from oslo.config import cfg
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins import base
+from cloudbaseinit.plugins import constants
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -53,3 +54,10 @@ class SetUserSSHPublicKeysPlugin(base.BasePlugin):
                 f.write(public_keys[k])
 
         return (base.PLUGIN_EXECUTION_DONE, False)
+
+    def get_shared_data_requirements(self):
+        # The user profile is created by the plugin setting the username
+        return ([constants.SHARED_DATA_USERNAME], [])
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -14,13 +14,34 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import email
+import zlib
+
+from oslo.config import cfg
 
 from cloudbaseinit.metadata.services import base as metadata_services_base
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.plugins import base
+from cloudbaseinit.plugins.windows import userdataledger
 from cloudbaseinit.plugins.windows import userdatautils
 from cloudbaseinit.plugins.windows.userdataplugins import factory
+from cloudbaseinit.utils import compression
+from cloudbaseinit.utils import multipart
+
+opts = [
+    cfg.IntOpt('user_data_max_decompressed_size', default=16 * 1024 * 1024,
+               help='Max. size in bytes of gzip compressed user data, and '
+               'of each gzip compressed MIME part, once decompressed'),
+    cfg.StrOpt('user_data_ledger_path', default=None,
+               help='Path of a JSON file recording the results of the '
+               'executed user data scripts. Scripts already executed '
+               'successfully for the instance are skipped, unless their '
+               'MIME part has a "X-Cloudbase-Init-Run-Always: true" '
+               'header. Scripts ending with the 1002 or 1003 exit codes '
+               'are executed again on the next boot.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
@@ -37,16 +58,44 @@ class UserDataPlugin(base.BasePlugin):
         if not user_data:
             return (base.PLUGIN_EXECUTION_DONE, False)
 
-        return self._process_user_data(user_data)
+        ledger = None
+        if CONF.user_data_ledger_path:
+            ledger = userdataledger.UserDataLedger(CONF.user_data_ledger_path)
+            ledger.load(service.get_instance_id())
+
+        try:
+            return self._process_user_data(user_data, ledger)
+        finally:
+            userdatautils.close_interpreter_hosts()
 
     def _parse_mime(self, user_data):
-        return email.message_from_string(user_data).walk()
+        # Each part is processed as soon as it is parsed
+        return multipart.iter_parts(
+            user_data,
+            max_decompressed_size=CONF.user_data_max_decompressed_size)
+
+    def _decompress_user_data(self, user_data):
+        try:
+            user_data = compression.decompress_gzip(
+                user_data, CONF.user_data_max_decompressed_size)
+        except (compression.DecompressedSizeExceededException,
+                zlib.error), ex:
+            LOG.error('Cannot decompress the user data: %s' % ex)
+            return None
 
-    def _process_user_data(self, user_data):
+        LOG.debug('Decompressed user data size: %d bytes' % len(user_data))
+        return user_data
+
+    def _process_user_data(self, user_data, ledger=None):
         plugin_status = base.PLUGIN_EXECUTION_DONE
         reboot = False
 
-        LOG.debug('User data content:\n%s' % user_data)
+        LOG.debug('User data size: %d bytes' % len(user_data))
+        if compression.is_gzip(user_data):
+            user_data = self._decompress_user_data(user_data)
+            if not user_data:
+                return (plugin_status, reboot)
+
         if user_data.startswith('Content-Type: multipart'):
             user_data_plugins_factory = factory.UserDataPluginsFactory()
             user_data_plugins = user_data_plugins_factory.load_plugins()
@@ -55,7 +104,8 @@ class UserDataPlugin(base.BasePlugin):
             for part in self._parse_mime(user_data):
                 (plugin_status, reboot) = self._process_part(part,
                                                              user_data_plugins,
-                                                             user_handlers)
+                                                             user_handlers,
+                                                             ledger)
                 if reboot:
                     break
 
@@ -65,9 +115,10 @@ class UserDataPlugin(base.BasePlugin):
 
             return (plugin_status, reboot)
         else:
-            return self._process_non_multi_part(user_data)
+            return self._process_non_multi_part(user_data, ledger)
 
-    def _process_part(self, part, user_data_plugins, user_handlers):
+    def _process_part(self, part, user_data_plugins, user_handlers,
+                      ledger=None):
         ret_val = None
         try:
             content_type = part.get_content_type()
@@ -93,7 +144,8 @@ class UserDataPlugin(base.BasePlugin):
                                                 user_handlers,
                                                 new_user_handlers)
                     else:
-                        ret_val = user_data_plugin.process(part)
+                        ret_val = self._execute_part(user_data_plugin, part,
+                                                     ledger)
         except Exception, ex:
             LOG.error('Exception during multipart part handling: '
                       '%(content_type)s, %(filename)s' %
@@ -103,6 +155,25 @@ class UserDataPlugin(base.BasePlugin):
 
         return self._get_plugin_return_value(ret_val)
 
+    def _execute_part(self, user_data_plugin, part, ledger):
+        payload = part.get_payload()
+        if not ledger or payload is None:
+            return user_data_plugin.process(part)
+
+        filename = part.get_filename()
+        run_always = part.get(userdataledger.RUN_ALWAYS_HEADER, '')
+        if (run_always.lower() != 'true' and
+                ledger.is_executed(payload, filename)):
+            LOG.info('Skipping the already executed user data part: %s' %
+                     filename)
+            return None
+
+        ret_val = user_data_plugin.process(part)
+        # Only the parts returning an exit code, i.e. scripts, are recorded
+        if ret_val is not None:
+            ledger.record(payload, filename, part.get_content_type(), ret_val)
+        return ret_val
+
     def _add_part_handlers(self, user_data_plugins, user_handlers,
                            new_user_handlers):
         handler_funcs = set()
@@ -140,6 +211,12 @@ class UserDataPlugin(base.BasePlugin):
 
         return (plugin_status, reboot)
 
-    def _process_non_multi_part(self, user_data):
+    def _process_non_multi_part(self, user_data, ledger=None):
+        if ledger and ledger.is_executed(user_data, None):
+            LOG.info('Skipping the already executed user data script')
+            return (base.PLUGIN_EXECUTION_DONE, False)
+
         ret_val = userdatautils.execute_user_data_script(user_data)
+        if ledger and ret_val is not None:
+            ledger.record(user_data, None, None, ret_val)
         return self._get_plugin_return_value(ret_val)
@@ -0,0 +1,100 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import hashlib
+import json
+import os
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Parts with this header set to "true" are executed at every boot
+RUN_ALWAYS_HEADER = 'X-Cloudbase-Init-Run-Always'
+
+# 1001 reports a successful execution requiring a reboot, while 1002 and
+# 1003 request another execution on the next boot
+_SUCCESS_EXIT_CODES = [0, 1001]
+
+
+class UserDataLedger(object):
+    """Records the executed user data parts in a JSON file.
+
+    Parts are identified by the SHA-256 hash of their payload and by their
+    file name. The file is indented, so that it can be read by operators.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._ledger = None
+
+    @staticmethod
+    def _get_key(payload, filename):
+        return '%s:%s' % (hashlib.sha256(payload).hexdigest(), filename or '')
+
+    def _read(self):
+        try:
+            with open(self._path, 'rb') as f:
+                return json.load(f)
+        except IOError:
+            return None
+        except ValueError, ex:
+            LOG.warning('Invalid user data ledger \'%(path)s\': %(ex)s' %
+                        {'path': self._path, 'ex': ex})
+            return None
+
+    def _save(self):
+        ledger_dir = os.path.dirname(self._path)
+        if ledger_dir and not os.path.exists(ledger_dir):
+            os.makedirs(ledger_dir)
+
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            json.dump(self._ledger, f, indent=4, sort_keys=True)
+        # os.rename does not overwrite existing files on Windows
+        if os.path.exists(self._path):
+            os.remove(self._path)
+        os.rename(tmp_path, self._path)
+
+    def load(self, instance_id):
+        ledger = self._read()
+        if ledger and ledger.get('instance_id') == instance_id:
+            LOG.debug('Using user data ledger: \'%s\'' % self._path)
+            self._ledger = ledger
+        else:
+            if ledger:
+                LOG.info('Instance id changed, resetting the user data '
+                         'ledger: \'%s\'' % self._path)
+            self._ledger = {'instance_id': instance_id, 'parts': {}}
+
+    def is_executed(self, payload, filename):
+        entry = self._ledger['parts'].get(self._get_key(payload, filename))
+        return bool(entry and entry['succeeded'])
+
+    def record(self, payload, filename, content_type, exit_code):
+        self._ledger['parts'][self._get_key(payload, filename)] = {
+            'filename': filename,
+            'content_type': content_type,
+            'size': len(payload),
+            'exit_code': exit_code,
+            'succeeded': exit_code in _SUCCESS_EXIT_CODES,
+            'executed_at': datetime.datetime.utcnow().isoformat(),
+        }
+        try:
+            self._save()
+        except (IOError, OSError), ex:
+            # The part has been executed, its result must not be lost
+            LOG.error('Failed to save the user data ledger \'%(path)s\': '
+                      '%(ex)s' % {'path': self._path, 'ex': ex})
@@ -13,16 +13,80 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
+
 from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.plugins import scheduler
 from cloudbaseinit.plugins.windows.userdataplugins import base
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    factory)
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+opts = [
+    cfg.IntOpt('cloud_config_max_workers', default=4,
+               help='Max. number of cloud-config directives applied in '
+               'parallel. Dependent directives are always applied in order'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
+# Exit code requesting a reboot once the user data has been processed
+_REBOOT_EXIT_CODE = 1001
+
 
 class CloudConfigPlugin(base.BaseUserDataPlugin):
     def __init__(self):
         super(CloudConfigPlugin, self).__init__("text/cloud-config")
 
+    def _load_config(self, data):
+        if not yaml:
+            LOG.error('PyYAML is required to process %s content' %
+                      self.get_mime_type())
+            return None
+
+        try:
+            config = yaml.safe_load(data)
+        except yaml.YAMLError, ex:
+            LOG.error('Invalid %(mime_type)s content: %(ex)s' %
+                      {'mime_type': self.get_mime_type(), 'ex': ex})
+            return None
+
+        if not isinstance(config, dict):
+            LOG.error('The %s content is not a mapping' %
+                      self.get_mime_type())
+            return None
+        return config
+
+    def _apply_directive(self, plugin, config):
+        LOG.info('Applying cloud-config directive: %s' % plugin.get_name())
+        return plugin.process(config[plugin.get_name()])
+
     def process(self, part):
-        LOG.info("%s content is currently not supported" %
-                 self.get_mime_type())
+        config = self._load_config(part.get_payload())
+        if not config:
+            return None
+
+        plugins_factory = factory.CloudConfigPluginsFactory()
+        plugins = [p for p in plugins_factory.load_plugins()
+                   if p.get_name() in config]
+        unsupported = set(config) - set([p.get_name() for p in plugins])
+        if unsupported:
+            LOG.info('Unsupported cloud-config directives: %s' %
+                     ', '.join(sorted(unsupported)))
+
+        plugin_scheduler = scheduler.PluginScheduler(
+            plugins, CONF.cloud_config_max_workers)
+        # A pending reboot does not prevent the other directives from running
+        reboot_required = plugin_scheduler.execute(
+            lambda plugin: self._apply_directive(plugin, config),
+            stop_on_reboot=False)
+
+        if reboot_required:
+            return _REBOOT_EXIT_CODE
@@ -0,0 +1,36 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+
+
+class BaseCloudConfigPlugin(object):
+    def __init__(self, directive):
+        self._directive = directive
+
+    def get_name(self):
+        return self._directive
+
+    def get_shared_data_requirements(self):
+        # Same semantics as for the main plugins, the cloud-config plugins
+        # are executed by the same scheduler
+        return ([], [])
+
+    def get_required_services(self):
+        return []
+
+    @abc.abstractmethod
+    def process(self, data):
+        """Applies the directive data, returning True if a reboot is needed."""
+        pass
@@ -0,0 +1,48 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo.config import cfg
+
+from cloudbaseinit.utils import classloader
+
+opts = [
+    cfg.ListOpt(
+        'cloud_config_plugins',
+        default=[
+            'cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins.'
+            'writefiles.WriteFilesPlugin',
+            'cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins.'
+            'sethostname.SetHostNamePlugin',
+            'cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins.'
+            'users.UsersPlugin',
+            'cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins.'
+            'sshauthorizedkeys.SSHAuthorizedKeysPlugin',
+            'cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins.'
+            'runcmd.RunCmdPlugin',
+        ],
+        help='List of enabled cloud-config directive plugins. Directives '
+        'depending on each other are applied in this order'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+
+class CloudConfigPluginsFactory(object):
+    def load_plugins(self):
+        plugins = []
+        cl = classloader.ClassLoader()
+        for class_path in CONF.cloud_config_plugins:
+            plugins.append(cl.load_class(class_path)())
+        return plugins
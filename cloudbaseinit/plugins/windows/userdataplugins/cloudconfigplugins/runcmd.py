@@ -0,0 +1,46 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    base)
+from cloudbaseinit.utils import processexecutor
+
+LOG = logging.getLogger(__name__)
+
+
+class RunCmdPlugin(base.BaseCloudConfigPlugin):
+    def __init__(self):
+        super(RunCmdPlugin, self).__init__('runcmd')
+
+    def get_shared_data_requirements(self):
+        # The commands can depend on the result of any other directive
+        return None
+
+    def process(self, data):
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        for (i, command) in enumerate(data):
+            # Strings are executed by the shell, lists are argument lists
+            shell = isinstance(command, basestring)
+            if not shell:
+                command = [str(arg) for arg in command]
+            (out, err, ret_val) = osutils.execute_process(command, shell)
+            # The arguments are not logged, as they can contain secrets
+            LOG.info('Command %(index)d (%(executable)s) ended with return '
+                     'code: %(ret_val)d' %
+                     {'index': i,
+                      'executable': processexecutor.get_executable(command),
+                      'ret_val': ret_val})
+        return False
@@ -0,0 +1,44 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.plugins.windows import sethostname
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    base)
+
+CONF = cfg.CONF
+CONF.import_opt('netbios_host_name_compatibility',
+                'cloudbaseinit.plugins.windows.sethostname')
+
+LOG = logging.getLogger(__name__)
+
+
+class SetHostNamePlugin(base.BaseCloudConfigPlugin):
+    def __init__(self):
+        super(SetHostNamePlugin, self).__init__('hostname')
+
+    def process(self, data):
+        new_host_name = str(data).split('.', 1)[0]
+        if (len(new_host_name) > sethostname.NETBIOS_HOST_NAME_MAX_LEN and
+                CONF.netbios_host_name_compatibility):
+            LOG.warn('Truncating host name for Netbios compatibility: %s' %
+                     new_host_name)
+            new_host_name = new_host_name[
+                :sethostname.NETBIOS_HOST_NAME_MAX_LEN]
+
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        return osutils.set_host_name(new_host_name)
@@ -0,0 +1,64 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    base)
+
+CONF = cfg.CONF
+CONF.import_opt('username', 'cloudbaseinit.plugins.windows.createuser')
+
+LOG = logging.getLogger(__name__)
+
+
+def add_authorized_keys(osutils, username, keys):
+    user_home = osutils.get_user_home(username)
+    if not user_home:
+        raise Exception('User profile not found: %s' % username)
+
+    user_ssh_dir = os.path.join(user_home, '.ssh')
+    if not os.path.exists(user_ssh_dir):
+        os.makedirs(user_ssh_dir)
+
+    authorized_keys_path = os.path.join(user_ssh_dir, 'authorized_keys')
+    existing_keys = []
+    if os.path.exists(authorized_keys_path):
+        with open(authorized_keys_path, 'r') as f:
+            existing_keys = [l.strip() for l in f]
+
+    new_keys = [k.strip() for k in keys if k.strip() not in existing_keys]
+    with open(authorized_keys_path, 'a') as f:
+        for key in new_keys:
+            f.write(key + '\n')
+    LOG.info('Added %(count)d SSH public keys for user "%(username)s"' %
+             {'count': len(new_keys), 'username': username})
+
+
+class SSHAuthorizedKeysPlugin(base.BaseCloudConfigPlugin):
+    def __init__(self):
+        super(SSHAuthorizedKeysPlugin, self).__init__('ssh_authorized_keys')
+
+    def get_required_services(self):
+        # The users and their profiles are created by the users directive
+        return ['users']
+
+    def process(self, data):
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        add_authorized_keys(osutils, CONF.username, data)
+        return False
@@ -0,0 +1,80 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    base)
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    sshauthorizedkeys)
+
+LOG = logging.getLogger(__name__)
+
+
+class UsersPlugin(base.BaseCloudConfigPlugin):
+    def __init__(self):
+        super(UsersPlugin, self).__init__('users')
+
+    def get_required_services(self):
+        return ['users']
+
+    def _get_groups(self, user):
+        groups = user.get('groups') or []
+        if isinstance(groups, basestring):
+            groups = groups.split(',')
+        return [g.strip() for g in groups if g.strip()]
+
+    def _create_user(self, osutils, user):
+        username = user['name']
+        password = user.get('plain_text_passwd')
+
+        if osutils.user_exists(username):
+            if password:
+                LOG.info('Setting password for existing user "%s"' %
+                         username)
+                osutils.set_user_password(username, password)
+        else:
+            LOG.info('Creating user "%s"' % username)
+            if not password:
+                password = osutils.generate_random_password(14)
+            osutils.create_user(username, password)
+            # Create a user profile in order to add the SSH public keys
+            token = osutils.create_user_logon_session(username, password,
+                                                      True)
+            osutils.close_user_logon_session(token)
+
+        for group_name in self._get_groups(user):
+            try:
+                osutils.add_user_to_local_group(username, group_name)
+            except Exception, ex:
+                LOG.exception(ex)
+                LOG.error('Cannot add user to group "%s"' % group_name)
+
+        if user.get('ssh_authorized_keys'):
+            sshauthorizedkeys.add_authorized_keys(
+                osutils, username, user['ssh_authorized_keys'])
+
+    def process(self, data):
+        osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+        for user in data:
+            if not isinstance(user, dict):
+                # e.g. the "default" user of cloud-init
+                LOG.info('Skipping user: %s' % user)
+                continue
+            try:
+                self._create_user(osutils, user)
+            except Exception, ex:
+                LOG.error('Failed to create user: %s' % user.get('name'))
+                LOG.exception(ex)
+        return False
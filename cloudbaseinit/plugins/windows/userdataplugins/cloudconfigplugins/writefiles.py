@@ -0,0 +1,91 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import base64
+import os
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    base)
+from cloudbaseinit.utils import compression
+
+CONF = cfg.CONF
+CONF.import_opt('user_data_max_decompressed_size',
+                'cloudbaseinit.plugins.windows.userdata')
+
+LOG = logging.getLogger(__name__)
+
+_BASE64_ENCODINGS = ['b64', 'base64']
+_GZIP_ENCODINGS = ['gz', 'gzip']
+_GZIP_BASE64_ENCODINGS = ['gz+b64', 'gz+base64', 'gzip+b64', 'gzip+base64']
+
+
+def decode_content(content, encoding):
+    encoding = (encoding or '').lower()
+    if encoding in _BASE64_ENCODINGS + _GZIP_BASE64_ENCODINGS:
+        content = base64.b64decode(content)
+    if encoding in _GZIP_ENCODINGS + _GZIP_BASE64_ENCODINGS:
+        content = compression.decompress_gzip(
+            content, CONF.user_data_max_decompressed_size)
+    elif encoding and encoding not in _BASE64_ENCODINGS:
+        raise ValueError('Unsupported encoding: %s' % encoding)
+    return content
+
+
+def get_mode(permissions):
+    # YAML parses unquoted octal values, e.g. 0644, as integers
+    if isinstance(permissions, (int, long)):
+        return permissions
+    return int(permissions, 8)
+
+
+class WriteFilesPlugin(base.BaseCloudConfigPlugin):
+    def __init__(self):
+        super(WriteFilesPlugin, self).__init__('write_files')
+
+    def _write_file(self, entry):
+        path = os.path.abspath(os.path.expandvars(entry['path']))
+        content = decode_content(entry.get('content', ''),
+                                 entry.get('encoding'))
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+
+        dir_name = os.path.dirname(path)
+        if not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+
+        mode = 'ab' if entry.get('append') else 'wb'
+        with open(path, mode) as f:
+            f.write(content)
+
+        permissions = entry.get('permissions')
+        if permissions is not None:
+            # Only the read-only flag is applied on Windows
+            os.chmod(path, get_mode(permissions))
+        if entry.get('owner'):
+            LOG.info('Setting the owner of "%s" is not supported' % path)
+
+        LOG.info('Written %(size)d bytes to "%(path)s"' %
+                 {'size': len(content), 'path': path})
+
+    def process(self, data):
+        for entry in data:
+            try:
+                self._write_file(entry)
+            except Exception, ex:
+                LOG.error('Failed to write file: %s' % entry.get('path'))
+                LOG.exception(ex)
+        return False
@@ -13,28 +13,57 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import os
-import tempfile
+from oslo.config import cfg
 
 from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins.windows.userdataplugins import base
-from cloudbaseinit.utils import classloader
+from cloudbaseinit.utils import modulecache
+
+opts = [
+    cfg.StrOpt('part_handler_cache_dir',
+               default=None,
+               help='Directory where the compiled part handlers are cached '
+               'across reboots. The directory must be accessible only by '
+               'SYSTEM and the Administrators, it is created with such '
+               'permissions if missing and the cache is disabled otherwise. '
+               'Part handlers are compiled at every boot if not set '
+               '(default)'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
+# Part handlers are shared by all the plugin instances of the process
+_module_cache = None
+
+
+def _get_module_cache():
+    global _module_cache
+    if not _module_cache:
+        cache_dir = CONF.part_handler_cache_dir
+        if cache_dir:
+            try:
+                osutils = osutils_factory.OSUtilsFactory().get_os_utils()
+                osutils.create_private_directory(cache_dir)
+            except Exception, ex:
+                LOG.error('Disabling the part handler cache, the cache '
+                          'directory cannot be made private')
+                LOG.exception(ex)
+                cache_dir = None
+        _module_cache = modulecache.ModuleCache(cache_dir)
+    return _module_cache
+
 
 class PartHandlerPlugin(base.BaseUserDataPlugin):
     def __init__(self):
         super(PartHandlerPlugin, self).__init__("text/part-handler")
 
     def process(self, part):
-        temp_dir = tempfile.gettempdir()
-        part_handler_path = os.path.join(temp_dir, part.get_filename())
-
-        with open(part_handler_path, "wb") as f:
-            f.write(part.get_payload())
-
-        part_handler = classloader.ClassLoader().load_module(part_handler_path)
+        part_handler = _get_module_cache().load_source(
+            part.get_payload(), part.get_filename() or 'part-handler')
 
         if (part_handler and
                 hasattr(part_handler, "list_types") and
@@ -19,6 +19,8 @@ import os
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins.windows.userdataplugins import base
+from cloudbaseinit.plugins.windows import userdatautils
+from cloudbaseinit.utils import interpreterhost
 
 LOG = logging.getLogger(__name__)
 
@@ -36,16 +38,20 @@ class ShellScriptPlugin(base.BaseUserDataPlugin):
         if file_name.endswith(".cmd"):
             args = [target_path]
             shell = True
+            interpreter = None
         elif file_name.endswith(".sh"):
             args = ['bash.exe', target_path]
             shell = False
+            interpreter = interpreterhost.INTERPRETER_BASH
         elif file_name.endswith(".py"):
             args = ['python.exe', target_path]
             shell = False
+            interpreter = interpreterhost.INTERPRETER_PYTHON
         elif file_name.endswith(".ps1"):
             args = ['powershell.exe', '-ExecutionPolicy', 'RemoteSigned',
                     '-NonInteractive', target_path]
             shell = False
+            interpreter = interpreterhost.INTERPRETER_POWERSHELL
         else:
             # Unsupported
             LOG.warning('Unsupported script type')
@@ -54,11 +60,11 @@ class ShellScriptPlugin(base.BaseUserDataPlugin):
         try:
             with open(target_path, 'wb') as f:
                 f.write(part.get_payload())
-            (out, err, ret_val) = osutils.execute_process(args, shell)
+            # The output lines are logged as the script produces them
+            (out, err, ret_val) = userdatautils.execute_script(
+                osutils, interpreter, args, shell)
 
             LOG.info('User_data script ended with return code: %d' % ret_val)
-            LOG.debug('User_data stdout:\n%s' % out)
-            LOG.debug('User_data stderr:\n%s' % err)
 
             return ret_val
         except Exception, ex:
@@ -15,13 +15,60 @@
 import os
 import re
 import tempfile
+import threading
 import uuid
 
+from oslo.config import cfg
+
 from cloudbaseinit.openstack.common import log as logging
 from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.utils import interpreterhost
+
+opts = [
+    cfg.ListOpt('user_data_interpreter_hosts', default=[],
+                help='Interpreters kept running to execute the user data '
+                'scripts, avoiding their startup time on every script. '
+                'Supported values: powershell, bash, python. Python scripts '
+                'run in the same interpreter share the imported modules.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = logging.getLogger(__name__)
 
+_interpreter_host_pool = None
+_interpreter_host_pool_lock = threading.Lock()
+
+
+def _get_interpreter_host_pool(osutils):
+    global _interpreter_host_pool
+    with _interpreter_host_pool_lock:
+        if not _interpreter_host_pool:
+            _interpreter_host_pool = interpreterhost.InterpreterHostPool(
+                osutils.kill_process_tree)
+        return _interpreter_host_pool
+
+
+def close_interpreter_hosts():
+    global _interpreter_host_pool
+    with _interpreter_host_pool_lock:
+        pool = _interpreter_host_pool
+        _interpreter_host_pool = None
+    if pool:
+        pool.close()
+
+
+def execute_script(osutils, interpreter, args, shell):
+    """Executes the script whose path is the last of args.
+
+    Returns the (stdout, stderr, exit_code) tuple of the script.
+    """
+    if interpreter in CONF.user_data_interpreter_hosts:
+        pool = _get_interpreter_host_pool(osutils)
+        return pool.execute(interpreter, args[0], args[-1])
+    return osutils.execute_process(args, shell)
+
 
 def execute_user_data_script(user_data):
     osutils = osutils_factory.OSUtilsFactory().get_os_utils()
@@ -31,19 +78,23 @@ def execute_user_data_script(user_data):
         target_path += '.cmd'
         args = [target_path]
         shell = True
+        interpreter = None
     elif re.search(r'^#!/usr/bin/env\spython\s', user_data, re.I):
         target_path += '.py'
         args = ['python.exe', target_path]
         shell = False
+        interpreter = interpreterhost.INTERPRETER_PYTHON
     elif re.search(r'^#!', user_data, re.I):
         target_path += '.sh'
         args = ['bash.exe', target_path]
         shell = False
+        interpreter = interpreterhost.INTERPRETER_BASH
     elif re.search(r'^#ps1\s', user_data, re.I):
         target_path += '.ps1'
         args = ['powershell.exe', '-ExecutionPolicy', 'RemoteSigned',
                 '-NonInteractive', target_path]
         shell = False
+        interpreter = interpreterhost.INTERPRETER_POWERSHELL
     elif re.search(r'^#ps1_sysnative\s', user_data, re.I):
         if os.path.isdir(os.path.expandvars('%windir%\\sysnative')):
             target_path += '.ps1'
@@ -53,6 +104,7 @@ def execute_user_data_script(user_data):
                     '-ExecutionPolicy',
                     'RemoteSigned', '-NonInteractive', target_path]
             shell = False
+            interpreter = interpreterhost.INTERPRETER_POWERSHELL
         else:
             # Unable to validate sysnative presence
             LOG.warning('Unable to validate sysnative folder presence. '
@@ -67,11 +119,11 @@ def execute_user_data_script(user_data):
     try:
         with open(target_path, 'wb') as f:
             f.write(user_data)
-        (out, err, ret_val) = osutils.execute_process(args, shell)
+        # The output lines are logged as the script produces them
+        (out, err, ret_val) = execute_script(osutils, interpreter, args,
+                                             shell)
 
         LOG.info('User_data script ended with return code: %d' % ret_val)
-        LOG.debug('User_data stdout:\n%s' % out)
-        LOG.debug('User_data stderr:\n%s' % err)
 
         return ret_val
     except Exception, ex:
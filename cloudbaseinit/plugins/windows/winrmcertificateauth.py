@@ -101,3 +101,14 @@ class ConfigWinRMCertificateAuthPlugin(base.BasePlugin):
                                          user_name, password)
 
         return (base.PLUGIN_EXECUTION_DONE, False)
+
+    def get_shared_data_requirements(self):
+        return ([constants.SHARED_DATA_USERNAME,
+                 constants.SHARED_DATA_PASSWORD],
+                [constants.SHARED_DATA_PASSWORD])
+
+    def get_required_services(self):
+        return ["WinRM"]
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
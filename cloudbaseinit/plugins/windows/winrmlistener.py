@@ -90,3 +90,12 @@ class ConfigWinRMListenerPlugin(base.BasePlugin):
                                      osutils.PROTOCOL_TCP)
 
         return (base.PLUGIN_EXECUTION_DONE, False)
+
+    def get_shared_data_requirements(self):
+        return ([], [])
+
+    def get_required_services(self):
+        return [self._winrm_service_name]
+
+    def get_reboot_policy(self):
+        return base.PLUGIN_REBOOT_TOLERANT
@@ -0,0 +1,196 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Builds minimal ISO 9660 images for testing purposes."""
+
+import struct
+
+SECTOR_SIZE = 2048
+
+
+def _both_endian_32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def _both_endian_16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def _dir_record(name, extent, size, is_dir, system_use=''):
+    padding = '\0' if len(name) % 2 == 0 else ''
+    length = 33 + len(name) + len(padding) + len(system_use)
+    if length % 2:
+        system_use += '\0'
+        length += 1
+    return (struct.pack('<BB', length, 0) + _both_endian_32(extent) +
+            _both_endian_32(size) + '\0' * 7 +
+            struct.pack('<BBB', 2 if is_dir else 0, 0, 0) +
+            _both_endian_16(1) + struct.pack('<B', len(name)) + name +
+            padding + system_use)
+
+
+class _Directory(object):
+    def __init__(self):
+        self.children = {}
+        self.extent = 0
+        self.size = 0
+
+
+class _File(object):
+    def __init__(self, data):
+        self.data = data
+        self.extent = 0
+
+
+def _build_tree(files):
+    root = _Directory()
+    for (path, data) in sorted(files.items()):
+        parts = path.split('/')
+        directory = root
+        for part in parts[:-1]:
+            directory = directory.children.setdefault(part, _Directory())
+        directory.children[parts[-1]] = _File(data)
+    return root
+
+
+def _iter_directories(directory):
+    yield directory
+    for child in directory.children.values():
+        if isinstance(child, _Directory):
+            for d in _iter_directories(child):
+                yield d
+
+
+def _iter_files(directory):
+    for child in directory.children.values():
+        if isinstance(child, _Directory):
+            for f in _iter_files(child):
+                yield f
+        else:
+            yield child
+
+
+class _NameEncoder(object):
+    def __init__(self, joliet, rock_ridge):
+        self._joliet = joliet
+        self._rock_ridge = rock_ridge
+
+    def encode(self, name, is_dir):
+        if self._joliet:
+            return (name + ('' if is_dir else ';1')).encode('utf-16-be')
+        if self._rock_ridge:
+            # Mangled names, the real ones are in the NM entries
+            return 'F%07d' % (abs(hash(name)) % 10000000) + (
+                '' if is_dir else '.;1')
+        return name.upper() + ('' if is_dir else ';1')
+
+    def system_use(self, name):
+        if self._rock_ridge and not self._joliet:
+            return 'NM' + struct.pack('<BBB', 5 + len(name), 1, 0) + name
+        return ''
+
+
+def _get_records(directory, parent, encoder):
+    records = [_dir_record('\0', directory.extent, directory.size, True),
+               _dir_record('\1', parent.extent, parent.size, True)]
+    for name in sorted(directory.children):
+        child = directory.children[name]
+        is_dir = isinstance(child, _Directory)
+        size = child.size if is_dir else len(child.data)
+        records.append(_dir_record(encoder.encode(name, is_dir),
+                                   child.extent, size, is_dir,
+                                   encoder.system_use(name)))
+    return records
+
+
+def _pack_records(records):
+    data = ''
+    for record in records:
+        sector_left = SECTOR_SIZE - len(data) % SECTOR_SIZE
+        if len(record) > sector_left:
+            data += '\0' * sector_left
+        data += record
+    return data
+
+
+def _get_sectors(size):
+    return max(1, (size + SECTOR_SIZE - 1) // SECTOR_SIZE)
+
+
+def _volume_descriptor(descriptor_type, label, volume_sectors, root,
+                       joliet=False):
+    if joliet:
+        volume_id = (label.encode('utf-16-be') + '\0 ' * 16)[:32]
+        escape_sequences = '%/E'
+    else:
+        volume_id = label.ljust(32)
+        escape_sequences = ''
+    data = (struct.pack('<B', descriptor_type) + 'CD001' +
+            struct.pack('<BB', 1, 0) + ' ' * 32 + volume_id + '\0' * 8 +
+            _both_endian_32(volume_sectors) +
+            escape_sequences.ljust(32, '\0') + _both_endian_16(1) +
+            _both_endian_16(1) + _both_endian_16(SECTOR_SIZE) +
+            '\0' * 24 + _dir_record('\0', root.extent, root.size, True))
+    return data.ljust(SECTOR_SIZE, '\0')
+
+
+def build_iso_image(files, label='config-2', joliet=True, rock_ridge=False):
+    """Returns an ISO image including the given {path: data} files."""
+    trees = [(_build_tree(files), _NameEncoder(False, rock_ridge))]
+    if joliet:
+        trees.append((_build_tree(files), _NameEncoder(True, False)))
+
+    # System area, volume descriptors and terminator
+    next_sector = 16 + len(trees) + 1
+    for (root, encoder) in trees:
+        for directory in _iter_directories(root):
+            directory.size = len(_pack_records(
+                _get_records(directory, directory, encoder)))
+        for directory in _iter_directories(root):
+            directory.extent = next_sector
+            next_sector += _get_sectors(directory.size)
+
+    # The file data is shared by the trees
+    file_extents = {}
+    for (root, encoder) in trees:
+        for f in _iter_files(root):
+            if id(f.data) not in file_extents:
+                file_extents[id(f.data)] = next_sector
+                next_sector += _get_sectors(len(f.data))
+            f.extent = file_extents[id(f.data)]
+
+    image = bytearray(SECTOR_SIZE * next_sector)
+
+    def _write(sector, data):
+        offset = sector * SECTOR_SIZE
+        image[offset:offset + len(data)] = data
+
+    _write(16, _volume_descriptor(1, label.upper(), next_sector,
+                                  trees[0][0]))
+    if joliet:
+        _write(17, _volume_descriptor(2, label, next_sector, trees[1][0],
+                                      joliet=True))
+    _write(16 + len(trees), struct.pack('<B', 255) + 'CD001' + '\1')
+
+    for (root, encoder) in trees:
+        parents = {id(root): root}
+        for directory in _iter_directories(root):
+            for child in directory.children.values():
+                parents[id(child)] = directory
+            _write(directory.extent, _pack_records(
+                _get_records(directory, parents[id(directory)], encoder)))
+        for f in _iter_files(root):
+            _write(f.extent, f.data)
+
+    return str(image)
@@ -0,0 +1,253 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Builds minimal FAT12, FAT16 and FAT32 images for testing purposes."""
+
+import re
+import struct
+
+SECTOR_SIZE = 512
+DIR_ENTRY_SIZE = 32
+
+# Sizes resulting in cluster counts in the range of each FAT type, with
+# one sector per cluster
+_TOTAL_SECTORS = {12: 2048, 16: 8192, 32: 70000}
+_END_OF_CHAIN = {12: 0xFFF, 16: 0xFFFF, 32: 0x0FFFFFFF}
+
+
+class _Directory(object):
+    def __init__(self):
+        self.children = {}
+        self.cluster = 0
+        self.clusters = []
+
+
+class _File(object):
+    def __init__(self, data):
+        self.data = data
+        self.cluster = 0
+        self.clusters = []
+
+
+def _build_tree(files):
+    root = _Directory()
+    for (path, data) in sorted(files.items()):
+        parts = path.split('/')
+        directory = root
+        for part in parts[:-1]:
+            directory = directory.children.setdefault(part, _Directory())
+        directory.children[parts[-1]] = _File(data)
+    return root
+
+
+def _iter_nodes(directory):
+    yield directory
+    for child in directory.children.values():
+        if isinstance(child, _Directory):
+            for node in _iter_nodes(child):
+                yield node
+        else:
+            yield child
+
+
+def _get_lfn_checksum(short_name):
+    checksum = 0
+    for c in short_name:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + ord(c)) & 0xFF
+    return checksum
+
+
+def _lfn_entries(name, short_name):
+    data = name.encode('utf-16-le')
+    if len(name) % 13:
+        data += '\0\0'
+    data += '\xff\xff' * (-len(data) // 2 % 13)
+    checksum = _get_lfn_checksum(short_name)
+    chunks = [data[i:i + 26] for i in range(0, len(data), 26)]
+
+    entries = []
+    for (i, chunk) in enumerate(chunks):
+        sequence = i + 1
+        if sequence == len(chunks):
+            sequence |= 0x40
+        entries.insert(0, struct.pack('<B10sBBB12sH4s', sequence, chunk[:10],
+                                      0x0F, 0, checksum, chunk[10:22], 0,
+                                      chunk[22:]))
+    return entries
+
+
+def _short_entry(short_name, attributes, cluster, size, nt_flags=0):
+    return struct.pack('<11sBB7xH4xHI', short_name, attributes, nt_flags,
+                       cluster >> 16, cluster & 0xFFFF, size)
+
+
+def _get_name_entries(name, index, long_names):
+    match = re.match(r'^([A-Za-z0-9_-]{1,8})(?:\.([A-Za-z0-9_-]{1,3}))?$',
+                     name)
+    if match:
+        (base, ext) = match.groups()
+        ext = ext or ''
+        short_name = base.upper().ljust(8) + ext.upper().ljust(3)
+        if name == name.upper():
+            return ([], short_name, 0)
+        if not long_names:
+            nt_flags = ((0x08 if base.islower() else 0) |
+                        (0x10 if ext.islower() else 0))
+            return ([], short_name, nt_flags)
+
+    if not long_names:
+        raise ValueError('Not a valid 8.3 name: %s' % name)
+
+    (base, sep, ext) = name.rpartition('.')
+    if not sep:
+        (base, ext) = (ext, '')
+    base = re.sub(r'[^A-Z0-9]', '', base.upper())[:6]
+    ext = re.sub(r'[^A-Z0-9]', '', ext.upper())[:3]
+    short_name = ('%s~%d' % (base, index)).ljust(8) + ext.ljust(3)
+    return (_lfn_entries(name, short_name), short_name, 0)
+
+
+def _get_entries(directory, parent, is_root, label, long_names):
+    entries = []
+    if is_root:
+        if label:
+            entries.append(_short_entry(label.upper().ljust(11)[:11], 0x08,
+                                        0, 0))
+    else:
+        entries.append(_short_entry('.'.ljust(11), 0x10, directory.cluster,
+                                    0))
+        entries.append(_short_entry('..'.ljust(11), 0x10, parent.cluster, 0))
+
+    for (index, name) in enumerate(sorted(directory.children)):
+        child = directory.children[name]
+        is_dir = isinstance(child, _Directory)
+        (lfn_entries, short_name, nt_flags) = _get_name_entries(
+            name, index + 1, long_names)
+        entries += lfn_entries
+        entries.append(_short_entry(
+            short_name, 0x10 if is_dir else 0x20, child.cluster,
+            0 if is_dir else len(child.data), nt_flags))
+    return ''.join(entries)
+
+
+def _set_fat_entry(fat, fat_type, cluster, value):
+    if fat_type == 12:
+        offset = cluster + cluster // 2
+        if cluster & 1:
+            fat[offset] = (fat[offset] & 0x0F) | ((value & 0x0F) << 4)
+            fat[offset + 1] = value >> 4
+        else:
+            fat[offset] = value & 0xFF
+            fat[offset + 1] = (fat[offset + 1] & 0xF0) | (value >> 8)
+    elif fat_type == 16:
+        struct.pack_into('<H', fat, cluster * 2, value)
+    else:
+        struct.pack_into('<I', fat, cluster * 4, value)
+
+
+def _boot_sector(fat_type, total_sectors, reserved_sectors, root_entries,
+                 fat_sectors, root_cluster, label):
+    label = label.upper().ljust(11)[:11]
+    fs_type = ('FAT%d' % fat_type).ljust(8)
+    if fat_type == 32:
+        bpb = struct.pack('<HBHBHHBHHHII', SECTOR_SIZE, 1, reserved_sectors,
+                          2, 0, 0, 0xF8, 0, 63, 255, 0, total_sectors)
+        ebpb = struct.pack('<IHHIHH12xBBBI11s8s', fat_sectors, 0, 0,
+                           root_cluster, 1, 6, 0x80, 0, 0x29, 0x1234, label,
+                           fs_type)
+    else:
+        bpb = struct.pack('<HBHBHHBHHHII', SECTOR_SIZE, 1, reserved_sectors,
+                          2, root_entries, total_sectors, 0xF8, fat_sectors,
+                          63, 255, 0, 0)
+        ebpb = struct.pack('<BBBI11s8s', 0x80, 0, 0x29, 0x1234, label,
+                           fs_type)
+    data = '\xeb\x3c\x90' + 'MSWIN4.1' + bpb + ebpb
+    return data.ljust(510, '\0') + '\x55\xaa'
+
+
+def build_vfat_image(files, label='config-2', fat_type=16, long_names=True,
+                     fragmented=False, boot_sector_label=True):
+    """Returns a FAT image including the given {path: data} files.
+
+    fragmented leaves a free cluster after every allocated cluster, so
+    that no cluster chain is contiguous. When boot_sector_label is False
+    the label is only stored in the root directory.
+    """
+    total_sectors = _TOTAL_SECTORS[fat_type]
+    reserved_sectors = 32 if fat_type == 32 else 1
+    root_entries = 0 if fat_type == 32 else 512
+    fat_sectors = (((total_sectors + 2) * fat_type // 8 + SECTOR_SIZE - 1) //
+                   SECTOR_SIZE)
+    root_dir_sectors = root_entries * DIR_ENTRY_SIZE // SECTOR_SIZE
+    root_dir_offset = (reserved_sectors + 2 * fat_sectors) * SECTOR_SIZE
+    data_offset = root_dir_offset + root_dir_sectors * SECTOR_SIZE
+
+    root = _build_tree(files)
+    next_cluster = [2]
+
+    def _allocate(node, size):
+        count = (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+        for i in range(count):
+            node.clusters.append(next_cluster[0])
+            next_cluster[0] += 2 if fragmented else 1
+        node.cluster = node.clusters[0] if node.clusters else 0
+
+    # The directory sizes do not depend on the allocated clusters
+    parents = {id(root): root}
+    for node in _iter_nodes(root):
+        if isinstance(node, _Directory):
+            for child in node.children.values():
+                parents[id(child)] = node
+            if node is not root or fat_type == 32:
+                _allocate(node, max(1, len(_get_entries(
+                    node, parents[id(node)], node is root, label,
+                    long_names))))
+        else:
+            _allocate(node, len(node.data))
+
+    image = bytearray(total_sectors * SECTOR_SIZE)
+    fat = bytearray(fat_sectors * SECTOR_SIZE)
+    _set_fat_entry(fat, fat_type, 0, _END_OF_CHAIN[fat_type] - 7)
+    _set_fat_entry(fat, fat_type, 1, _END_OF_CHAIN[fat_type])
+
+    def _write(offset, data):
+        image[offset:offset + len(data)] = data
+
+    for node in _iter_nodes(root):
+        if isinstance(node, _Directory):
+            data = _get_entries(node, parents[id(node)], node is root, label,
+                                long_names)
+        else:
+            data = node.data
+
+        if node is root and fat_type != 32:
+            _write(root_dir_offset, data)
+            continue
+
+        for (i, cluster) in enumerate(node.clusters):
+            if i + 1 < len(node.clusters):
+                _set_fat_entry(fat, fat_type, cluster, node.clusters[i + 1])
+            else:
+                _set_fat_entry(fat, fat_type, cluster,
+                               _END_OF_CHAIN[fat_type])
+            _write(data_offset + (cluster - 2) * SECTOR_SIZE,
+                   data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE])
+
+    for i in range(2):
+        _write((reserved_sectors + i * fat_sectors) * SECTOR_SIZE, fat)
+
+    _write(0, _boot_sector(fat_type, total_sectors, reserved_sectors,
+                           root_entries, fat_sectors, root.cluster,
+                           label if boot_sector_label else 'NO NAME'))
+    return str(image)
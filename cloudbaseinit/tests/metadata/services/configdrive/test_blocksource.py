@@ -0,0 +1,112 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import ctypes
+import mock
+import os
+import tempfile
+import unittest
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+
+
+class BlockReaderTests(unittest.TestCase):
+    def setUp(self):
+        self._data = ''.join([chr(i % 251) for i in range(10000)])
+        (fd, self._path) = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._data)
+        self._reader = blocksource.BlockReader(
+            blocksource.FileBlockDevice(self._path), chunk_size=4000)
+
+    def tearDown(self):
+        self._reader.close()
+        os.remove(self._path)
+
+    def test_read_at_sequential(self):
+        data = ''.join([self._reader.read_at(i, 100)
+                        for i in range(0, 10000, 100)])
+        self.assertEqual(data, self._data)
+        # The chunk size is aligned to the sector size
+        self.assertEqual(self._reader.get_stats(),
+                         {'device_reads': 3, 'device_seeks': 1})
+
+    def test_read_at_unaligned(self):
+        self.assertEqual(self._reader.read_at(3500, 2000),
+                         self._data[3500:5500])
+        self.assertEqual(self._reader.read_at(700, 10),
+                         self._data[700:710])
+        self.assertEqual(self._reader.get_stats(),
+                         {'device_reads': 2, 'device_seeks': 2})
+
+    def test_read_at_end_of_device(self):
+        self.assertEqual(self._reader.read_at(9900, 200), self._data[9900:])
+        self.assertEqual(self._reader.read_at(10000, 10), '')
+        # The last chunk is limited to the device size
+        self.assertEqual(self._reader.get_stats(),
+                         {'device_reads': 1, 'device_seeks': 1})
+
+
+class MemoryBlockSourceTests(unittest.TestCase):
+    def test_read_at(self):
+        data = os.urandom(3 * 1024 * 1024 + 10)
+        source = blocksource.MemoryBlockSource(
+            blocksource.BufferBlockSource(data), len(data) - 5)
+        try:
+            self.assertEqual(source.read_at(1024 * 1024 - 5, 20),
+                             data[1024 * 1024 - 5:1024 * 1024 + 15])
+            self.assertEqual(source.read_at(len(data) - 10, 10),
+                             data[-10:-5])
+        finally:
+            source.close()
+
+    def test_unexpected_end(self):
+        self.assertRaises(IOError, blocksource.MemoryBlockSource,
+                          blocksource.BufferBlockSource('fake data'), 100)
+
+
+class PhysicalDiskBlockDeviceTests(unittest.TestCase):
+    def setUp(self):
+        self._phys_disk = mock.MagicMock()
+        self._phys_disk.get_geometry.return_value.BytesPerSector = 512
+        self._phys_disk.get_size.return_value = 4 * 1024 * 1024
+        self._phys_disk.allocate_buffer.side_effect = (
+            ctypes.create_string_buffer)
+        self._device = blocksource.PhysicalDiskBlockDevice(self._phys_disk)
+
+    def test_block_reader(self):
+        data = 'x' * 100 + 'fake data' + 'x' * 403
+
+        def _read_into(buf, size):
+            ctypes.memmove(buf, data, len(data))
+            return len(data)
+
+        self._phys_disk.read_into.side_effect = _read_into
+        reader = blocksource.BlockReader(self._device)
+
+        self.assertEqual(reader.read_at(100, 9), 'fake data')
+        self._phys_disk.seek.assert_called_once_with(0)
+        self._phys_disk.read_into.assert_called_once_with(
+            mock.ANY, blocksource.BlockReader.DEFAULT_CHUNK_SIZE)
+
+    def test_block_reader_end_of_disk(self):
+        self._phys_disk.get_size.return_value = 1024 * 1024 + 1024
+        self._phys_disk.read_into.side_effect = lambda buf, size: size
+        reader = blocksource.BlockReader(self._device)
+
+        self.assertEqual(len(reader.read_at(1024 * 1024 + 512, 4096)), 512)
+        self.assertEqual(reader.read_at(1024 * 1024 + 1024, 10), '')
+        # The read is limited to the last sector
+        self._phys_disk.seek.assert_called_once_with(1024 * 1024 + 512)
+        self._phys_disk.read_into.assert_called_once_with(mock.ANY, 512)
@@ -23,6 +23,8 @@ import uuid
 
 from oslo.config import cfg
 
+from cloudbaseinit.metadata.services import base
+
 CONF = cfg.CONF
 _win32com_mock = mock.MagicMock()
 _ctypes_mock = mock.MagicMock()
@@ -65,6 +67,71 @@ class ConfigDriveServiceTest(unittest.TestCase):
         self.assertEqual(self._config_drive._metadata_path, fake_path)
         self.assertEqual(response, fake_path_found)
 
+    @mock.patch('cloudbaseinit.metadata.services.configdrive.manager.'
+                'ConfigDriveManager.get_config_drive')
+    def test_load_lazy(self, mock_get_config_drive):
+        CONF.set_override('config_drive_lazy_load', True)
+        try:
+            response = self._config_drive.load()
+        finally:
+            CONF.clear_override('config_drive_lazy_load')
+        mock_get_config_drive.assert_called_once_with(
+            CONF.config_drive_raw_hhd, CONF.config_drive_cdrom, None, True)
+        self.assertEqual(self._config_drive._config_drive,
+                         mock_get_config_drive.return_value)
+        self.assertTrue(response)
+
+    @mock.patch('cloudbaseinit.metadata.services.configdrive.manager.'
+                'ConfigDriveManager.get_config_drive_files')
+    @mock.patch('cloudbaseinit.metadata.services.configdrive.manager.'
+                'ConfigDriveManager.get_config_drive')
+    def _test_load_in_memory(self, mock_get_config_drive,
+                             mock_get_config_drive_files, config_drive):
+        mock_get_config_drive.return_value = config_drive
+        CONF.set_override('config_drive_in_memory', True)
+        try:
+            response = self._config_drive.load()
+        finally:
+            CONF.clear_override('config_drive_in_memory')
+        mock_get_config_drive.assert_called_once_with(
+            CONF.config_drive_raw_hhd, CONF.config_drive_cdrom,
+            CONF.config_drive_in_memory_max_size * 1024 * 1024, False)
+        if config_drive:
+            self.assertFalse(mock_get_config_drive_files.called)
+            self.assertTrue(response)
+        else:
+            self.assertEqual(mock_get_config_drive_files.call_count, 1)
+            self.assertEqual(response,
+                             mock_get_config_drive_files.return_value)
+
+    def test_load_in_memory(self):
+        self._test_load_in_memory(config_drive=mock.MagicMock())
+
+    def test_load_in_memory_fallback_to_disk(self):
+        self._test_load_in_memory(config_drive=None)
+
+    def test_get_data_lazy(self):
+        fake_path = os.path.join('fake', 'path')
+        mock_config_drive = mock.MagicMock()
+        self._config_drive._config_drive = mock_config_drive
+        response = self._config_drive._get_data(fake_path)
+        mock_config_drive.read_file.assert_called_once_with(fake_path)
+        self.assertEqual(response, mock_config_drive.read_file.return_value)
+
+    def test_get_data_lazy_not_found(self):
+        mock_config_drive = mock.MagicMock()
+        mock_config_drive.read_file.side_effect = IOError
+        self._config_drive._config_drive = mock_config_drive
+        self.assertRaises(base.NotExistingMetadataException,
+                          self._config_drive._get_data, 'fake path')
+
+    def test_cleanup_lazy(self):
+        mock_config_drive = mock.MagicMock()
+        self._config_drive._config_drive = mock_config_drive
+        self._config_drive.cleanup()
+        mock_config_drive.close.assert_called_once_with()
+        self.assertIsNone(self._config_drive._config_drive)
+
     @mock.patch('os.path.normpath')
     @mock.patch('os.path.join')
     def test_get_data(self, mock_join, mock_normpath):
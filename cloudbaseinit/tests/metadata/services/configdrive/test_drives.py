@@ -0,0 +1,69 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import drives
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.tests.metadata.services.configdrive import fake_iso_image
+
+
+class DirectoryConfigDriveTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self._tmp_dir, 'openstack', 'latest'))
+        with open(os.path.join(self._tmp_dir, 'openstack', 'latest',
+                               'META_DATA.json'), 'wb') as f:
+            f.write('fake data')
+        self._drive = drives.DirectoryConfigDrive(self._tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_read_file(self):
+        self.assertEqual(
+            self._drive.read_file('openstack/latest/meta_data.json'),
+            'fake data')
+        self.assertEqual(
+            self._drive.read_file('openstack\\latest\\meta_data.json'),
+            'fake data')
+
+    def test_read_file_not_found(self):
+        self.assertRaises(IOError, self._drive.read_file,
+                          'openstack/latest/user_data')
+
+
+class ImageConfigDriveTests(unittest.TestCase):
+    def setUp(self):
+        image = fake_iso_image.build_iso_image(
+            {'openstack/latest/user_data': 'fake user data'})
+        reader = iso9660.ISO9660Reader(blocksource.BufferBlockSource(image))
+        self._close_callback = mock.MagicMock()
+        self._drive = drives.ImageConfigDrive(reader, self._close_callback)
+
+    def test_read_file(self):
+        self.assertEqual(self._drive.read_file('openstack/latest/user_data'),
+                         'fake user data')
+        self.assertRaises(IOError, self._drive.read_file,
+                          'openstack/latest/meta_data.json')
+
+    def test_close(self):
+        self._drive.close()
+        self._drive.close()
+        self._close_callback.assert_called_once_with()
@@ -0,0 +1,104 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.tests.metadata.services.configdrive import fake_iso_image
+
+FAKE_FILES = {
+    'openstack/latest/meta_data.json': '{"uuid": "fake uuid"}',
+    'openstack/latest/user_data': 'fake user data' * 500,
+    'openstack/content/0000': 'fake content',
+    'ec2/latest/meta-data.json': '{}',
+}
+
+
+class ISO9660ReaderTests(unittest.TestCase):
+    def _get_reader(self, **kwargs):
+        image = fake_iso_image.build_iso_image(FAKE_FILES, **kwargs)
+        return iso9660.ISO9660Reader(blocksource.BufferBlockSource(image))
+
+    def _test_read_file(self, **kwargs):
+        reader = self._get_reader(**kwargs)
+        for (path, data) in FAKE_FILES.items():
+            self.assertEqual(reader.read_file(path), data)
+        self.assertEqual(reader.get_volume_label().lower(), 'config-2')
+
+    def test_read_file_joliet(self):
+        self._test_read_file(joliet=True)
+
+    def test_read_file_rock_ridge(self):
+        self._test_read_file(joliet=False, rock_ridge=True)
+
+    def test_read_file_iso9660_names(self):
+        self._test_read_file(joliet=False)
+
+    def test_read_file_case_insensitive(self):
+        reader = self._get_reader()
+        self.assertEqual(reader.read_file('OpenStack\\Latest\\META_DATA.JSON'),
+                         FAKE_FILES['openstack/latest/meta_data.json'])
+
+    def test_read_file_not_found(self):
+        reader = self._get_reader()
+        self.assertRaises(IOError, reader.read_file, 'openstack/missing')
+        self.assertRaises(IOError, reader.read_file, 'openstack/latest')
+        self.assertFalse(reader.exists('openstack/latest/missing'))
+        self.assertTrue(reader.exists('openstack/latest'))
+
+    def test_list_dir(self):
+        reader = self._get_reader()
+        self.assertEqual(sorted(reader.list_dir('openstack')),
+                         ['content', 'latest'])
+        self.assertEqual(sorted(reader.list_dir()), ['ec2', 'openstack'])
+
+    def test_get_size(self):
+        image = fake_iso_image.build_iso_image(FAKE_FILES)
+        reader = iso9660.ISO9660Reader(blocksource.BufferBlockSource(image))
+        self.assertEqual(reader.get_size(), len(image))
+
+    def test_invalid_image(self):
+        source = blocksource.BufferBlockSource('\0' * 64 * 1024)
+        self.assertRaises(iso9660.InvalidISOImageException,
+                          iso9660.ISO9660Reader, source)
+
+    def test_extract(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            target_path = os.path.join(tmp_dir, 'target')
+            self._get_reader().extract(target_path)
+            for (path, data) in FAKE_FILES.items():
+                with open(os.path.join(target_path, path), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_read_file_from_file_block_source(self):
+        (fd, iso_path) = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(fake_iso_image.build_iso_image(FAKE_FILES))
+            source = blocksource.FileBlockSource(iso_path)
+            try:
+                reader = iso9660.ISO9660Reader(source)
+                self.assertEqual(reader.read_file('openstack/content/0000'),
+                                 'fake content')
+            finally:
+                source.close()
+        finally:
+            os.remove(iso_path)
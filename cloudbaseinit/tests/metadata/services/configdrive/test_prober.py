@@ -0,0 +1,129 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.metadata.services.configdrive import prober
+from cloudbaseinit.tests.metadata.services.configdrive import fake_iso_image
+
+
+class DiskProberTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        # File backed images standing in for the physical disks
+        self._disk_paths = []
+        for i in range(6):
+            path = os.path.join(self._tmp_dir, 'disk%d' % i)
+            with open(path, 'wb') as f:
+                if i == 4:
+                    f.write(fake_iso_image.build_iso_image(
+                        {'openstack/latest/meta_data.json': '{}'}))
+                elif i == 2:
+                    f.write(fake_iso_image.build_iso_image(
+                        {'fake': 'data'}, label='other'))
+                else:
+                    f.write('\0' * 64 * 1024)
+            self._disk_paths.append(path)
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _probe_disk(self, path):
+        source = blocksource.FileBlockSource(path)
+        try:
+            reader = iso9660.ISO9660Reader(source)
+            if reader.get_volume_label().lower() == 'config-2':
+                return source
+        except iso9660.InvalidISOImageException:
+            pass
+        source.close()
+
+    def test_probe(self):
+        disk_prober = prober.DiskProber(3)
+        (path, source) = disk_prober.probe(self._disk_paths,
+                                           self._probe_disk)
+        source.close()
+        self.assertEqual(path, self._disk_paths[4])
+
+    def test_probe_not_found(self):
+        disk_prober = prober.DiskProber(3)
+        self.assertIsNone(disk_prober.probe(self._disk_paths[:4],
+                                            self._probe_disk))
+
+    def test_probe_preferred_path(self):
+        probe_disk = mock.MagicMock()
+        probe_disk.side_effect = self._probe_disk
+        disk_prober = prober.DiskProber(3)
+        (path, source) = disk_prober.probe(self._disk_paths, probe_disk,
+                                           preferred_path=self._disk_paths[4])
+        source.close()
+        self.assertEqual(path, self._disk_paths[4])
+        probe_disk.assert_called_once_with(self._disk_paths[4])
+
+    def test_probe_concurrently(self):
+        barrier = threading.Event()
+
+        def probe_disk(path):
+            if path == 'slow':
+                # Returns only if the other disk is probed concurrently
+                self.assertTrue(barrier.wait(5))
+                return None
+            barrier.set()
+            return path
+
+        disk_prober = prober.DiskProber(2)
+        self.assertEqual(disk_prober.probe(['slow', 'found'], probe_disk),
+                         ('found', 'found'))
+
+    def test_probe_releases_other_matches(self):
+        release = mock.MagicMock()
+        released = threading.Event()
+        release.side_effect = lambda result: released.set()
+        probe_started = threading.Event()
+
+        def probe_disk(path):
+            if path == 'late':
+                probe_started.set()
+                self.assertTrue(found.wait(5))
+            else:
+                self.assertTrue(probe_started.wait(5))
+            return path
+
+        found = threading.Event()
+        disk_prober = prober.DiskProber(2)
+        response = disk_prober.probe(['late', 'first'], probe_disk, release)
+        found.set()
+
+        self.assertEqual(response, ('first', 'first'))
+        self.assertTrue(released.wait(5))
+        release.assert_called_once_with('late')
+
+    def test_probe_exception(self):
+        def probe_disk(path):
+            if path == 'failing':
+                raise Exception('fake error')
+            return path
+
+        disk_prober = prober.DiskProber(1)
+        self.assertEqual(disk_prober.probe(['failing', 'ok'], probe_disk),
+                         ('ok', 'ok'))
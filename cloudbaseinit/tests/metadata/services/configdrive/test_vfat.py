@@ -0,0 +1,134 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.metadata.services.configdrive import vfat
+from cloudbaseinit.tests.metadata.services.configdrive import fake_iso_image
+from cloudbaseinit.tests.metadata.services.configdrive import fake_vfat_image
+
+FAKE_FILES = {
+    'openstack/latest/meta_data.json': '{"uuid": "fake uuid"}',
+    'openstack/latest/user_data': 'fake user data' * 500,
+    'openstack/content/0000': 'fake content',
+    'openstack/content/empty': '',
+    'ec2/latest/meta-data.json': '{}',
+}
+
+
+class VFATReaderTests(unittest.TestCase):
+    def _get_reader(self, files=FAKE_FILES, **kwargs):
+        image = fake_vfat_image.build_vfat_image(files, **kwargs)
+        return vfat.VFATReader(blocksource.BufferBlockSource(image))
+
+    def _test_read_file(self, fat_type, **kwargs):
+        reader = self._get_reader(fat_type=fat_type, **kwargs)
+        self.assertEqual(reader.get_fat_type(), fat_type)
+        for (path, data) in FAKE_FILES.items():
+            self.assertEqual(reader.read_file(path), data)
+        self.assertEqual(reader.get_volume_label().lower(), 'config-2')
+
+    def test_read_file_fat12(self):
+        self._test_read_file(vfat.FAT12)
+
+    def test_read_file_fat16(self):
+        self._test_read_file(vfat.FAT16)
+
+    def test_read_file_fat32(self):
+        self._test_read_file(vfat.FAT32)
+
+    def test_read_file_fragmented(self):
+        self._test_read_file(vfat.FAT12, fragmented=True)
+
+    def test_read_file_short_names(self):
+        files = {'ec2/content/0000': 'fake content',
+                 'ec2/README.TXT': 'fake readme'}
+        reader = self._get_reader(files, long_names=False)
+        self.assertEqual(reader.list_dir(), ['ec2'])
+        self.assertEqual(sorted(reader.list_dir('ec2')),
+                         ['README.TXT', 'content'])
+        self.assertEqual(reader.read_file('ec2/content/0000'),
+                         'fake content')
+
+    def test_read_file_case_insensitive(self):
+        reader = self._get_reader()
+        self.assertEqual(reader.read_file('OpenStack\\Latest\\META_DATA.JSON'),
+                         FAKE_FILES['openstack/latest/meta_data.json'])
+
+    def test_read_file_not_found(self):
+        reader = self._get_reader()
+        self.assertRaises(IOError, reader.read_file, 'openstack/missing')
+        self.assertRaises(IOError, reader.read_file, 'openstack/latest')
+        self.assertFalse(reader.exists('openstack/latest/missing'))
+        self.assertTrue(reader.exists('openstack/latest'))
+
+    def test_read_file_contiguous_clusters(self):
+        image = fake_vfat_image.build_vfat_image(FAKE_FILES)
+        source = mock.MagicMock()
+        source.read_at.side_effect = (
+            blocksource.BufferBlockSource(image).read_at)
+        reader = vfat.VFATReader(source)
+        reader.read_file('openstack/latest/meta_data.json')
+
+        source.read_at.reset_mock()
+        data = reader.read_file('openstack/latest/user_data')
+        self.assertEqual(data, FAKE_FILES['openstack/latest/user_data'])
+        self.assertEqual(source.read_at.call_count, 1)
+
+    def test_list_dir(self):
+        reader = self._get_reader()
+        self.assertEqual(sorted(reader.list_dir('openstack')),
+                         ['content', 'latest'])
+        self.assertEqual(sorted(reader.list_dir()), ['ec2', 'openstack'])
+        self.assertRaises(IOError, reader.list_dir,
+                          'openstack/content/0000')
+
+    def test_get_size(self):
+        image = fake_vfat_image.build_vfat_image(FAKE_FILES)
+        reader = vfat.VFATReader(blocksource.BufferBlockSource(image))
+        self.assertEqual(reader.get_size(), len(image))
+
+    def test_get_volume_label_from_root_directory(self):
+        reader = self._get_reader(boot_sector_label=False)
+        self.assertEqual(reader.get_volume_label(), 'CONFIG-2')
+
+    def test_invalid_image(self):
+        for image in ['\0' * 64 * 1024,
+                      fake_iso_image.build_iso_image(FAKE_FILES)]:
+            self.assertRaises(vfat.InvalidVFATImageException,
+                              vfat.VFATReader,
+                              blocksource.BufferBlockSource(image))
+
+    def test_vfat_image_is_not_iso(self):
+        image = fake_vfat_image.build_vfat_image(FAKE_FILES)
+        self.assertRaises(iso9660.InvalidISOImageException,
+                          iso9660.ISO9660Reader,
+                          blocksource.BufferBlockSource(image))
+
+    def test_extract(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            target_path = os.path.join(tmp_dir, 'target')
+            self._get_reader(fat_type=vfat.FAT32).extract(target_path)
+            for (path, data) in FAKE_FILES.items():
+                with open(os.path.join(target_path, path), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+        finally:
+            shutil.rmtree(tmp_dir)
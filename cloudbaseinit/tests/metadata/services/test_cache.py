@@ -0,0 +1,196 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from oslo.config import cfg
+
+from cloudbaseinit.metadata.services import base
+from cloudbaseinit.metadata.services import cache
+
+CONF = cfg.CONF
+
+
+class MetadataDiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._cache_dir = os.path.join(self._tmp_dir, 'cache')
+        os.mkdir(self._cache_dir)
+        self._cache = cache.MetadataDiskCache(self._cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_set_get(self):
+        self._cache.validate('fake id')
+        self._cache.set('fake/path', 'fake data')
+        self._cache.set('fake/json', {'key': 'value'})
+
+        other_cache = cache.MetadataDiskCache(self._cache_dir)
+        other_cache.validate('fake id')
+        self.assertEqual(other_cache.get('fake/path'), 'fake data')
+        self.assertEqual(other_cache.get('fake/json'), {'key': 'value'})
+        self.assertIsNone(other_cache.get('fake/missing'))
+
+    def test_validate_instance_id_changed(self):
+        self._cache.validate('fake id')
+        self._cache.set('fake/path', 'fake data')
+
+        other_cache = cache.MetadataDiskCache(self._cache_dir)
+        other_cache.validate('other id')
+        self.assertIsNone(other_cache.get('fake/path'))
+        self.assertEqual(os.listdir(self._cache_dir), ['index.json'])
+
+    def test_get_corrupted_entry(self):
+        self._cache.validate('fake id')
+        self._cache.set('fake/path', 'fake data')
+        with open(self._cache._get_file_path('fake/path'), 'wb') as f:
+            f.write('corrupted data')
+
+        self.assertIsNone(self._cache.get('fake/path'))
+        with open(os.path.join(self._cache_dir, 'index.json'), 'rb') as f:
+            self.assertEqual(json.load(f)['entries'], {})
+
+
+class FakeService(base.BaseMetadataService):
+    def __init__(self):
+        super(FakeService, self).__init__()
+        self._enable_disk_cache = True
+        self.fake_data = {}
+
+    def _get_data(self, path):
+        return self.fake_data[path]
+
+
+class MetadataServiceDiskCacheTests(unittest.TestCase):
+    _META_DATA_PATH = 'openstack/latest/meta_data.json'
+    _USER_DATA_PATH = 'openstack/latest/user_data'
+    _CONTENT_PATH = 'openstack/content/0000'
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        CONF.set_override('metadata_cache_dir', self._tmp_dir)
+        self._os_utils_factory_patcher = mock.patch(
+            'cloudbaseinit.osutils.factory.OSUtilsFactory')
+        mock_OSUtilsFactory = self._os_utils_factory_patcher.start()
+        self._osutils = mock_OSUtilsFactory.return_value.get_os_utils()
+        self._osutils.create_private_directory.side_effect = (
+            self._create_private_directory)
+
+    def tearDown(self):
+        self._os_utils_factory_patcher.stop()
+        CONF.clear_override('metadata_cache_dir')
+        shutil.rmtree(self._tmp_dir)
+
+    def _create_private_directory(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _get_service(self, instance_id, admin_pass=None):
+        meta_data = {'uuid': instance_id}
+        if admin_pass:
+            meta_data['admin_pass'] = admin_pass
+        service = FakeService()
+        service.fake_data = {
+            self._META_DATA_PATH: json.dumps(meta_data),
+            self._USER_DATA_PATH: 'fake user data %s' % instance_id,
+            self._CONTENT_PATH: 'fake content %s' % instance_id}
+        service.load()
+        return service
+
+    def _read_cache_files(self):
+        data = []
+        for (dir_path, dir_names, file_names) in os.walk(self._tmp_dir):
+            for file_name in file_names:
+                with open(os.path.join(dir_path, file_name), 'rb') as f:
+                    data.append(f.read())
+        return ''.join(data)
+
+    def test_get_content_from_disk_cache(self):
+        service = self._get_service('fake id')
+        self.assertEqual(service.get_content('openstack', '0000'),
+                         'fake content fake id')
+
+        service = self._get_service('fake id')
+        service.fake_data[self._CONTENT_PATH] = 'changed'
+        self.assertEqual(service.get_content('openstack', '0000'),
+                         'fake content fake id')
+        self.assertEqual(service.get_meta_data('openstack'),
+                         {'uuid': 'fake id'})
+
+    def test_get_content_instance_id_changed(self):
+        service = self._get_service('fake id')
+        service.get_content('openstack', '0000')
+
+        service = self._get_service('other id')
+        self.assertEqual(service.get_content('openstack', '0000'),
+                         'fake content other id')
+
+    def test_get_user_data_not_cached(self):
+        service = self._get_service('fake id')
+        service.get_user_data('openstack')
+
+        service = self._get_service('fake id')
+        service.fake_data[self._USER_DATA_PATH] = 'changed'
+        self.assertEqual(service.get_user_data('openstack'), 'changed')
+        self.assertNotIn('fake user data', self._read_cache_files())
+
+    def test_admin_pass_not_cached(self):
+        service = self._get_service('fake id', 'fake admin pass')
+        self.assertEqual(service.get_meta_data('openstack'),
+                         {'uuid': 'fake id', 'admin_pass': 'fake admin pass'})
+        service.get_content('openstack', '0000')
+
+        self.assertNotIn('fake admin pass', self._read_cache_files())
+        # The other metadata is still cached
+        self.assertIn('fake content fake id', self._read_cache_files())
+
+    def test_is_disk_cacheable(self):
+        service = FakeService()
+        self.assertFalse(service._is_disk_cacheable(
+            'ec2/meta_data.json', {'admin_pass': 'fake admin pass'}))
+        self.assertTrue(service._is_disk_cacheable(
+            'ec2/meta_data.json', {'hostname': 'fake host'}))
+        self.assertFalse(service._is_disk_cacheable(
+            'openstack/latest/meta_data.json', 'invalid json'))
+        self.assertFalse(service._is_disk_cacheable(
+            'ec2/latest/user_data', 'fake user data'))
+        self.assertFalse(service._is_disk_cacheable(
+            'openstack/latest/password', 'fake encrypted password'))
+
+    def test_get_content_cache_dir_not_private(self):
+        self._osutils.create_private_directory.side_effect = Exception(
+            'Directory is not private')
+        service = self._get_service('fake id')
+        service.get_content('openstack', '0000')
+
+        service = self._get_service('fake id')
+        service.fake_data[self._CONTENT_PATH] = 'changed'
+        self.assertEqual(service.get_content('openstack', '0000'), 'changed')
+        self.assertEqual(os.listdir(self._tmp_dir), [])
+        self._osutils.create_private_directory.assert_called_with(
+            os.path.join(self._tmp_dir, service.get_name()))
+
+    @mock.patch('cloudbaseinit.metadata.services.cache.MetadataDiskCache')
+    def test_get_user_data_disk_cache_disabled(self, mock_disk_cache):
+        CONF.set_override('metadata_cache_dir', None)
+        service = self._get_service('fake id')
+        self.assertEqual(service.get_user_data('openstack'),
+                         'fake user data fake id')
+        self.assertFalse(mock_disk_cache.called)
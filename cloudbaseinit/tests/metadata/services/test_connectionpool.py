@@ -0,0 +1,167 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import BaseHTTPServer
+import mock
+import SocketServer
+import threading
+import unittest
+import urllib2
+
+from cloudbaseinit.metadata.services import connectionpool
+
+
+class FakeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, code, location):
+        self.send_response(code)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/missing':
+            self._send(404, 'not found')
+        elif self.path == '/redirect':
+            self._redirect(302, '/a')
+        elif self.path == '/loop':
+            self._redirect(302, '/loop')
+        else:
+            self._send(200, 'data %s' % self.path)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = self.rfile.read(length)
+        if self.path == '/redirect':
+            self._redirect(303, '/a')
+        elif self.path == '/temporary-redirect':
+            self._redirect(307, '/a')
+        else:
+            self._send(200, 'posted %s' % data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeHTTPServer(SocketServer.ThreadingMixIn,
+                     BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class HTTPConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self._server = FakeHTTPServer(('127.0.0.1', 0), FakeRequestHandler)
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self._base_url = 'http://127.0.0.1:%d' % self._server.server_port
+        self._pool = connectionpool.HTTPConnectionPool()
+        # Ignores the proxy settings of the environment
+        self._getproxies_patcher = mock.patch('urllib.getproxies',
+                                              return_value={})
+        self._mock_getproxies = self._getproxies_patcher.start()
+
+    def tearDown(self):
+        self._getproxies_patcher.stop()
+        self._pool.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def test_request_reuses_connection(self):
+        self.assertEqual(self._pool.request(self._base_url + '/a'),
+                         'data /a')
+        self.assertEqual(self._pool.request(self._base_url + '/b', 'value'),
+                         'posted value')
+        self.assertEqual(self._pool.get_stats(),
+                         {'requests': 2, 'connections_created': 1,
+                          'connections_reused': 1, 'reconnects': 0})
+
+    def test_request_http_error(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self._pool.request(self._base_url + '/missing')
+        self.assertEqual(cm.exception.code, 404)
+        self.assertEqual(cm.exception.read(), 'not found')
+        # The connection is still reusable after an error response
+        self._pool.request(self._base_url + '/a')
+        self.assertEqual(self._pool.get_stats()['connections_reused'], 1)
+
+    def test_request_reconnects_closed_connection(self):
+        self._pool.request(self._base_url + '/a')
+        for connections in self._pool._idle_connections.values():
+            for conn in connections:
+                # Simulates a connection closed by the server
+                conn.sock.close()
+
+        self.assertEqual(self._pool.request(self._base_url + '/b'),
+                         'data /b')
+        self.assertEqual(self._pool.get_stats()['reconnects'], 1)
+
+    def test_request_unsupported_scheme(self):
+        self.assertRaises(ValueError, self._pool.request, 'ftp://fake/path')
+
+    def test_request_redirect(self):
+        self.assertEqual(self._pool.request(self._base_url + '/redirect'),
+                         'data /a')
+        self.assertEqual(self._pool.get_stats()['requests'], 2)
+
+    def test_request_post_redirect(self):
+        self.assertEqual(
+            self._pool.request(self._base_url + '/redirect', 'value'),
+            'data /a')
+
+    def test_request_post_temporary_redirect(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self._pool.request(self._base_url + '/temporary-redirect',
+                               'value')
+        self.assertEqual(cm.exception.code, 307)
+
+    def test_request_redirect_loop(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self._pool.request(self._base_url + '/loop')
+        self.assertEqual(cm.exception.code, 302)
+        self.assertEqual(self._pool.get_stats()['requests'],
+                         self._pool._MAX_REDIRECTS + 1)
+
+    @mock.patch('urllib.proxy_bypass')
+    @mock.patch('urllib2.urlopen')
+    def test_request_proxy(self, mock_urlopen, mock_proxy_bypass):
+        self._mock_getproxies.return_value = {'http': 'http://fake-proxy'}
+        mock_proxy_bypass.return_value = False
+        url = self._base_url + '/a'
+
+        response = self._pool.request(url, 'value', {'fake': 'header'})
+
+        self.assertEqual(response, mock_urlopen.return_value.read())
+        (request,) = mock_urlopen.call_args[0]
+        self.assertEqual(request.get_full_url(), url)
+        self.assertEqual(request.get_data(), 'value')
+        self.assertEqual(request.get_header('Fake'), 'header')
+        self.assertEqual(self._pool.get_stats()['connections_created'], 0)
+
+    @mock.patch('urllib.proxy_bypass')
+    def test_request_proxy_bypass(self, mock_proxy_bypass):
+        self._mock_getproxies.return_value = {'http': 'http://fake-proxy'}
+        mock_proxy_bypass.return_value = True
+        self.assertEqual(self._pool.request(self._base_url + '/a'),
+                         'data /a')
+        mock_proxy_bypass.assert_called_once_with(
+            '127.0.0.1:%d' % self._server.server_port)
@@ -48,46 +48,40 @@ class Ec2ServiceTest(unittest.TestCase):
         self._test_load(side_effect='fake data')
 
     @mock.patch('posixpath.join')
-    @mock.patch('urllib2.Request')
-    @mock.patch('urllib2.urlopen')
     @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
                 '._load_public_keys')
     @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
                 '._check_EC2')
     @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
-                '._get_EC2_value')
-    def _test_get_data(self, mock_get_EC2_value, mock_check_EC2,
-                       mock_load_public_keys,  mock_urlopen,
-                       mock_Request, mock_join, check_ec2, data_type):
+                '._get_EC2_values')
+    def _test_get_data(self, mock_get_EC2_values, mock_check_EC2,
+                       mock_load_public_keys, mock_join, check_ec2,
+                       data_type):
         mock_path = mock.MagicMock()
-        mock_req = mock.MagicMock()
-        mock_response = mock.MagicMock()
         fake_path = os.path.join('fake', 'path')
         mock_join.return_value = fake_path
         mock_check_EC2.return_value = check_ec2
-        mock_Request.return_value = mock_req
-        mock_urlopen.return_value = mock_response
-        mock_response.read.return_value = 'fake data'
-        mock_path.endswith.return_value = data_type
+        mock_path.endswith.side_effect = lambda suffix: suffix == data_type
+        self._ec2service._connection_pool = mock.MagicMock()
+        mock_request = self._ec2service._connection_pool.request
+        mock_request.return_value = 'fake data'
 
         if check_ec2 is None:
             self.assertRaises(Exception, self._ec2service._get_data,
                               mock_path)
 
-        elif data_type is 'meta_data.json':
+        elif data_type == 'meta_data.json':
             response = self._ec2service._get_data(mock_path)
-            print response
-            for key in ec2service.ec2nodes:
-                mock_get_EC2_value.assert_called_with(key)
-                mock_load_public_keys.assert_called_with()
+            mock_get_EC2_values.assert_called_once_with(ec2service.ec2nodes)
+            mock_load_public_keys.assert_called_once_with(
+                mock_get_EC2_values.return_value)
+            self.assertEqual(response, mock_get_EC2_values.return_value)
 
-        elif data_type is 'user_data':
+        elif data_type == 'user_data':
             response = self._ec2service._get_data(mock_path)
             mock_join.assert_called_with(CONF.ec2_metadata_base_url,
                                          'user-data')
-            mock_Request.assert_called_once_with(fake_path)
-            mock_urlopen.assert_called_once_with(mock_req)
-            mock_response.read.assert_called_once_with()
+            mock_request.assert_called_once_with(fake_path)
             self.assertEqual(response, 'fake data')
 
     def test_get_data_metadata_json(self):
@@ -115,31 +109,94 @@ class Ec2ServiceTest(unittest.TestCase):
     def test_check_EC2(self):
         self._test_check_EC2(side_effect='fake value')
 
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_value')
+    def test_get_instance_id(self, mock_get_EC2_value):
+        response = self._ec2service.get_instance_id()
+        mock_get_EC2_value.assert_called_once_with('instance-id')
+        self.assertEqual(response, mock_get_EC2_value.return_value)
+
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_value')
+    def test_check_EC2_once(self, mock_get_EC2_value):
+        self.assertTrue(self._ec2service._check_EC2())
+        self.assertTrue(self._ec2service._check_EC2())
+        mock_get_EC2_value.assert_called_once_with('')
+
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_value')
+    def test_check_EC2_failure_not_reused(self, mock_get_EC2_value):
+        mock_get_EC2_value.side_effect = [IOError, 'fake value']
+        self.assertFalse(self._ec2service._check_EC2())
+        self.assertTrue(self._ec2service._check_EC2())
+        self.assertTrue(self._ec2service._check_EC2())
+        self.assertEqual(mock_get_EC2_value.call_count, 2)
+
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_value')
+    def test_load_retries_failed_check(self, mock_get_EC2_value):
+        calls = []
+
+        def _get_EC2_value(key):
+            calls.append(key)
+            if len(calls) == 1:
+                raise IOError()
+            return 'fake value'
+
+        mock_get_EC2_value.side_effect = _get_EC2_value
+        CONF.set_override('retry_count_interval', 0)
+        try:
+            self.assertTrue(self._ec2service.load())
+        finally:
+            CONF.clear_override('retry_count_interval')
+        self.assertEqual(calls[:2], ['', ''])
+
     @mock.patch('posixpath.join')
-    @mock.patch('urllib2.Request')
-    @mock.patch('urllib2.urlopen')
-    def test_get_EC2_value(self, mock_urlopen, mock_Request, mock_join):
+    def test_get_EC2_value(self, mock_join):
         mock_key = mock.MagicMock()
-        mock_response = mock.MagicMock()
         fake_path = os.path.join('fake', 'path')
         mock_join.return_value = fake_path
-        mock_Request.return_value = 'fake req'
-        mock_urlopen.return_value = mock_response
-        mock_response.read.return_value = 'fake data'
+        self._ec2service._connection_pool = mock.MagicMock()
+        mock_request = self._ec2service._connection_pool.request
+        mock_request.return_value = 'fake data'
         response = self._ec2service._get_EC2_value(mock_key)
         mock_join.assert_called_with(CONF.ec2_metadata_base_url,
                                      'meta-data', mock_key)
-        mock_Request.assert_called_once_with(fake_path)
-        mock_urlopen.assert_called_once_with('fake req')
-        mock_response.read.assert_called_once_with()
+        mock_request.assert_called_once_with(fake_path)
         self.assertEqual(response, 'fake data')
 
     @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
                 '._get_EC2_value')
-    def test_load_public_keys(self, mock_get_EC2_value):
+    def test_get_EC2_values(self, mock_get_EC2_value):
+        values = {'key1': 'value1', 'key2': 'value2'}
+
+        def _get_EC2_value(key):
+            if key not in values:
+                raise Exception('not found')
+            return values[key]
+
+        mock_get_EC2_value.side_effect = _get_EC2_value
+        response = self._ec2service._get_EC2_values(['key1', 'key2',
+                                                     'missing'])
+        self.assertEqual(response, values)
+
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_values')
+    def test_load_public_keys(self, mock_get_EC2_values):
+        data = {'public-keys/': '0=key0\n1=key1',
+                'public-keys/0/openssh-key': 'fake key 0'}
+        mock_get_EC2_values.return_value = {
+            'public-keys/1/openssh-key': 'fake key 1'}
+        self._ec2service._load_public_keys(data)
+        mock_get_EC2_values.assert_called_once_with(
+            ['public-keys/1/openssh-key'])
+        self.assertEqual(data['public_keys'], {'0': 'fake key 0',
+                                               '1': 'fake key 1'})
+
+    @mock.patch('cloudbaseinit.metadata.services.ec2service.EC2Service'
+                '._get_EC2_values')
+    def test_load_public_keys_no_key_list(self, mock_get_EC2_values):
         data = {}
-        key_list = mock.MagicMock()
-        mock_get_EC2_value.return_value = key_list
         self._ec2service._load_public_keys(data)
-        mock_get_EC2_value.assert_called_with('public-keys/')
-        self.assertEqual(data['public_keys'], {})
+        self.assertFalse(mock_get_EC2_values.called)
+        self.assertNotIn('public_keys', data)
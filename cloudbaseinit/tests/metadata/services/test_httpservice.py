@@ -82,22 +82,23 @@ class HttpServiceTest(unittest.TestCase):
     def test_load_exception(self):
         self._test_load(side_effect=Exception)
 
-    @mock.patch('urllib2.urlopen')
-    def _test_get_response(self, mock_urlopen, side_effect):
-        mock_req = mock.MagicMock
-        if side_effect and side_effect.code is 404:
-            mock_urlopen.side_effect = [side_effect]
+    def _test_get_response(self, side_effect):
+        self._httpservice._connection_pool = mock.MagicMock()
+        mock_request = self._httpservice._connection_pool.request
+        if side_effect and side_effect.code == 404:
+            mock_request.side_effect = [side_effect]
             self.assertRaises(base.NotExistingMetadataException,
                               self._httpservice._get_response,
-                              mock_req)
+                              'fake url')
         elif side_effect and side_effect.code:
-            mock_urlopen.side_effect = [side_effect]
+            mock_request.side_effect = [side_effect]
             self.assertRaises(Exception, self._httpservice._get_response,
-                              mock_req)
+                              'fake url')
         else:
-            mock_urlopen.return_value = 'fake url'
-            response = self._httpservice._get_response(mock_req)
-            self.assertEqual(response, 'fake url')
+            mock_request.return_value = 'fake data'
+            response = self._httpservice._get_response('fake url', 'data')
+            mock_request.assert_called_once_with('fake url', 'data')
+            self.assertEqual(response, 'fake data')
 
     def test_get_response_fail_HTTPError(self):
         error = urllib2.HTTPError("http://169.254.169.254/", 404,
@@ -115,43 +116,34 @@ class HttpServiceTest(unittest.TestCase):
     @mock.patch('cloudbaseinit.metadata.services.httpservice.HttpService'
                 '._get_response')
     @mock.patch('posixpath.join')
-    @mock.patch('urllib2.Request')
-    def test_get_data(self, mock_Request, mock_posix_join,
-                      mock_get_response):
+    def test_get_data(self, mock_posix_join, mock_get_response):
         fake_path = os.path.join('fake', 'path')
-        mock_data = mock.MagicMock()
         mock_norm_path = mock.MagicMock()
-        mock_req = mock.MagicMock()
-        mock_get_response.return_value = mock_data
         mock_posix_join.return_value = mock_norm_path
-        mock_Request.return_value = mock_req
 
         response = self._httpservice._get_data(fake_path)
 
         mock_posix_join.assert_called_with(CONF.metadata_base_url, fake_path)
-        mock_Request.assert_called_once_with(mock_norm_path)
-        mock_get_response.assert_called_once_with(mock_req)
-        self.assertEqual(response, mock_data.read())
+        mock_get_response.assert_called_once_with(mock_norm_path)
+        self.assertEqual(response, mock_get_response.return_value)
 
     @mock.patch('cloudbaseinit.metadata.services.httpservice.HttpService'
                 '._get_response')
     @mock.patch('posixpath.join')
-    @mock.patch('urllib2.Request')
-    def test_post_data(self, mock_Request, mock_posix_join,
-                       mock_get_response):
+    def test_post_data(self, mock_posix_join, mock_get_response):
         fake_path = os.path.join('fake', 'path')
         fake_data = 'fake data'
-        mock_data = mock.MagicMock()
         mock_norm_path = mock.MagicMock()
-        mock_req = mock.MagicMock()
-        mock_get_response.return_value = mock_data
         mock_posix_join.return_value = mock_norm_path
-        mock_Request.return_value = mock_req
 
         response = self._httpservice._post_data(fake_path, fake_data)
 
         mock_posix_join.assert_called_with(CONF.metadata_base_url,
                                            fake_path)
-        mock_Request.assert_called_once_with(mock_norm_path, data=fake_data)
-        mock_get_response.assert_called_once_with(mock_req)
+        mock_get_response.assert_called_once_with(mock_norm_path, fake_data)
         self.assertEqual(response, True)
+
+    def test_cleanup(self):
+        self._httpservice._connection_pool = mock.MagicMock()
+        self._httpservice.cleanup()
+        self._httpservice._connection_pool.close.assert_called_once_with()
@@ -0,0 +1,96 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import socket
+import unittest
+import urllib2
+
+from cloudbaseinit.metadata.services import base
+from cloudbaseinit.metadata.services import retrypolicy
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def setUp(self):
+        self._policy = retrypolicy.RetryPolicy(3, 1, max_interval=3,
+                                               deadline=100)
+
+    def _get_http_error(self, code):
+        return urllib2.HTTPError('http://fake', code, 'fake error', {}, None)
+
+    def test_is_retryable(self):
+        self.assertTrue(self._policy.is_retryable(Exception()))
+        self.assertTrue(self._policy.is_retryable(socket.timeout()))
+        self.assertTrue(self._policy.is_retryable(self._get_http_error(503)))
+        self.assertTrue(self._policy.is_retryable(self._get_http_error(429)))
+        self.assertFalse(self._policy.is_retryable(
+            self._get_http_error(403)))
+        self.assertFalse(self._policy.is_retryable(
+            base.NotExistingMetadataException()))
+
+    @mock.patch('random.uniform')
+    def test_get_interval(self, mock_uniform):
+        intervals = [self._policy.get_interval(i) for i in range(1, 5)]
+        self.assertEqual(mock_uniform.call_args_list,
+                         [mock.call(0, 1), mock.call(0, 2), mock.call(0, 3),
+                          mock.call(0, 3)])
+        self.assertEqual(intervals, [mock_uniform.return_value] * 4)
+
+    @mock.patch('time.sleep')
+    def test_execute(self, mock_sleep):
+        action = mock.MagicMock()
+        action.side_effect = [Exception, Exception, 'fake result']
+        on_retry = mock.MagicMock()
+
+        response = self._policy.execute(action, on_retry=on_retry)
+
+        self.assertEqual(response, 'fake result')
+        self.assertEqual(action.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(on_retry.call_args_list,
+                         [mock.call(1), mock.call(2)])
+
+    @mock.patch('time.sleep')
+    def test_execute_max_retries(self, mock_sleep):
+        action = mock.MagicMock()
+        action.side_effect = Exception
+        self.assertRaises(Exception, self._policy.execute, action)
+        self.assertEqual(action.call_count, 4)
+
+    @mock.patch('time.sleep')
+    def test_execute_fatal_error(self, mock_sleep):
+        action = mock.MagicMock()
+        action.side_effect = self._get_http_error(404)
+        self.assertRaises(urllib2.HTTPError, self._policy.execute, action)
+        action.assert_called_once_with()
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('time.sleep')
+    def test_execute_cancelled(self, mock_sleep):
+        action = mock.MagicMock()
+        action.side_effect = Exception
+        self.assertRaises(Exception, self._policy.execute, action,
+                          is_cancelled=lambda: True)
+        action.assert_called_once_with()
+
+    @mock.patch('time.time')
+    @mock.patch('time.sleep')
+    def test_execute_deadline_exceeded(self, mock_sleep, mock_time):
+        mock_time.side_effect = [0, 99.5]
+        action = mock.MagicMock()
+        action.side_effect = Exception
+        with mock.patch('random.uniform', return_value=1):
+            self.assertRaises(Exception, self._policy.execute, action)
+        action.assert_called_once_with()
+        self.assertFalse(mock_sleep.called)
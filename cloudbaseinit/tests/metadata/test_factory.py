@@ -15,10 +15,16 @@
 #    under the License.
 
 import mock
+import threading
+import time
 import unittest
 
+from oslo.config import cfg
+
 from cloudbaseinit.metadata import factory
 
+CONF = cfg.CONF
+
 
 class MetadataServiceFactoryTests(unittest.TestCase):
     def setUp(self):
@@ -39,3 +45,73 @@ class MetadataServiceFactoryTests(unittest.TestCase):
 
     def test_get_metadata_service_exception(self):
         self._test_get_metadata_service(ret_value=Exception)
+
+    def _wait_for_call(self, mock_method):
+        for i in range(50):
+            if mock_method.called:
+                break
+            time.sleep(0.1)
+
+    def _get_services(self, load_results):
+        services = []
+        for load_result in load_results:
+            # Child mocks are created up front as their lazy creation
+            # is not thread safe
+            service = mock.MagicMock(cleanup=mock.MagicMock(),
+                                     cancel=mock.MagicMock())
+            if load_result is Exception:
+                service.load.side_effect = Exception
+            else:
+                service.load.return_value = load_result
+            services.append(service)
+        return services
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def _test_get_metadata_service_parallel(self, mock_load_class, services):
+        CONF.set_override('metadata_services_parallel_discovery', True)
+        CONF.set_override('metadata_services',
+                          ['fake.Service%d' % i for i in range(len(services))])
+        mock_load_class.side_effect = [mock.MagicMock(return_value=s)
+                                       for s in services]
+        try:
+            return self._factory.get_metadata_service()
+        finally:
+            CONF.clear_override('metadata_services_parallel_discovery')
+            CONF.clear_override('metadata_services')
+
+    def test_get_metadata_service_parallel(self):
+        services = self._get_services([Exception, True, True])
+        released = threading.Event()
+        # The lowest priority service completes last
+        services[2].load.side_effect = lambda: released.wait(5)
+        services[2].cancel.side_effect = lambda: released.set()
+
+        response = self._test_get_metadata_service_parallel(services=services)
+
+        self.assertEqual(response, services[1])
+        services[0].load.assert_called_once_with()
+        services[1].load.assert_called_once_with()
+        services[0].cancel.assert_called_once_with()
+        services[2].cancel.assert_called_once_with()
+        self.assertFalse(services[1].cancel.called)
+        self.assertFalse(services[1].cleanup.called)
+        services[0].cleanup.assert_called_once_with()
+        # Cleaned up by the loading thread once completed
+        self._wait_for_call(services[2].cleanup)
+        services[2].load.assert_called_once_with()
+        services[2].cleanup.assert_called_once_with()
+
+    def test_get_metadata_service_parallel_priority(self):
+        services = self._get_services([True, True])
+        released = threading.Event()
+        # The highest priority service completes last
+        services[0].load.side_effect = lambda: released.wait(0.2) or True
+        response = self._test_get_metadata_service_parallel(services=services)
+        self.assertEqual(response, services[0])
+        self._wait_for_call(services[1].cleanup)
+        services[1].cleanup.assert_called_once_with()
+
+    def test_get_metadata_service_parallel_not_found(self):
+        services = self._get_services([False, Exception])
+        self.assertRaises(Exception, self._test_get_metadata_service_parallel,
+                          services=services)
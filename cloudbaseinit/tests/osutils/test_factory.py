@@ -24,6 +24,10 @@ from cloudbaseinit.osutils import factory
 class OSUtilsFactory(unittest.TestCase):
     def setUp(self):
         self._factory = factory.OSUtilsFactory()
+        factory._os_utils.clear()
+
+    def tearDown(self):
+        factory._os_utils.clear()
 
     @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
     def _test_get_os_utils(self, mock_load_class, fake_name):
@@ -41,3 +45,10 @@ class OSUtilsFactory(unittest.TestCase):
 
     def test_get_os_utils_posix(self):
         self._test_get_os_utils(fake_name='posix')
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_os_utils_single_instance(self, mock_load_class):
+        response = self._factory.get_os_utils()
+        self.assertIs(factory.OSUtilsFactory().get_os_utils(), response)
+        mock_load_class.assert_called_once_with(mock.ANY)
+        mock_load_class.return_value.assert_called_once_with()
@@ -30,7 +30,10 @@ if sys.platform == 'win32':
 
     from ctypes import windll
     from ctypes import wintypes
+    from cloudbaseinit.osutils import base
     from cloudbaseinit.osutils import windows as windows_utils
+    from cloudbaseinit.utils import routingtable
+    from cloudbaseinit.utils import wmisession
 
 CONF = cfg.CONF
 
@@ -50,6 +53,7 @@ class WindowsUtilsTest(unittest.TestCase):
     def setUp(self):
         self._winutils = windows_utils.WindowsUtils()
         self._conn = mock.MagicMock()
+        wmisession.reset()
 
     def test_enable_shutdown_privilege(self):
         fake_process = mock.MagicMock()
@@ -516,9 +520,11 @@ class WindowsUtilsTest(unittest.TestCase):
                     broadcast, self._GATEWAY, dns_list)
 
             else:
+                self._winutils._routing_table = mock.sentinel.routing_table
                 response = self._winutils.set_static_network_config(
                     adapter_name, address, self._NETMASK,
                     broadcast, self._GATEWAY, dns_list)
+                self.assertIsNone(self._winutils._routing_table)
                 if ret_val1[0] or ret_val2[0] or ret_val3[0] == 1:
                     self.assertTrue(response)
                 else:
@@ -677,6 +683,24 @@ class WindowsUtilsTest(unittest.TestCase):
     def test_get_config_value_type_error(self):
         self._test_get_config_value(value=None)
 
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_config_key_name')
+    def test_get_config_values(self, mock_get_config_key_name):
+        key_name = self._winutils._config_key + self._SECTION + '\\'
+        mock_get_config_key_name.return_value = key_name
+        _winreg.OpenKey = mock.MagicMock()
+        _winreg.QueryInfoKey = mock.MagicMock(return_value=(0, 2, 0))
+        _winreg.EnumValue = mock.MagicMock(
+            side_effect=[('name1', 1, _winreg.REG_DWORD),
+                         ('name2', 'fake', _winreg.REG_SZ)])
+
+        response = self._winutils.get_config_values(self._SECTION)
+
+        mock_get_config_key_name.assert_called_once_with(self._SECTION)
+        _winreg.OpenKey.assert_called_once_with(_winreg.HKEY_LOCAL_MACHINE,
+                                                key_name)
+        self.assertEqual(response, {'name1': 1, 'name2': 'fake'})
+
     def _test_wait_for_boot_completion(self, ret_val):
         key = mock.MagicMock()
         time.sleep = mock.MagicMock()
@@ -800,7 +824,8 @@ class WindowsUtilsTest(unittest.TestCase):
                 '._get_ipv4_routing_table')
     def _test_get_default_gateway(self, mock_get_ipv4_routing_table,
                                   routing_table):
-        mock_get_ipv4_routing_table.return_value = [routing_table]
+        mock_get_ipv4_routing_table.return_value = (
+            routingtable.RoutingTable.from_routes([routing_table]))
         response = self._winutils.get_default_gateway()
         mock_get_ipv4_routing_table.assert_called_once_with()
         if routing_table[0] == '0.0.0.0':
@@ -809,18 +834,19 @@ class WindowsUtilsTest(unittest.TestCase):
             self.assertEqual(response, (None, None))
 
     def test_get_default_gateway(self):
-        routing_table = ['0.0.0.0', '1.1.1.1', self._GATEWAY, '8.8.8.8']
+        routing_table = ['0.0.0.0', '1.1.1.1', self._GATEWAY, 1, 10]
         self._test_get_default_gateway(routing_table=routing_table)
 
     def test_get_default_gateway_error(self):
-        routing_table = ['1.1.1.1', '1.1.1.1', self._GATEWAY, '8.8.8.8']
+        routing_table = ['1.1.1.1', '1.1.1.1', self._GATEWAY, 1, 10]
         self._test_get_default_gateway(routing_table=routing_table)
 
     @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
                 '._get_ipv4_routing_table')
     def _test_check_static_route_exists(self, mock_get_ipv4_routing_table,
                                         routing_table):
-        mock_get_ipv4_routing_table.return_value = [routing_table]
+        mock_get_ipv4_routing_table.return_value = (
+            routingtable.RoutingTable.from_routes([routing_table]))
         response = self._winutils.check_static_route_exists(self._DESTINATION)
         mock_get_ipv4_routing_table.assert_called_once_with()
         if routing_table[0] == self._DESTINATION:
@@ -829,14 +855,23 @@ class WindowsUtilsTest(unittest.TestCase):
             self.assertFalse(response)
 
     def test_check_static_route_exists_true(self):
-        routing_table = [self._DESTINATION, '1.1.1.1', self._GATEWAY,
-                         '8.8.8.8']
+        routing_table = [self._DESTINATION, '1.1.1.1', self._GATEWAY, 1, 10]
         self._test_check_static_route_exists(routing_table=routing_table)
 
     def test_check_static_route_exists_false(self):
-        routing_table = ['0.0.0.0', '1.1.1.1', self._GATEWAY, '8.8.8.8']
+        routing_table = ['0.0.0.0', '1.1.1.1', self._GATEWAY, 1, 10]
         self._test_check_static_route_exists(routing_table=routing_table)
 
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_ipv4_routing_table')
+    def test_get_routing_table(self, mock_get_ipv4_routing_table):
+        response = self._winutils.get_routing_table()
+        self.assertEqual(self._winutils.get_routing_table(), response)
+        mock_get_ipv4_routing_table.assert_called_once_with()
+
+        self._winutils.get_routing_table(refresh=True)
+        self.assertEqual(mock_get_ipv4_routing_table.call_count, 2)
+
     @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
                 '.execute_process')
     def _test_add_static_route(self, mock_execute_process, err):
@@ -851,9 +886,11 @@ class WindowsUtilsTest(unittest.TestCase):
                               self._DESTINATION, self._NETMASK, next_hop,
                               interface_index, metric)
         else:
+            self._winutils._routing_table = mock.sentinel.routing_table
             self._winutils.add_static_route(self._DESTINATION, self._NETMASK,
                                             next_hop, interface_index, metric)
             mock_execute_process.assert_called_with(args)
+            self.assertIsNone(self._winutils._routing_table)
 
     def test_add_static_route(self):
         self._test_add_static_route(err=404)
@@ -863,45 +900,212 @@ class WindowsUtilsTest(unittest.TestCase):
 
     @mock.patch('ctypes.sizeof')
     @mock.patch('ctypes.byref')
-    @mock.patch('ctypes.windll.kernel32.VerSetConditionMask')
-    @mock.patch('ctypes.windll.kernel32.VerifyVersionInfoW')
-    @mock.patch('ctypes.windll.kernel32.GetLastError')
-    def _test_check_os_version(self, mock_GetLastError,
-                               mock_VerifyVersionInfoW,
-                               mock_VerSetConditionMask, mock_byref,
-                               mock_sizeof, ret_value, error_value=None):
-        mock_VerSetConditionMask.return_value = 2
-        mock_VerifyVersionInfoW.return_value = ret_value
-        mock_GetLastError.return_value = error_value
-        old_version = self._winutils.ERROR_OLD_WIN_VERSION
-        if error_value and error_value is not old_version:
-            self.assertRaises(Exception, self._winutils.check_os_version, 3,
-                              1, 2)
-            mock_GetLastError.assert_called_once_with()
+    @mock.patch('cloudbaseinit.osutils.windows.ntdll')
+    def _test_get_os_version(self, mock_ntdll, mock_byref, mock_sizeof,
+                             ret_value):
+        mock_ntdll.RtlGetVersion.return_value = ret_value
+        if ret_value:
+            self.assertRaises(Exception, self._winutils._get_os_version)
         else:
-            response = self._winutils.check_os_version(3, 1, 2)
+            response = self._winutils._get_os_version()
             mock_sizeof.assert_called_once_with(
                 windows_utils.Win32_OSVERSIONINFOEX_W)
-            self.assertEqual(mock_VerSetConditionMask.call_count, 3)
-            mock_VerifyVersionInfoW.assert_called_with(mock_byref(),
-                                                       1 | 2 | 3 | 7,
-                                                       2)
-            if error_value is old_version:
-                mock_GetLastError.assert_called_with()
-                self.assertEqual(response, False)
-            else:
-                self.assertEqual(response, True)
+            mock_ntdll.RtlGetVersion.assert_called_once_with(mock_byref())
+            self.assertEqual(response, (0, 0, 0))
+
+    def test_get_os_version(self):
+        self._test_get_os_version(ret_value=0)
+
+    def test_get_os_version_exception(self):
+        self._test_get_os_version(ret_value=9999)
+
+    def _get_fake_capabilities(self):
+        return base.OSCapabilities(os_version=(6, 1, 7601),
+                                   logical_drives=('C:\\', 'D:\\'),
+                                   cdrom_drives=('D:\\',),
+                                   volume_labels=(('D:\\', 'config-2'),))
+
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_volume_label')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_os_version')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_logical_drives')
+    @mock.patch('cloudbaseinit.osutils.windows.kernel32')
+    def test_get_capabilities(self, mock_kernel32, mock_get_logical_drives,
+                              mock_get_os_version, mock_get_volume_label):
+        mock_get_logical_drives.return_value = ['C:\\', 'D:\\']
+        mock_kernel32.GetDriveTypeW.side_effect = [
+            3, self._winutils.DRIVE_CDROM]
+        mock_get_os_version.return_value = (6, 1, 7601)
+        mock_get_volume_label.return_value = 'config-2'
+
+        response = self._winutils.get_capabilities()
+
+        self.assertEqual(response, self._get_fake_capabilities())
+        self.assertIs(self._winutils.get_capabilities(), response)
+        mock_get_os_version.assert_called_once_with()
+        mock_get_logical_drives.assert_called_once_with()
+        mock_get_volume_label.assert_called_once_with('D:\\')
 
-    def test_check_os_version(self):
-        m = mock.MagicMock()
-        self._test_check_os_version(ret_value=m)
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_volume_label')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_os_version')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_logical_drives')
+    @mock.patch('cloudbaseinit.osutils.windows.kernel32')
+    def test_get_volume_label_not_ready(self, mock_kernel32,
+                                        mock_get_logical_drives,
+                                        mock_get_os_version,
+                                        mock_get_volume_label):
+        mock_get_logical_drives.return_value = ['D:\\']
+        mock_kernel32.GetDriveTypeW.return_value = (
+            self._winutils.DRIVE_CDROM)
+        mock_get_volume_label.side_effect = [None, 'config-2']
+
+        self.assertEqual(self._winutils.get_capabilities().volume_labels, ())
+        self.assertEqual(self._winutils.get_volume_label('D:\\'),
+                         'config-2')
 
-    def test_check_os_version_expect_False(self):
-        self._test_check_os_version(
-            ret_value=None, error_value=self._winutils.ERROR_OLD_WIN_VERSION)
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '.get_capabilities')
+    def test_check_os_version(self, mock_get_capabilities):
+        mock_get_capabilities.return_value = self._get_fake_capabilities()
+        self.assertTrue(self._winutils.check_os_version(6, 0))
+        self.assertTrue(self._winutils.check_os_version(6, 1, 7601))
+        self.assertFalse(self._winutils.check_os_version(6, 1, 7602))
+        self.assertFalse(self._winutils.check_os_version(6, 2))
 
-    def test_check_os_version_exception(self):
-        self._test_check_os_version(ret_value=None, error_value=9999)
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_volume_label')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '.get_capabilities')
+    def test_get_volume_label(self, mock_get_capabilities,
+                              mock_get_volume_label):
+        mock_get_capabilities.return_value = self._get_fake_capabilities()
+        self.assertEqual(self._winutils.get_volume_label('D:\\'), 'config-2')
+        self.assertFalse(mock_get_volume_label.called)
+
+        response = self._winutils.get_volume_label('C:\\')
+        mock_get_volume_label.assert_called_once_with('C:\\')
+        self.assertEqual(response, mock_get_volume_label.return_value)
+
+    @mock.patch('cloudbaseinit.osutils.windows.win32process')
+    @mock.patch('cloudbaseinit.osutils.windows.win32security')
+    def test_get_private_sids(self, mock_win32security, mock_win32process):
+        mock_win32security.GetTokenInformation.return_value = (
+            'fake user sid', 0)
+        mock_win32security.CreateWellKnownSid.side_effect = [
+            'fake system sid', 'fake admins sid']
+
+        response = self._winutils._get_private_sids()
+
+        mock_win32security.OpenProcessToken.assert_called_once_with(
+            mock_win32process.GetCurrentProcess.return_value,
+            mock_win32security.TOKEN_QUERY)
+        mock_win32security.GetTokenInformation.assert_called_once_with(
+            mock_win32security.OpenProcessToken.return_value,
+            mock_win32security.TokenUser)
+        self.assertEqual(response, ['fake system sid', 'fake admins sid',
+                                    'fake user sid'])
+
+    def _get_fake_security_descriptor(self, owner='fake system sid',
+                                      protected=True, ace_sids=None):
+        mock_sd = mock.MagicMock()
+        mock_sd.GetSecurityDescriptorOwner.return_value = owner
+        control = windows_utils.ntsecuritycon.SE_DACL_PROTECTED
+        mock_sd.GetSecurityDescriptorControl.return_value = (
+            control if protected else 0, 1)
+        aces = [((windows_utils.ntsecuritycon.ACCESS_ALLOWED_ACE_TYPE, 0),
+                 windows_utils.ntsecuritycon.FILE_ALL_ACCESS, sid)
+                for sid in ace_sids or ['fake system sid']]
+        mock_dacl = mock_sd.GetSecurityDescriptorDacl.return_value
+        mock_dacl.GetAceCount.return_value = len(aces)
+        mock_dacl.GetAce.side_effect = aces
+        return mock_sd
+
+    @mock.patch('cloudbaseinit.osutils.windows.win32security'
+                '.GetNamedSecurityInfo')
+    def _test_check_private_directory(self, mock_GetNamedSecurityInfo,
+                                      expected, **kwargs):
+        mock_GetNamedSecurityInfo.return_value = (
+            self._get_fake_security_descriptor(**kwargs))
+
+        response = self._winutils._check_private_directory(
+            'fake path', ['fake system sid', 'fake admins sid'])
+
+        self.assertEqual(response, expected)
+
+    def test_check_private_directory(self):
+        self._test_check_private_directory(
+            expected=True, ace_sids=['fake system sid', 'fake admins sid'])
+
+    def test_check_private_directory_other_owner(self):
+        self._test_check_private_directory(expected=False,
+                                           owner='fake user sid')
+
+    def test_check_private_directory_not_protected(self):
+        self._test_check_private_directory(expected=False, protected=False)
+
+    def test_check_private_directory_other_ace(self):
+        self._test_check_private_directory(
+            expected=False, ace_sids=['fake system sid', 'fake user sid'])
+
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._check_private_directory')
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '._get_private_sids')
+    @mock.patch('cloudbaseinit.osutils.windows.win32file')
+    @mock.patch('cloudbaseinit.osutils.windows.win32security')
+    @mock.patch('os.makedirs')
+    @mock.patch('os.path.exists')
+    @mock.patch('os.path.isdir')
+    def _test_create_private_directory(self, mock_isdir, mock_exists,
+                                       mock_makedirs, mock_win32security,
+                                       mock_win32file, mock_get_private_sids,
+                                       mock_check_private_directory,
+                                       exists=False, private=True):
+        mock_isdir.return_value = exists
+        mock_exists.return_value = False
+        mock_get_private_sids.return_value = ['fake sid']
+        mock_check_private_directory.return_value = private
+
+        if exists and not private:
+            self.assertRaises(Exception,
+                              self._winutils.create_private_directory,
+                              'C:\\fake\\dir')
+        else:
+            self._winutils.create_private_directory('C:\\fake\\dir')
+
+        if exists:
+            mock_check_private_directory.assert_called_once_with(
+                'C:\\fake\\dir', ['fake sid'])
+            self.assertFalse(mock_win32file.CreateDirectory.called)
+        else:
+            mock_makedirs.assert_called_once_with('C:\\fake')
+            mock_dacl = mock_win32security.ACL.return_value
+            mock_dacl.AddAccessAllowedAceEx.assert_called_once_with(
+                windows_utils.ntsecuritycon.ACL_REVISION,
+                windows_utils.ntsecuritycon.OBJECT_INHERIT_ACE |
+                windows_utils.ntsecuritycon.CONTAINER_INHERIT_ACE,
+                windows_utils.ntsecuritycon.FILE_ALL_ACCESS, 'fake sid')
+            mock_sd = mock_win32security.SECURITY_DESCRIPTOR.return_value
+            mock_sd.SetSecurityDescriptorDacl.assert_called_once_with(
+                True, mock_dacl, False)
+            mock_sa = mock_win32security.SECURITY_ATTRIBUTES.return_value
+            self.assertEqual(mock_sa.SECURITY_DESCRIPTOR, mock_sd)
+            mock_win32file.CreateDirectory.assert_called_once_with(
+                'C:\\fake\\dir', mock_sa)
+
+    def test_create_private_directory(self):
+        self._test_create_private_directory()
+
+    def test_create_private_directory_exists(self):
+        self._test_create_private_directory(exists=True)
+
+    def test_create_private_directory_not_private(self):
+        self._test_create_private_directory(exists=True, private=False)
 
     def _test_get_volume_label(self, ret_val):
         label = mock.MagicMock()
@@ -910,7 +1114,7 @@ class WindowsUtilsTest(unittest.TestCase):
         ctypes.create_unicode_buffer = mock.MagicMock(return_value=label)
         ctypes.windll.kernel32.GetVolumeInformationW = mock.MagicMock(
             return_value=ret_val)
-        response = self._winutils.get_volume_label(drive)
+        response = self._winutils._get_volume_label(drive)
         if ret_val:
             self.assertTrue(response is not None)
         else:
@@ -920,7 +1124,7 @@ class WindowsUtilsTest(unittest.TestCase):
         ctypes.windll.kernel32.GetVolumeInformationW.assert_called_with(
             drive, label, max_label_size, 0, 0, 0, 0, 0)
 
-    def test_get_volume_label(self):
+    def test_get_volume_label_from_disk(self):
         self._test_get_volume_label('ret')
 
     def test_get_volume_label_no_return_value(self):
@@ -961,15 +1165,12 @@ class WindowsUtilsTest(unittest.TestCase):
     def test_get_logical_drives(self):
         self._test_get_logical_drives(buf_length=2)
 
-    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils.'
-                '_get_logical_drives')
-    @mock.patch('cloudbaseinit.osutils.windows.kernel32')
-    def test_get_cdrom_drives(self, mock_kernel32, mock_get_logical_drives):
-        mock_get_logical_drives.return_value = ['drive']
-        mock_kernel32.GetDriveTypeW.return_value = self._winutils.DRIVE_CDROM
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '.get_capabilities')
+    def test_get_cdrom_drives(self, mock_get_capabilities):
+        mock_get_capabilities.return_value = self._get_fake_capabilities()
         response = self._winutils.get_cdrom_drives()
-        mock_get_logical_drives.assert_called_with()
-        self.assertEqual(response, ['drive'])
+        self.assertEqual(response, ['D:\\'])
 
     @mock.patch('win32com.client.Dispatch')
     @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils._get_fw_protocol')
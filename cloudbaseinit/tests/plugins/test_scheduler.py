@@ -0,0 +1,121 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import threading
+import unittest
+
+from cloudbaseinit.plugins import scheduler
+
+
+class PluginSchedulerTests(unittest.TestCase):
+    def _get_plugin(self, name, shared_data=([], []), services=[]):
+        plugin = mock.MagicMock()
+        plugin.get_name.return_value = name
+        plugin.get_shared_data_requirements.return_value = shared_data
+        plugin.get_required_services.return_value = services
+        return plugin
+
+    def test_get_dependencies(self):
+        plugins = [self._get_plugin('writer', ([], ['key'])),
+                   self._get_plugin('independent'),
+                   self._get_plugin('reader', (['key'], [])),
+                   self._get_plugin('service1', services=['svc']),
+                   self._get_plugin('service2', services=['svc']),
+                   self._get_plugin('barrier', None)]
+        response = scheduler.PluginScheduler(plugins, 4).get_dependencies()
+        self.assertEqual(response, [set(), set(), set([0]), set(),
+                                    set([3]), set([0, 1, 2, 3, 4])])
+
+    def test_get_dependencies_write_after_read(self):
+        plugins = [self._get_plugin('reader', (['key'], [])),
+                   self._get_plugin('writer', ([], ['key']))]
+        response = scheduler.PluginScheduler(plugins, 4).get_dependencies()
+        self.assertEqual(response, [set(), set([0])])
+
+    def test_execute_runs_independent_plugins_concurrently(self):
+        barrier = threading.Event()
+        executed = []
+
+        def exec_plugin(plugin):
+            name = plugin.get_name()
+            if name == 'first':
+                # Blocks until the second plugin runs, which is possible
+                # only if the two are executed concurrently
+                self.assertTrue(barrier.wait(5))
+            elif name == 'second':
+                barrier.set()
+            executed.append(name)
+            return False
+
+        plugins = [self._get_plugin('first'), self._get_plugin('second'),
+                   self._get_plugin('last', None)]
+        response = scheduler.PluginScheduler(plugins, 2).execute(exec_plugin)
+        self.assertFalse(response)
+        self.assertEqual(executed, ['second', 'first', 'last'])
+
+    def test_execute_stops_on_reboot(self):
+        exec_plugin = mock.MagicMock()
+        exec_plugin.side_effect = lambda plugin: plugin.get_name() == 'reboot'
+        plugins = [self._get_plugin('reboot'),
+                   self._get_plugin('dependent', None)]
+        response = scheduler.PluginScheduler(plugins, 2).execute(exec_plugin)
+        self.assertTrue(response)
+        exec_plugin.assert_called_once_with(plugins[0])
+
+    def test_execute_no_stop_on_reboot(self):
+        exec_plugin = mock.MagicMock()
+        exec_plugin.side_effect = lambda plugin: plugin.get_name() == 'reboot'
+        plugins = [self._get_plugin('reboot'),
+                   self._get_plugin('dependent', None)]
+        response = scheduler.PluginScheduler(plugins, 2).execute(
+            exec_plugin, stop_on_reboot=False)
+        self.assertTrue(response)
+        self.assertEqual(exec_plugin.call_args_list,
+                         [mock.call(plugins[0]), mock.call(plugins[1])])
+
+    def test_execute_coalesce_reboots(self):
+        exec_plugin = mock.MagicMock()
+        exec_plugin.side_effect = lambda plugin: plugin.get_name() == 'reboot'
+        plugins = [self._get_plugin('reboot', ([], ['key'])),
+                   self._get_plugin('tolerant', (['key'], [])),
+                   self._get_plugin('barrier', ([], [])),
+                   self._get_plugin('dependent', None)]
+        response = scheduler.PluginScheduler(plugins, 1).execute(
+            exec_plugin,
+            can_run_before_reboot=lambda p: p.get_name() == 'tolerant')
+        self.assertTrue(response)
+        self.assertEqual(exec_plugin.call_args_list,
+                         [mock.call(plugins[0]), mock.call(plugins[1])])
+
+    def test_execute_coalesce_reboots_stops_at_barrier(self):
+        exec_plugin = mock.MagicMock()
+        exec_plugin.side_effect = lambda plugin: plugin.get_name() == 'reboot'
+        plugins = [self._get_plugin('reboot', ([], ['key'])),
+                   self._get_plugin('barrier', (['key'], [])),
+                   self._get_plugin('tolerant', (['key'], []))]
+        response = scheduler.PluginScheduler(plugins, 4).execute(
+            exec_plugin,
+            can_run_before_reboot=lambda p: p.get_name() == 'tolerant')
+        self.assertTrue(response)
+        exec_plugin.assert_called_once_with(plugins[0])
+
+    def test_execute_plugin_exception(self):
+        exec_plugin = mock.MagicMock()
+        exec_plugin.side_effect = [Exception, False]
+        plugins = [self._get_plugin('failing', None),
+                   self._get_plugin('next', None)]
+        response = scheduler.PluginScheduler(plugins, 2).execute(exec_plugin)
+        self.assertFalse(response)
+        self.assertEqual(exec_plugin.call_count, 2)
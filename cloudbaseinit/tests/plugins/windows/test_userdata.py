@@ -14,7 +14,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import gzip
 import mock
+import StringIO
 import unittest
 
 from oslo.config import cfg
@@ -22,11 +24,20 @@ from oslo.config import cfg
 from cloudbaseinit.metadata.services import base as metadata_services_base
 from cloudbaseinit.plugins import base
 from cloudbaseinit.plugins.windows import userdata
+from cloudbaseinit.plugins.windows import userdataledger
 from cloudbaseinit.tests.metadata import fake_json_response
+from cloudbaseinit.utils import multipart
 
 CONF = cfg.CONF
 
 
+def _gzip(data):
+    buf = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
 class UserDataPluginTest(unittest.TestCase):
 
     def setUp(self):
@@ -47,7 +58,7 @@ class UserDataPluginTest(unittest.TestCase):
         elif ret_val is None:
             self.assertEqual(response, (base.PLUGIN_EXECUTION_DONE, False))
         else:
-            mock_process_user_data.assert_called_once_with(ret_val)
+            mock_process_user_data.assert_called_once_with(ret_val, None)
             self.assertEqual(response, mock_process_user_data())
 
     def test_execute(self):
@@ -60,12 +71,14 @@ class UserDataPluginTest(unittest.TestCase):
     def test_execute_not_user_data(self):
         self._test_execute(ret_val=None)
 
-    @mock.patch('email.message_from_string')
-    def test_parse_mime(self, mock_message_from_string):
+    @mock.patch('cloudbaseinit.utils.multipart.iter_parts')
+    def test_parse_mime(self, mock_iter_parts):
         fake_user_data = 'fake data'
         response = self._userdata._parse_mime(user_data=fake_user_data)
-        mock_message_from_string.assert_called_once_with(fake_user_data)
-        self.assertEqual(response, mock_message_from_string().walk())
+        mock_iter_parts.assert_called_once_with(
+            fake_user_data,
+            max_decompressed_size=CONF.user_data_max_decompressed_size)
+        self.assertEqual(response, mock_iter_parts())
 
     @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.factory.'
                 'UserDataPluginsFactory.load_plugins')
@@ -90,10 +103,12 @@ class UserDataPluginTest(unittest.TestCase):
             mock_load_plugins.assert_called_once_with()
             mock_parse_mime.assert_called_once_with(user_data)
             mock_process_part.assert_called_once_with(mock_part,
-                                                      mock_load_plugins(), {})
+                                                      mock_load_plugins(), {},
+                                                      None)
             self.assertEqual(response, (base.PLUGIN_EXECUTION_DONE, reboot))
         else:
-            mock_process_non_multi_part.assert_called_once_with(user_data)
+            mock_process_non_multi_part.assert_called_once_with(user_data,
+                                                                None)
             self.assertEqual(response, mock_process_non_multi_part())
 
     def test_process_user_data_multipart_reboot_true(self):
@@ -108,6 +123,28 @@ class UserDataPluginTest(unittest.TestCase):
         self._test_process_user_data(user_data='Content-Type: non-multipart',
                                      reboot=False)
 
+    @mock.patch('cloudbaseinit.plugins.windows.userdata.UserDataPlugin'
+                '._process_non_multi_part')
+    def test_process_user_data_gzip(self, mock_process_non_multi_part):
+        response = self._userdata._process_user_data(
+            _gzip('#ps1_sysnative\nfake script'))
+        mock_process_non_multi_part.assert_called_once_with(
+            '#ps1_sysnative\nfake script', None)
+        self.assertEqual(response, mock_process_non_multi_part())
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdata.UserDataPlugin'
+                '._process_non_multi_part')
+    def test_process_user_data_gzip_too_large(self,
+                                              mock_process_non_multi_part):
+        CONF.set_override('user_data_max_decompressed_size', 10)
+        try:
+            response = self._userdata._process_user_data(
+                _gzip('#ps1_sysnative\nfake script'))
+        finally:
+            CONF.clear_override('user_data_max_decompressed_size')
+        self.assertFalse(mock_process_non_multi_part.called)
+        self.assertEqual(response, (base.PLUGIN_EXECUTION_DONE, False))
+
     @mock.patch('cloudbaseinit.plugins.windows.userdata.UserDataPlugin'
                 '._add_part_handlers')
     @mock.patch('cloudbaseinit.plugins.windows.userdata.UserDataPlugin'
@@ -230,3 +267,93 @@ class UserDataPluginTest(unittest.TestCase):
         mock_get_plugin_return_value.assert_called_once_with(
             mock_execute_user_data_script())
         self.assertEqual(response, mock_get_plugin_return_value())
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdataledger.UserDataLedger')
+    @mock.patch('cloudbaseinit.plugins.windows.userdata.UserDataPlugin'
+                '._process_user_data')
+    def test_execute_ledger(self, mock_process_user_data, mock_ledger_class):
+        mock_service = mock.MagicMock()
+        mock_service.get_user_data.return_value = 'fake data'
+        CONF.set_override('user_data_ledger_path', 'fake path')
+        try:
+            response = self._userdata.execute(service=mock_service,
+                                              shared_data=None)
+        finally:
+            CONF.clear_override('user_data_ledger_path')
+        mock_ledger_class.assert_called_once_with('fake path')
+        mock_ledger = mock_ledger_class.return_value
+        mock_ledger.load.assert_called_once_with(
+            mock_service.get_instance_id())
+        mock_process_user_data.assert_called_once_with('fake data',
+                                                       mock_ledger)
+        self.assertEqual(response, mock_process_user_data.return_value)
+
+    def _test_execute_part(self, executed, run_always=None, ret_val=0):
+        mock_plugin = mock.MagicMock()
+        mock_plugin.process.return_value = ret_val
+        mock_ledger = mock.MagicMock()
+        mock_ledger.is_executed.return_value = executed
+        headers = ('Content-Type: text/x-shellscript\n'
+                   'Content-Disposition: attachment; filename="fake.cmd"\n')
+        if run_always:
+            headers += '%s: %s\n' % (userdataledger.RUN_ALWAYS_HEADER,
+                                     run_always)
+        [part] = multipart.iter_parts(headers + '\nfake script')
+
+        response = self._userdata._execute_part(mock_plugin, part,
+                                                mock_ledger)
+        return (response, mock_plugin, mock_ledger)
+
+    def test_execute_part(self):
+        (response, mock_plugin, mock_ledger) = self._test_execute_part(
+            executed=False)
+        mock_ledger.is_executed.assert_called_once_with('fake script',
+                                                        'fake.cmd')
+        mock_ledger.record.assert_called_once_with(
+            'fake script', 'fake.cmd', 'text/x-shellscript', 0)
+        self.assertEqual(response, 0)
+
+    def test_execute_part_already_executed(self):
+        (response, mock_plugin, mock_ledger) = self._test_execute_part(
+            executed=True)
+        self.assertFalse(mock_plugin.process.called)
+        self.assertFalse(mock_ledger.record.called)
+        self.assertIsNone(response)
+
+    def test_execute_part_run_always(self):
+        (response, mock_plugin, mock_ledger) = self._test_execute_part(
+            executed=True, run_always='True', ret_val=1003)
+        self.assertFalse(mock_ledger.is_executed.called)
+        mock_ledger.record.assert_called_once_with(
+            'fake script', 'fake.cmd', 'text/x-shellscript', 1003)
+        self.assertEqual(response, 1003)
+
+    def test_execute_part_no_exit_code(self):
+        (response, mock_plugin, mock_ledger) = self._test_execute_part(
+            executed=False, ret_val=None)
+        self.assertFalse(mock_ledger.record.called)
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdatautils'
+                '.execute_user_data_script')
+    def test_process_non_multi_part_already_executed(
+            self, mock_execute_user_data_script):
+        mock_ledger = mock.MagicMock()
+        mock_ledger.is_executed.return_value = True
+        response = self._userdata._process_non_multi_part('fake',
+                                                          mock_ledger)
+        mock_ledger.is_executed.assert_called_once_with('fake', None)
+        self.assertFalse(mock_execute_user_data_script.called)
+        self.assertEqual(response, (base.PLUGIN_EXECUTION_DONE, False))
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdatautils'
+                '.execute_user_data_script')
+    def test_process_non_multi_part_ledger(self,
+                                           mock_execute_user_data_script):
+        mock_ledger = mock.MagicMock()
+        mock_ledger.is_executed.return_value = False
+        mock_execute_user_data_script.return_value = 1002
+        response = self._userdata._process_non_multi_part('fake',
+                                                          mock_ledger)
+        mock_ledger.record.assert_called_once_with('fake', None, None, 1002)
+        self.assertEqual(response,
+                         (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, False))
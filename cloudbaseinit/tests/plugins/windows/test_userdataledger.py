@@ -0,0 +1,81 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.plugins.windows import userdataledger
+
+
+class UserDataLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmp_dir, 'ledger', 'ledger.json')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _get_ledger(self, instance_id='fake id'):
+        ledger = userdataledger.UserDataLedger(self._path)
+        ledger.load(instance_id)
+        return ledger
+
+    def test_record(self):
+        ledger = self._get_ledger()
+        self.assertFalse(ledger.is_executed('fake script', 'fake.cmd'))
+        ledger.record('fake script', 'fake.cmd', 'text/x-shellscript', 0)
+
+        ledger = self._get_ledger()
+        self.assertTrue(ledger.is_executed('fake script', 'fake.cmd'))
+        self.assertFalse(ledger.is_executed('fake script', 'other.cmd'))
+        self.assertFalse(ledger.is_executed('other script', 'fake.cmd'))
+
+    def test_record_file_format(self):
+        ledger = self._get_ledger()
+        ledger.record('fake script', 'fake.cmd', 'text/x-shellscript', 1001)
+
+        with open(self._path, 'rb') as f:
+            data = json.load(f)
+        self.assertEqual(data['instance_id'], 'fake id')
+        [(key, entry)] = data['parts'].items()
+        self.assertTrue(key.endswith(':fake.cmd'))
+        self.assertEqual(entry['filename'], 'fake.cmd')
+        self.assertEqual(entry['content_type'], 'text/x-shellscript')
+        self.assertEqual(entry['size'], len('fake script'))
+        self.assertEqual(entry['exit_code'], 1001)
+        self.assertTrue(entry['succeeded'])
+
+    def test_record_failed(self):
+        ledger = self._get_ledger()
+        for exit_code in [1, 1002, 1003]:
+            ledger.record('fake script', None, None, exit_code)
+            self.assertFalse(ledger.is_executed('fake script', None))
+
+    def test_load_instance_id_changed(self):
+        ledger = self._get_ledger()
+        ledger.record('fake script', None, None, 0)
+        ledger = self._get_ledger('other id')
+        self.assertFalse(ledger.is_executed('fake script', None))
+
+    def test_load_invalid_file(self):
+        os.makedirs(os.path.dirname(self._path))
+        with open(self._path, 'wb') as f:
+            f.write('fake invalid json')
+        ledger = self._get_ledger()
+        self.assertFalse(ledger.is_executed('fake script', None))
+        ledger.record('fake script', None, None, 0)
+        self.assertTrue(self._get_ledger().is_executed('fake script', None))
@@ -134,3 +134,33 @@ class UserDataUtilsTest(unittest.TestCase):
         fake_user_data = '#ps1_sysnative\s'
         self._test_execute_user_data_script(fake_user_data=fake_user_data,
                                             directory_exists=False)
+
+    @mock.patch('cloudbaseinit.utils.interpreterhost.InterpreterHostPool')
+    def test_execute_script_interpreter_host(self, mock_pool_class):
+        mock_osutils = mock.MagicMock()
+        mock_pool = mock_pool_class.return_value
+        args = ['python.exe', 'fake_path']
+        CONF.set_override('user_data_interpreter_hosts', ['python'])
+        try:
+            response = userdatautils.execute_script(mock_osutils, 'python',
+                                                    args, False)
+            userdatautils.close_interpreter_hosts()
+        finally:
+            CONF.clear_override('user_data_interpreter_hosts')
+
+        mock_pool_class.assert_called_once_with(
+            mock_osutils.kill_process_tree)
+        mock_pool.execute.assert_called_once_with('python', 'python.exe',
+                                                  'fake_path')
+        mock_pool.close.assert_called_once_with()
+        self.assertFalse(mock_osutils.execute_process.called)
+        self.assertEqual(response, mock_pool.execute.return_value)
+
+    def test_execute_script(self):
+        mock_osutils = mock.MagicMock()
+        response = userdatautils.execute_script(mock_osutils, 'python',
+                                                ['python.exe', 'fake_path'],
+                                                False)
+        mock_osutils.execute_process.assert_called_once_with(
+            ['python.exe', 'fake_path'], False)
+        self.assertEqual(response, mock_osutils.execute_process.return_value)
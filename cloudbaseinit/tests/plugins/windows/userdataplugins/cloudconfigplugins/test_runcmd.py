@@ -0,0 +1,52 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    runcmd)
+
+
+class RunCmdPluginTests(unittest.TestCase):
+
+    def setUp(self):
+        self._runcmd = runcmd.RunCmdPlugin()
+
+    def test_get_shared_data_requirements(self):
+        self.assertIsNone(self._runcmd.get_shared_data_requirements())
+
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def test_process(self, mock_get_os_utils):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_osutils.execute_process.return_value = ('out', 'err', 0)
+        response = self._runcmd.process(['fake cmd', ['fake', 1]])
+        self.assertEqual(mock_osutils.execute_process.call_args_list,
+                         [mock.call('fake cmd', True),
+                          mock.call(['fake', '1'], False)])
+        self.assertFalse(response)
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.'
+                'cloudconfigplugins.runcmd.LOG')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def test_process_arguments_not_logged(self, mock_get_os_utils, mock_LOG):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_osutils.execute_process.return_value = ('out', 'err', 0)
+        self._runcmd.process(['net user admin fake_password',
+                              ['net', 'user', 'admin', 'fake_password']])
+        self.assertEqual(mock_LOG.info.call_count, 2)
+        self.assertNotIn('fake_password', str(mock_LOG.mock_calls))
+        self.assertIn('net', mock_LOG.info.call_args[0][0])
@@ -0,0 +1,49 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from oslo.config import cfg
+
+from cloudbaseinit.plugins.windows import sethostname
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    sethostname as cc_sethostname)
+
+CONF = cfg.CONF
+
+
+class SetHostNamePluginTests(unittest.TestCase):
+
+    def setUp(self):
+        self._sethostname = cc_sethostname.SetHostNamePlugin()
+
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def _test_process(self, mock_get_os_utils, host_name, expected):
+        CONF.set_override('netbios_host_name_compatibility', True)
+        mock_osutils = mock_get_os_utils.return_value
+        mock_osutils.set_host_name.return_value = True
+        response = self._sethostname.process(host_name)
+        mock_osutils.set_host_name.assert_called_once_with(expected)
+        self.assertTrue(response)
+
+    def test_process(self):
+        self._test_process(host_name='fake.domain', expected='fake')
+
+    def test_process_truncated(self):
+        length = sethostname.NETBIOS_HOST_NAME_MAX_LEN
+        self._test_process(host_name='x' * (length + 1),
+                           expected='x' * length)
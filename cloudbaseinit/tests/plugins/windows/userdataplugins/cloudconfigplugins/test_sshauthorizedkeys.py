@@ -0,0 +1,62 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    sshauthorizedkeys)
+
+
+class SSHAuthorizedKeysPluginTests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_add_authorized_keys(self):
+        mock_osutils = mock.MagicMock()
+        mock_osutils.get_user_home.return_value = self._tmp_dir
+        sshauthorizedkeys.add_authorized_keys(mock_osutils, 'fake user',
+                                              ['key1', 'key2'])
+        sshauthorizedkeys.add_authorized_keys(mock_osutils, 'fake user',
+                                              ['key2 ', 'key3'])
+
+        path = os.path.join(self._tmp_dir, '.ssh', 'authorized_keys')
+        with open(path, 'r') as f:
+            self.assertEqual(f.read(), 'key1\nkey2\nkey3\n')
+
+    def test_add_authorized_keys_no_user_home(self):
+        mock_osutils = mock.MagicMock()
+        mock_osutils.get_user_home.return_value = None
+        self.assertRaises(Exception, sshauthorizedkeys.add_authorized_keys,
+                          mock_osutils, 'fake user', ['key1'])
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.'
+                'cloudconfigplugins.sshauthorizedkeys.add_authorized_keys')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def test_process(self, mock_get_os_utils, mock_add_authorized_keys):
+        plugin = sshauthorizedkeys.SSHAuthorizedKeysPlugin()
+        sshauthorizedkeys.CONF.set_override('username', 'fake user')
+        response = plugin.process(['key1'])
+        mock_add_authorized_keys.assert_called_once_with(
+            mock_get_os_utils.return_value, 'fake user', ['key1'])
+        self.assertFalse(response)
@@ -0,0 +1,64 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    users)
+
+
+class UsersPluginTests(unittest.TestCase):
+
+    def setUp(self):
+        self._users = users.UsersPlugin()
+
+    @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.'
+                'cloudconfigplugins.sshauthorizedkeys.add_authorized_keys')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def test_process_new_user(self, mock_get_os_utils,
+                              mock_add_authorized_keys):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_osutils.user_exists.return_value = False
+        response = self._users.process([
+            'default',
+            {'name': 'fake user', 'groups': 'group1, group2',
+             'ssh_authorized_keys': ['fake key']}])
+
+        mock_osutils.generate_random_password.assert_called_once_with(14)
+        password = mock_osutils.generate_random_password.return_value
+        mock_osutils.create_user.assert_called_once_with('fake user',
+                                                         password)
+        mock_osutils.create_user_logon_session.assert_called_once_with(
+            'fake user', password, True)
+        mock_osutils.close_user_logon_session.assert_called_once_with(
+            mock_osutils.create_user_logon_session.return_value)
+        self.assertEqual(mock_osutils.add_user_to_local_group.call_args_list,
+                         [mock.call('fake user', 'group1'),
+                          mock.call('fake user', 'group2')])
+        mock_add_authorized_keys.assert_called_once_with(
+            mock_osutils, 'fake user', ['fake key'])
+        self.assertFalse(response)
+
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    def test_process_existing_user(self, mock_get_os_utils):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_osutils.user_exists.return_value = True
+        self._users.process([{'name': 'fake user',
+                              'plain_text_passwd': 'fake password'}])
+        mock_osutils.set_user_password.assert_called_once_with(
+            'fake user', 'fake password')
+        self.assertFalse(mock_osutils.create_user.called)
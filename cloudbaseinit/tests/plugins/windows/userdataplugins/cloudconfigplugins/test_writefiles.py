@@ -0,0 +1,97 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import base64
+import gzip
+import mock
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from cloudbaseinit.plugins.windows.userdataplugins.cloudconfigplugins import (
+    writefiles)
+
+
+def _gzip(data):
+    buf = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class WriteFilesPluginTests(unittest.TestCase):
+
+    def setUp(self):
+        self._writefiles = writefiles.WriteFilesPlugin()
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_decode_content_no_encoding(self):
+        self.assertEqual(writefiles.decode_content('data', None), 'data')
+
+    def test_decode_content_base64(self):
+        response = writefiles.decode_content(base64.b64encode('data'), 'b64')
+        self.assertEqual(response, 'data')
+
+    def test_decode_content_gzip(self):
+        response = writefiles.decode_content(_gzip('data'), 'gzip')
+        self.assertEqual(response, 'data')
+
+    def test_decode_content_gzip_base64(self):
+        response = writefiles.decode_content(
+            base64.b64encode(_gzip('data')), 'gz+b64')
+        self.assertEqual(response, 'data')
+
+    def test_decode_content_unsupported(self):
+        self.assertRaises(ValueError, writefiles.decode_content,
+                          'data', 'fake')
+
+    def test_get_mode_int(self):
+        # An unquoted 0644 in the YAML content
+        self.assertEqual(writefiles.get_mode(420), 0644)
+
+    def test_get_mode_str(self):
+        self.assertEqual(writefiles.get_mode('0644'), 0644)
+        self.assertEqual(writefiles.get_mode('600'), 0600)
+
+    @mock.patch('os.chmod')
+    def _test_process_permissions(self, mock_chmod, permissions):
+        path = os.path.join(self._tmp_dir, 'fake.txt')
+        self._writefiles.process([{'path': path, 'content': 'data',
+                                   'permissions': permissions}])
+        mock_chmod.assert_called_once_with(path, 0644)
+
+    def test_process_permissions_int(self):
+        self._test_process_permissions(permissions=420)
+
+    def test_process_permissions_str(self):
+        self._test_process_permissions(permissions='0644')
+
+    def test_process(self):
+        path = os.path.join(self._tmp_dir, 'subdir', 'fake.txt')
+        response = self._writefiles.process([
+            {'path': path, 'content': base64.b64encode('data'),
+             'encoding': 'base64'},
+            {'path': path, 'content': u'more', 'append': True},
+            {'content': 'missing path'}])
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), 'datamore')
+        self.assertFalse(response)
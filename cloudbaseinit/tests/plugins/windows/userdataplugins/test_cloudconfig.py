@@ -23,15 +23,75 @@ from cloudbaseinit.plugins.windows.userdataplugins import cloudconfig
 
 CONF = cfg.CONF
 
+_MODULE = 'cloudbaseinit.plugins.windows.userdataplugins.cloudconfig'
+
 
 class CloudConfigPluginTests(unittest.TestCase):
 
     def setUp(self):
         self._cloudconfig = cloudconfig.CloudConfigPlugin()
 
-    @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.base'
-                '.BaseUserDataPlugin.get_mime_type')
-    def test_process(self, mock_get_mime_type):
+    @mock.patch(_MODULE + '.yaml', None)
+    def test_load_config_no_yaml(self):
+        response = self._cloudconfig._load_config('fake data')
+        self.assertIsNone(response)
+
+    @mock.patch(_MODULE + '.yaml')
+    def test_load_config(self, mock_yaml):
+        mock_yaml.safe_load.return_value = {'runcmd': []}
+        response = self._cloudconfig._load_config('fake data')
+        mock_yaml.safe_load.assert_called_once_with('fake data')
+        self.assertEqual(response, {'runcmd': []})
+
+    @mock.patch(_MODULE + '.yaml')
+    def test_load_config_not_a_mapping(self, mock_yaml):
+        mock_yaml.safe_load.return_value = ['runcmd']
+        response = self._cloudconfig._load_config('fake data')
+        self.assertIsNone(response)
+
+    @mock.patch(_MODULE + '.CloudConfigPlugin._load_config')
+    def test_process_no_config(self, mock_load_config):
+        mock_part = mock.MagicMock()
+        mock_load_config.return_value = None
+        response = self._cloudconfig.process(mock_part)
+        mock_load_config.assert_called_once_with(mock_part.get_payload())
+        self.assertIsNone(response)
+
+    @mock.patch('cloudbaseinit.plugins.scheduler.PluginScheduler')
+    @mock.patch('cloudbaseinit.plugins.windows.userdataplugins.'
+                'cloudconfigplugins.factory.CloudConfigPluginsFactory.'
+                'load_plugins')
+    @mock.patch(_MODULE + '.CloudConfigPlugin._load_config')
+    def _test_process(self, mock_load_config, mock_load_plugins,
+                      mock_PluginScheduler, reboot_required):
         mock_part = mock.MagicMock()
-        self._cloudconfig.process(mock_part)
-        mock_get_mime_type.assert_called_once_with()
+        fake_config = {'runcmd': ['fake cmd'], 'fake directive': None}
+        mock_load_config.return_value = fake_config
+        mock_runcmd = mock.MagicMock()
+        mock_runcmd.get_name.return_value = 'runcmd'
+        mock_runcmd.process.return_value = reboot_required
+        mock_users = mock.MagicMock()
+        mock_users.get_name.return_value = 'users'
+        mock_load_plugins.return_value = [mock_runcmd, mock_users]
+        mock_scheduler = mock_PluginScheduler.return_value
+
+        def execute(exec_plugin, stop_on_reboot):
+            return exec_plugin(mock_runcmd)
+        mock_scheduler.execute.side_effect = execute
+
+        response = self._cloudconfig.process(mock_part)
+
+        mock_PluginScheduler.assert_called_once_with(
+            [mock_runcmd], CONF.cloud_config_max_workers)
+        mock_runcmd.process.assert_called_once_with(['fake cmd'])
+        self.assertFalse(mock_users.process.called)
+        if reboot_required:
+            self.assertEqual(response, 1001)
+        else:
+            self.assertIsNone(response)
+
+    def test_process(self):
+        self._test_process(reboot_required=False)
+
+    def test_process_reboot_required(self):
+        self._test_process(reboot_required=True)
@@ -15,7 +15,6 @@
 #    under the License.
 
 import mock
-import os
 import unittest
 
 from oslo.config import cfg
@@ -30,24 +29,57 @@ class PartHandlerPluginTests(unittest.TestCase):
     def setUp(self):
         self._parthandler = parthandler.PartHandlerPlugin()
 
-    @mock.patch('tempfile.gettempdir')
-    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_module')
-    def test_process(self, mock_load_module, mock_gettempdir):
+    def tearDown(self):
+        parthandler._module_cache = None
+
+    @mock.patch('cloudbaseinit.utils.modulecache.ModuleCache')
+    def test_process(self, mock_ModuleCache):
         mock_part = mock.MagicMock()
-        mock_part_handler = mock.MagicMock()
         mock_part.get_filename.return_value = 'fake_name'
-        mock_gettempdir.return_value = 'fake_directory'
-        mock_load_module.return_value = mock_part_handler
+        mock_part.get_payload.return_value = 'fake data'
+        mock_part_handler = mock_ModuleCache.return_value.load_source()
         mock_part_handler.list_types.return_value = ['fake part']
 
-        with mock.patch('cloudbaseinit.plugins.windows.userdataplugins.'
-                        'parthandler.open',
-                        mock.mock_open(read_data='fake data'), create=True):
-            response = self._parthandler.process(mock_part)
+        response = self._parthandler.process(mock_part)
 
-        mock_part.get_filename.assert_called_once_with()
-        mock_load_module.assert_called_once_with(os.path.join(
-            'fake_directory', 'fake_name'))
+        mock_ModuleCache.assert_called_once_with(CONF.part_handler_cache_dir)
+        mock_ModuleCache.return_value.load_source.assert_called_with(
+            'fake data', 'fake_name')
         mock_part_handler.list_types.assert_called_once_with()
         self.assertEqual(response, {'fake part':
                                     mock_part_handler.handle_part})
+
+    @mock.patch('cloudbaseinit.utils.modulecache.ModuleCache')
+    def test_process_reuses_module_cache(self, mock_ModuleCache):
+        self._parthandler.process(mock.MagicMock())
+        parthandler.PartHandlerPlugin().process(mock.MagicMock())
+        mock_ModuleCache.assert_called_once_with(CONF.part_handler_cache_dir)
+
+    def test_cache_dir_disabled_by_default(self):
+        self.assertIsNone(CONF.part_handler_cache_dir)
+
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory')
+    @mock.patch('cloudbaseinit.utils.modulecache.ModuleCache')
+    def _test_process_cache_dir(self, mock_ModuleCache, mock_OSUtilsFactory,
+                                create_exception=None):
+        mock_osutils = mock_OSUtilsFactory.return_value.get_os_utils()
+        mock_osutils.create_private_directory.side_effect = create_exception
+        CONF.set_override('part_handler_cache_dir', 'fake dir')
+        try:
+            self._parthandler.process(mock.MagicMock())
+        finally:
+            CONF.clear_override('part_handler_cache_dir')
+
+        mock_osutils.create_private_directory.assert_called_once_with(
+            'fake dir')
+        if create_exception:
+            mock_ModuleCache.assert_called_once_with(None)
+        else:
+            mock_ModuleCache.assert_called_once_with('fake dir')
+
+    def test_process_cache_dir(self):
+        self._test_process_cache_dir()
+
+    def test_process_cache_dir_not_private(self):
+        self._test_process_cache_dir(
+            create_exception=Exception('Directory is not private'))
@@ -54,12 +54,29 @@ class InitManagerTest(unittest.TestCase):
             'fake plugin', self._init._PLUGINS_CONFIG_SECTION)
         self.assertTrue(response == 1)
 
+    def test_get_plugin_status_loaded(self):
+        self.osutils.get_config_values.return_value = {'fake plugin': 1}
+        self._init._load_plugins_status(self.osutils)
+        response = self._init._get_plugin_status(self.osutils, 'fake plugin')
+        self.osutils.get_config_values.assert_called_once_with(
+            self._init._PLUGINS_CONFIG_SECTION)
+        self.assertFalse(self.osutils.get_config_value.called)
+        self.assertEqual(response, 1)
+
     def test_set_plugin_status(self):
 
         self._init._set_plugin_status(self.osutils, 'fake plugin', 'status')
         self.osutils.set_config_value.assert_called_once_with(
             'fake plugin', 'status', self._init._PLUGINS_CONFIG_SECTION)
 
+    def test_set_plugin_status_loaded(self):
+        self.osutils.get_config_values.return_value = {}
+        self._init._load_plugins_status(self.osutils)
+        self._init._set_plugin_status(self.osutils, 'fake plugin', 'status')
+        self.assertEqual(
+            self._init._get_plugin_status(self.osutils, 'fake plugin'),
+            'status')
+
     @mock.patch('cloudbaseinit.init.InitManager._get_plugin_status')
     @mock.patch('cloudbaseinit.init.InitManager._set_plugin_status')
     def _test_exec_plugin(self, status, mock_set_plugin_status,
@@ -128,15 +145,204 @@ class InitManagerTest(unittest.TestCase):
         mock_get_os_utils.return_value = self.osutils
         mock_get_metadata_service.return_value = fake_service
         fake_service.get_name.return_value = 'fake name'
+        self.osutils.get_config_values.return_value = {}
 
         self._init.configure_host()
 
         self.osutils.wait_for_boot_completion.assert_called_once()
-        mock_get_metadata_service.assert_called_once_with()
-        fake_service.get_name.assert_called_once_with()
+        self.osutils.get_config_values.assert_called_once_with(
+            self._init._PLUGINS_CONFIG_SECTION)
         mock_check_os_requirements.assert_called_once_with(self.osutils,
                                                            fake_plugin)
+        mock_get_metadata_service.assert_called_once_with()
         mock_exec_plugin.assert_called_once_with(self.osutils, fake_service,
                                                  fake_plugin, {})
         fake_service.cleanup.assert_called_once_with()
         self.osutils.reboot.assert_called_once_with()
+
+    @mock.patch('cloudbaseinit.init.InitManager'
+                '._check_plugin_os_requirements')
+    @mock.patch('cloudbaseinit.init.InitManager._exec_plugin')
+    @mock.patch('cloudbaseinit.plugins.factory.PluginFactory.load_plugins')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    @mock.patch('cloudbaseinit.metadata.factory.MetadataServiceFactory.'
+                'get_metadata_service')
+    def test_configure_host_no_metadata_service(self,
+                                                mock_get_metadata_service,
+                                                mock_get_os_utils,
+                                                mock_load_plugins,
+                                                mock_exec_plugin,
+                                                mock_check_os_requirements):
+        mock_load_plugins.return_value = [mock.MagicMock()]
+        mock_get_os_utils.return_value = self.osutils
+        mock_get_metadata_service.side_effect = Exception(
+            'No available service found')
+        self.osutils.get_config_values.return_value = {}
+
+        self.assertRaises(Exception, self._init.configure_host)
+
+        self.assertFalse(mock_exec_plugin.called)
+        self.assertFalse(self.osutils.reboot.called)
+        self.assertFalse(self.osutils.terminate.called)
+
+    @mock.patch('cloudbaseinit.init.InitManager'
+                '._check_plugin_os_requirements')
+    @mock.patch('cloudbaseinit.init.InitManager._exec_plugin')
+    @mock.patch('cloudbaseinit.plugins.factory.PluginFactory.load_plugins')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    @mock.patch('cloudbaseinit.metadata.factory.MetadataServiceFactory.'
+                'get_metadata_service')
+    def test_configure_host_all_plugins_executed(self,
+                                                 mock_get_metadata_service,
+                                                 mock_get_os_utils,
+                                                 mock_load_plugins,
+                                                 mock_exec_plugin,
+                                                 mock_check_os_requirements):
+        fake_plugin = mock.MagicMock()
+        fake_plugin.get_name.return_value = 'fake plugin'
+        mock_load_plugins.return_value = [fake_plugin]
+        mock_get_os_utils.return_value = self.osutils
+        self.osutils.get_config_values.return_value = {
+            'fake plugin': base.PLUGIN_EXECUTION_DONE}
+
+        self._init.configure_host()
+
+        self.assertFalse(mock_get_metadata_service.called)
+        self.assertFalse(mock_exec_plugin.called)
+        self.assertFalse(self.osutils.reboot.called)
+        self.osutils.terminate.assert_called_once_with()
+
+    @mock.patch('cloudbaseinit.plugins.scheduler.PluginScheduler')
+    @mock.patch('cloudbaseinit.init.InitManager._exec_plugin')
+    def test_exec_plugins_parallel(self, mock_exec_plugin,
+                                   mock_plugin_scheduler):
+        CONF.set_override('plugins_max_workers', 4)
+        mock_plugin_scheduler.return_value.execute.side_effect = (
+            lambda exec_plugin, stop_on_reboot, can_run_before_reboot:
+            exec_plugin(self.plugin))
+
+        response = self._init._exec_plugins_parallel(
+            self.osutils, 'fake service', [self.plugin], {})
+
+        mock_plugin_scheduler.assert_called_once_with([self.plugin], 4)
+        mock_exec_plugin.assert_called_once_with(self.osutils, 'fake service',
+                                                 self.plugin, {})
+        self.assertEqual(response, mock_exec_plugin.return_value)
+        CONF.clear_override('plugins_max_workers')
+
+    def test_can_run_before_reboot_tolerant(self):
+        self.plugin.get_reboot_policy.return_value = (
+            base.PLUGIN_REBOOT_TOLERANT)
+        self.assertTrue(self._init._can_run_before_reboot(self.osutils,
+                                                          self.plugin))
+
+    @mock.patch('cloudbaseinit.init.InitManager._get_plugin_status')
+    def _test_can_run_before_reboot_barrier(self, mock_get_plugin_status,
+                                            status):
+        self.plugin.get_reboot_policy.return_value = (
+            base.PLUGIN_REBOOT_BARRIER)
+        mock_get_plugin_status.return_value = status
+        response = self._init._can_run_before_reboot(self.osutils,
+                                                     self.plugin)
+        mock_get_plugin_status.assert_called_once_with(
+            self.osutils, self.plugin.get_name.return_value)
+        return response
+
+    def test_can_run_before_reboot_barrier(self):
+        self.assertFalse(self._test_can_run_before_reboot_barrier(
+            status=None))
+
+    def test_can_run_before_reboot_barrier_executed(self):
+        self.assertTrue(self._test_can_run_before_reboot_barrier(
+            status=base.PLUGIN_EXECUTION_DONE))
+
+    @mock.patch('cloudbaseinit.init.InitManager'
+                '._check_plugin_os_requirements')
+    @mock.patch('cloudbaseinit.init.InitManager._exec_plugin')
+    @mock.patch('cloudbaseinit.plugins.factory.PluginFactory.load_plugins')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    @mock.patch('cloudbaseinit.metadata.factory.MetadataServiceFactory.'
+                'get_metadata_service')
+    def test_configure_host_coalesce_reboots(self, mock_get_metadata_service,
+                                             mock_get_os_utils,
+                                             mock_load_plugins,
+                                             mock_exec_plugin,
+                                             mock_check_os_requirements):
+        plugins = []
+        for (name, policy) in [('first', base.PLUGIN_REBOOT_TOLERANT),
+                               ('second', base.PLUGIN_REBOOT_TOLERANT),
+                               ('barrier', base.PLUGIN_REBOOT_BARRIER),
+                               ('last', base.PLUGIN_REBOOT_TOLERANT)]:
+            plugin = mock.MagicMock()
+            plugin.get_name.return_value = name
+            plugin.get_reboot_policy.return_value = policy
+            plugins.append(plugin)
+        mock_load_plugins.return_value = plugins
+        mock_get_os_utils.return_value = self.osutils
+        mock_exec_plugin.return_value = True
+        self.osutils.get_config_values.return_value = {}
+        CONF.set_override('coalesce_reboots', True)
+
+        try:
+            self._init.configure_host()
+        finally:
+            CONF.clear_override('coalesce_reboots')
+
+        self.assertEqual(mock_exec_plugin.call_args_list,
+                         [mock.call(self.osutils, mock.ANY, plugins[0], {}),
+                          mock.call(self.osutils, mock.ANY, plugins[1], {})])
+        self.osutils.reboot.assert_called_once_with()
+
+    @mock.patch('cloudbaseinit.init.InitManager'
+                '._check_plugin_os_requirements')
+    @mock.patch('cloudbaseinit.init.InitManager._exec_plugin')
+    @mock.patch('cloudbaseinit.plugins.factory.PluginFactory.load_plugins')
+    @mock.patch('cloudbaseinit.osutils.factory.OSUtilsFactory.get_os_utils')
+    @mock.patch('cloudbaseinit.metadata.factory.MetadataServiceFactory.'
+                'get_metadata_service')
+    def _test_configure_host_pending_reboot(self, mock_get_metadata_service,
+                                            mock_get_os_utils,
+                                            mock_load_plugins,
+                                            mock_exec_plugin,
+                                            mock_check_os_requirements,
+                                            max_workers):
+        self.osutils = mock.MagicMock()
+        self._init = init.InitManager()
+        plugins = []
+        # All the plugins following "reboot" depend only on it
+        for (name, policy, shared_data) in [
+                ('reboot', base.PLUGIN_REBOOT_TOLERANT, ([], ['key'])),
+                ('tolerant', base.PLUGIN_REBOOT_TOLERANT, (['key'], [])),
+                ('barrier', base.PLUGIN_REBOOT_BARRIER, (['key'], [])),
+                ('last', base.PLUGIN_REBOOT_TOLERANT, (['key'], []))]:
+            plugin = mock.MagicMock()
+            plugin.get_name.return_value = name
+            plugin.get_reboot_policy.return_value = policy
+            plugin.get_shared_data_requirements.return_value = shared_data
+            plugin.get_required_services.return_value = []
+            plugins.append(plugin)
+        mock_load_plugins.return_value = plugins
+        mock_get_os_utils.return_value = self.osutils
+        mock_exec_plugin.side_effect = (
+            lambda osutils, service, plugin, shared_data:
+            plugin.get_name() == 'reboot')
+        self.osutils.get_config_values.return_value = {}
+        CONF.set_override('coalesce_reboots', True)
+        CONF.set_override('plugins_max_workers', max_workers)
+
+        try:
+            self._init.configure_host()
+        finally:
+            CONF.clear_override('coalesce_reboots')
+            CONF.clear_override('plugins_max_workers')
+
+        self.osutils.reboot.assert_called_once_with()
+        return [c[0][2].get_name() for c in mock_exec_plugin.call_args_list]
+
+    def test_configure_host_pending_reboot_serial_and_parallel(self):
+        # The serial and parallel executions stop at the same plugin
+        expected = ['reboot', 'tolerant']
+        self.assertEqual(self._test_configure_host_pending_reboot(
+            max_workers=1), expected)
+        self.assertEqual(self._test_configure_host_pending_reboot(
+            max_workers=4), expected)
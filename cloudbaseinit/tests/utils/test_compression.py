@@ -0,0 +1,67 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import StringIO
+import unittest
+import zlib
+
+from cloudbaseinit.utils import compression
+
+
+def gzip_data(data):
+    buf = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class CompressionTests(unittest.TestCase):
+    def test_is_gzip(self):
+        self.assertTrue(compression.is_gzip(gzip_data('fake data')))
+        self.assertFalse(compression.is_gzip('fake data'))
+        self.assertFalse(compression.is_gzip(''))
+
+    def test_decompress_gzip(self):
+        data = 'fake data' * 100000
+        self.assertEqual(compression.decompress_gzip(gzip_data(data)), data)
+
+    def test_decompress_gzip_max_size(self):
+        data = gzip_data('\0' * 1024 * 1024)
+        self.assertEqual(len(compression.decompress_gzip(data, 1024 * 1024)),
+                         1024 * 1024)
+        self.assertRaises(compression.DecompressedSizeExceededException,
+                          compression.decompress_gzip, data, 1024 * 1024 - 1)
+
+    def test_decompress_gzip_bounded_output(self):
+        decompressor = compression.GzipDecompressor(max_size=1000,
+                                                    chunk_size=100)
+        # The whole input expands to much more than max_size
+        self.assertRaises(compression.DecompressedSizeExceededException,
+                          decompressor.decompress,
+                          gzip_data('\0' * 100 * 1024 * 1024))
+        self.assertLessEqual(decompressor._size, 1100)
+
+    def test_decompress_gzip_chunks(self):
+        data = 'fake data' * 1000
+        compressed = gzip_data(data)
+        decompressor = compression.GzipDecompressor()
+        output = [decompressor.decompress(compressed[i:i + 10])
+                  for i in range(0, len(compressed), 10)]
+        output.append(decompressor.flush())
+        self.assertEqual(''.join(output), data)
+
+    def test_decompress_gzip_invalid(self):
+        self.assertRaises(zlib.error, compression.decompress_gzip,
+                          compression.GZIP_MAGIC + 'fake data')
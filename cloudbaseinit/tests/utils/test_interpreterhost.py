@@ -0,0 +1,120 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import distutils.spawn
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from cloudbaseinit.utils import interpreterhost
+
+_BASH = distutils.spawn.find_executable('bash')
+
+
+class InterpreterHostPoolTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._pool = interpreterhost.InterpreterHostPool()
+
+    def tearDown(self):
+        self._pool.close()
+        shutil.rmtree(self._temp_dir)
+
+    def _write_script(self, name, content):
+        path = os.path.join(self._temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _execute_python(self, content, timeout=0):
+        path = self._write_script('script.py', content)
+        return self._pool.execute(interpreterhost.INTERPRETER_PYTHON,
+                                  sys.executable, path, timeout)
+
+    def _execute_bash(self, content, timeout=0):
+        path = self._write_script('script.sh', content)
+        return self._pool.execute(interpreterhost.INTERPRETER_BASH,
+                                  _BASH, path, timeout)
+
+    def _get_host(self, interpreter, executable):
+        return self._pool._get_host(interpreter, executable)
+
+    def test_execute_python(self):
+        for i in range(5):
+            (out, err, exit_code) = self._execute_python(
+                'import sys\n'
+                'sys.stdout.write("fake out %d\\n")\n'
+                'sys.stderr.write("fake err")\n'
+                'sys.exit(%d)' % (i, i))
+            self.assertEqual(out, 'fake out %d\n' % i)
+            self.assertEqual(err, 'fake err')
+            self.assertEqual(exit_code, i)
+
+    def test_execute_python_reuses_host(self):
+        self._execute_python('import os\nprint(os.getpid())')
+        host = self._get_host(interpreterhost.INTERPRETER_PYTHON,
+                              sys.executable)
+        (out, err, exit_code) = self._execute_python(
+            'import os\nprint(os.getpid())')
+        self.assertEqual(int(out), host._process.pid)
+        self.assertIs(self._get_host(interpreterhost.INTERPRETER_PYTHON,
+                                     sys.executable), host)
+
+    def test_execute_python_exception(self):
+        (out, err, exit_code) = self._execute_python('raise Exception("fake")')
+        self.assertEqual(out, '')
+        self.assertIn('Exception: fake', err)
+        self.assertEqual(exit_code, 1)
+
+    def test_execute_python_host_ended(self):
+        (out, err, exit_code) = self._execute_python(
+            'import os\nprint("fake")\nos._exit(7)')
+        self.assertEqual(out.strip(), 'fake')
+        self.assertEqual(exit_code, 7)
+
+        # A new host is started for the next script
+        (out, err, exit_code) = self._execute_python('print("fake")')
+        self.assertEqual((out, exit_code), ('fake\n', 0))
+
+    @unittest.skipUnless(_BASH, 'bash is not available')
+    def test_execute_bash(self):
+        (out, err, exit_code) = self._execute_bash(
+            'echo "fake out"\necho "fake err" >&2\nexit 4\n')
+        self.assertEqual(out, 'fake out\n')
+        self.assertEqual(err, 'fake err\n')
+        self.assertEqual(exit_code, 4)
+
+        # Scripts run in subshells and cannot end the host
+        (out, err, exit_code) = self._execute_bash('fake_var=1\nexit 0\n')
+        (out, err, exit_code) = self._execute_bash('echo "$fake_var"\n')
+        self.assertEqual((out, exit_code), ('\n', 0))
+
+    @unittest.skipUnless(_BASH, 'bash is not available')
+    def test_execute_bash_timeout(self):
+        start_time = time.time()
+        (out, err, exit_code) = self._execute_bash(
+            'echo "started"\nsleep 60\n', timeout=1)
+        self.assertLess(time.time() - start_time, 30)
+        self.assertEqual(out, 'started\n')
+        self.assertNotEqual(exit_code, 0)
+
+        (out, err, exit_code) = self._execute_bash('echo "fake"\n')
+        self.assertEqual((out, exit_code), ('fake\n', 0))
+
+    def test_get_host_args_unsupported(self):
+        self.assertRaises(ValueError, interpreterhost.get_host_args,
+                          'fake interpreter', 'fake.exe')
@@ -0,0 +1,144 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import imp
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit.utils import modulecache
+
+_SOURCE = 'def list_types():\r\n    return ["fake/type"]\r\n'
+
+
+class ModuleCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self._cache_dir = os.path.join(tempfile.mkdtemp(), 'cache')
+        os.mkdir(self._cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self._cache_dir))
+
+    def _get_bytecode_paths(self):
+        return [os.path.join(self._cache_dir, f)
+                for f in os.listdir(self._cache_dir) if f.endswith('.pyc')]
+
+    def _get_bytecode_path(self, source):
+        return os.path.join(self._cache_dir,
+                            hashlib.sha256(source).hexdigest() + '.pyc')
+
+    def _get_forged_bytecode(self):
+        code = compile('def list_types():\n    return ["forged/type"]\n',
+                       'forged.py', 'exec')
+        return imp.get_magic() + marshal.dumps(code)
+
+    def test_load_source(self):
+        cache = modulecache.ModuleCache(self._cache_dir)
+        module = cache.load_source(_SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.__name__, 'fake_handler')
+        self.assertEqual(module.list_types(), ['fake/type'])
+        self.assertEqual(len(self._get_bytecode_paths()), 1)
+        self.assertIs(cache.load_source(_SOURCE, 'other.py'), module)
+
+    def test_load_source_different_sources(self):
+        cache = modulecache.ModuleCache(self._cache_dir)
+        module1 = cache.load_source(_SOURCE, 'fake_handler.py')
+        module2 = cache.load_source(_SOURCE + 'x = 1\n', 'fake_handler.py')
+
+        self.assertIsNot(module1, module2)
+        self.assertEqual(len(self._get_bytecode_paths()), 2)
+
+    def test_load_source_cached_bytecode(self):
+        modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+        # The cached bytecode is used instead of the source
+        with open(self._get_bytecode_paths()[0], 'rb') as f:
+            bytecode = f.read()
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+        with open(self._get_bytecode_paths()[0], 'rb') as f:
+            self.assertEqual(f.read(), bytecode)
+
+    def test_load_source_invalid_bytecode(self):
+        modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+        bytecode_path = self._get_bytecode_paths()[0]
+        with open(bytecode_path, 'wb') as f:
+            f.write('fake bytecode')
+
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+        with open(bytecode_path, 'rb') as f:
+            self.assertNotEqual(f.read(), 'fake bytecode')
+
+    def test_load_source_no_cache_dir(self):
+        module = modulecache.ModuleCache().load_source(_SOURCE,
+                                                       'fake_handler.py')
+        self.assertEqual(module.list_types(), ['fake/type'])
+        self.assertEqual(os.listdir(self._cache_dir), [])
+
+    def test_load_source_planted_bytecode(self):
+        with open(self._get_bytecode_path(_SOURCE), 'wb') as f:
+            f.write(self._get_forged_bytecode())
+
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+
+    def test_load_source_tampered_bytecode(self):
+        modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+        bytecode_path = self._get_bytecode_path(_SOURCE)
+        with open(bytecode_path, 'rb') as f:
+            digest = f.read(32)
+        # The digest of the original bytecode is kept
+        with open(bytecode_path, 'wb') as f:
+            f.write(digest + self._get_forged_bytecode())
+
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+
+    def test_load_source_bytecode_of_other_source(self):
+        other_source = 'def list_types():\n    return ["other/type"]\n'
+        modulecache.ModuleCache(self._cache_dir).load_source(
+            other_source, 'other_handler.py')
+        os.rename(self._get_bytecode_path(other_source),
+                  self._get_bytecode_path(_SOURCE))
+
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+
+    def test_load_source_invalid_key(self):
+        with open(os.path.join(self._cache_dir, 'cache.key'), 'wb') as f:
+            f.write('fake key')
+
+        module = modulecache.ModuleCache(self._cache_dir).load_source(
+            _SOURCE, 'fake_handler.py')
+
+        self.assertEqual(module.list_types(), ['fake/type'])
+        self.assertEqual(self._get_bytecode_paths(), [])
@@ -0,0 +1,135 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import email
+import unittest
+
+from email.mime import application
+from email.mime import multipart as mime_multipart
+from email.mime import text
+
+from cloudbaseinit.tests.utils import test_compression
+from cloudbaseinit.utils import multipart
+
+
+def _get_fake_user_data():
+    msg = mime_multipart.MIMEMultipart()
+    script = text.MIMEText('echo "fake script"\r\necho done\r\n',
+                           'x-shellscript')
+    script.add_header('Content-Disposition', 'attachment',
+                      filename='script.cmd')
+    msg.attach(script)
+
+    nested = mime_multipart.MIMEMultipart()
+    config = text.MIMEText('fake config = caf\xc3\xa9\n' * 20, 'cloud-config',
+                           'utf-8')
+    nested.attach(config)
+    binary = application.MIMEApplication('\0\1\2\xff' * 100)
+    binary.add_header('Content-Disposition', 'attachment',
+                      filename='fake.bin')
+    nested.attach(binary)
+    msg.attach(nested)
+
+    qp = text.MIMEText('', 'x-cfninitdata')
+    qp.set_payload('fake=3Dvalue with a soft=\nline break\n')
+    qp.replace_header('Content-Transfer-Encoding', 'quoted-printable')
+    qp.add_header('Content-Disposition', 'attachment',
+                  filename='cfn-userdata')
+    msg.attach(qp)
+    return msg.as_string()
+
+
+class MultipartTests(unittest.TestCase):
+    def _get_expected_parts(self, user_data):
+        parts = []
+        for part in email.message_from_string(user_data).walk():
+            payload = None
+            if not part.is_multipart():
+                payload = part.get_payload(decode=True)
+            parts.append((part.get_content_type(), part.get_filename(),
+                          payload))
+        return parts
+
+    def _test_iter_parts(self, user_data, chunk_size=1024):
+        parts = [(p.get_content_type(), p.get_filename(), p.get_payload())
+                 for p in multipart.iter_parts(user_data, chunk_size)]
+        self.assertEqual(parts, self._get_expected_parts(user_data))
+
+    def test_iter_parts(self):
+        self._test_iter_parts(_get_fake_user_data())
+
+    def test_iter_parts_small_chunks(self):
+        user_data = _get_fake_user_data()
+        for chunk_size in [1, 3, 7]:
+            self._test_iter_parts(user_data, chunk_size)
+
+    def test_iter_parts_crlf(self):
+        user_data = _get_fake_user_data().replace('\n', '\r\n')
+        parts = list(multipart.iter_parts(user_data))
+        self.assertEqual(len(parts), 6)
+        self.assertEqual(parts[1].get_payload(),
+                         'echo "fake script"\r\r\necho done\r\r\n')
+        self.assertEqual(parts[4].get_payload(), '\0\1\2\xff' * 100)
+        self.assertEqual(parts[5].get_payload(),
+                         'fake=value with a softline break\r\n')
+
+    def test_iter_parts_not_multipart(self):
+        self._test_iter_parts('Content-Type: text/x-shellscript\n\n'
+                              'echo "fake script"\n')
+
+    def test_iter_parts_unterminated(self):
+        user_data = ('Content-Type: multipart/mixed; boundary="fake"\n\n'
+                     '--fake\nContent-Type: text/plain\n\nfake data\n')
+        parts = list(multipart.iter_parts(user_data))
+        self.assertEqual([p.get_content_type() for p in parts],
+                         ['multipart/mixed', 'text/plain'])
+        self.assertTrue(parts[0].is_multipart())
+        self.assertEqual(parts[1].get_payload(), 'fake data\n')
+
+    def test_feed_returns_parts_when_completed(self):
+        feed_parser = multipart.MultipartFeedParser()
+        parts = feed_parser.feed(
+            'Content-Type: multipart/mixed; boundary="fake"\n\n'
+            '--fake\nContent-Type: text/plain\n\nfake data 1\n'
+            '--fake\nContent-Type: text/plain\n\nfake data 2')
+        self.assertEqual([p.get_payload() for p in parts],
+                         [None, 'fake data 1'])
+
+        parts = feed_parser.feed('\n--fake--\n')
+        self.assertEqual([p.get_payload() for p in parts], ['fake data 2'])
+        self.assertEqual(feed_parser.close(), [])
+
+    def _get_gzip_user_data(self, data):
+        msg = mime_multipart.MIMEMultipart()
+        msg.attach(application.MIMEApplication(
+            test_compression.gzip_data(data)))
+        script = text.MIMEText('', 'x-shellscript')
+        script.set_payload(test_compression.gzip_data(data))
+        msg.attach(script)
+        msg.attach(text.MIMEText('fake text'))
+        return msg.as_string()
+
+    def test_iter_parts_gzip(self):
+        user_data = self._get_gzip_user_data('fake data' * 1000)
+        parts = list(multipart.iter_parts(user_data, chunk_size=100))
+        self.assertEqual([p.get_payload() for p in parts[1:]],
+                         ['fake data' * 1000] * 2 + ['fake text'])
+
+    def test_iter_parts_gzip_max_size(self):
+        user_data = self._get_gzip_user_data('fake data' * 1000)
+        parts = list(multipart.iter_parts(user_data,
+                                          max_decompressed_size=1000))
+        # The parts exceeding the max. size are skipped
+        self.assertEqual([p.get_content_type() for p in parts],
+                         ['multipart/mixed', 'text/plain'])
@@ -0,0 +1,117 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import sys
+import time
+import unittest
+
+from oslo.config import cfg
+
+from cloudbaseinit.utils import processexecutor
+from cloudbaseinit.utils import tracing
+
+CONF = cfg.CONF
+
+
+def _python_args(script):
+    return [sys.executable, '-c', script]
+
+
+class OutputBufferTests(unittest.TestCase):
+    def test_write(self):
+        buf = processexecutor.OutputBuffer(10)
+        buf.write('fake\n')
+        self.assertEqual(buf.getvalue(), 'fake\n')
+        self.assertFalse(buf.is_truncated())
+
+    def test_write_truncated(self):
+        buf = processexecutor.OutputBuffer(10)
+        for i in range(100):
+            buf.write('line %d\n' % i)
+        self.assertEqual(buf.getvalue(), '8\nline 99\n')
+        self.assertEqual(buf.get_total_size(), 790)
+        self.assertTrue(buf.is_truncated())
+
+    def test_write_no_output_kept(self):
+        buf = processexecutor.OutputBuffer(0)
+        buf.write('fake\n')
+        self.assertEqual(buf.getvalue(), '')
+
+
+class ProcessExecutorTests(unittest.TestCase):
+    def tearDown(self):
+        CONF.clear_override('trace_file')
+        tracing.clear()
+
+    def _test_execute_traced(self, args, shell):
+        CONF.set_override('trace_file', 'fake trace file')
+        tracing.clear()
+        executor = processexecutor.ProcessExecutor(timeout=0)
+        executor.execute(args, shell=shell)
+
+        events = [e for e in tracing.get_events()
+                  if e['name'] == 'execute_process']
+        self.assertEqual(len(events), 1)
+        self.assertNotIn('fake password', repr(events[0]))
+        return events[0]['args']['executable']
+
+    def test_execute_traced_without_arguments(self):
+        response = self._test_execute_traced(
+            _python_args('import sys # fake password'), shell=False)
+        self.assertEqual(response, sys.executable)
+
+    def test_execute_traced_command_line(self):
+        response = self._test_execute_traced(
+            'exit 0 fake password', shell=True)
+        self.assertEqual(response, 'exit')
+
+    def test_execute(self):
+        executor = processexecutor.ProcessExecutor(timeout=0)
+        (out, err, exit_code) = executor.execute(_python_args(
+            'import sys\n'
+            'sys.stdout.write("fake out\\n")\n'
+            'sys.stderr.write("fake err\\n")\n'
+            'sys.exit(3)'), shell=False)
+        self.assertEqual(out, 'fake out\n')
+        self.assertEqual(err, 'fake err\n')
+        self.assertEqual(exit_code, 3)
+
+    @mock.patch('cloudbaseinit.utils.processexecutor.LOG')
+    def test_execute_streams_lines(self, mock_log):
+        executor = processexecutor.ProcessExecutor(timeout=0,
+                                                   output_max_size=100)
+        (out, err, exit_code) = executor.execute(_python_args(
+            'for i in range(10000): print("fake line %d" % i)'),
+            shell=False)
+        self.assertEqual(len(out), 100)
+        self.assertTrue(out.endswith('fake line 9999\n'))
+        logged_lines = [c for c in mock_log.debug.call_args_list
+                        if 'stdout: fake line' in c[0][0]]
+        self.assertEqual(len(logged_lines), 10000)
+
+    def test_execute_timeout(self):
+        mock_kill_process_tree = mock.MagicMock(
+            side_effect=NotImplementedError)
+        executor = processexecutor.ProcessExecutor(mock_kill_process_tree,
+                                                   timeout=1)
+        start_time = time.time()
+        (out, err, exit_code) = executor.execute(_python_args(
+            'import time\n'
+            'print("started")\n'
+            'time.sleep(60)'), shell=False)
+        self.assertLess(time.time() - start_time, 30)
+        self.assertEqual(out.strip(), 'started')
+        self.assertNotEqual(exit_code, 0)
+        self.assertEqual(mock_kill_process_tree.call_count, 1)
@@ -0,0 +1,88 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import struct
+import unittest
+
+from cloudbaseinit.utils import routingtable
+
+_ROUTES = [
+    ('0.0.0.0', '0.0.0.0', '10.0.0.1', 1, 20),
+    ('0.0.0.0', '0.0.0.0', '10.0.1.1', 2, 10),
+    ('10.0.0.0', '255.255.0.0', '10.0.0.2', 1, 10),
+    ('10.0.1.0', '255.255.255.0', '10.0.1.2', 2, 10),
+    ('10.0.1.0', '255.255.255.0', '10.0.1.3', 3, 5),
+    ('169.254.169.254', '255.255.255.255', '10.0.0.1', 1, 10),
+]
+
+
+class RoutingTableTests(unittest.TestCase):
+
+    def setUp(self):
+        self._table = routingtable.RoutingTable.from_routes(_ROUTES)
+
+    def test_ip_to_int(self):
+        self.assertEqual(routingtable.ip_to_int('10.0.1.2'), 0x0a000102)
+        self.assertEqual(routingtable.int_to_ip(0x0a000102), '10.0.1.2')
+
+    def test_iter(self):
+        self.assertEqual(len(self._table), len(_ROUTES))
+        self.assertEqual([tuple(r) for r in self._table], _ROUTES)
+
+    def test_get_routes(self):
+        response = self._table.get_routes('0.0.0.0')
+        self.assertEqual([r.next_hop for r in response],
+                         ['10.0.0.1', '10.0.1.1'])
+        self.assertEqual(self._table.get_routes('10.0.0.1'), [])
+
+    def test_has_destination(self):
+        self.assertTrue(self._table.has_destination('169.254.169.254'))
+        self.assertFalse(self._table.has_destination('169.254.169.253'))
+
+    def test_lookup_longest_prefix(self):
+        self.assertEqual(self._table.lookup('169.254.169.254').next_hop,
+                         '10.0.0.1')
+        self.assertEqual(self._table.lookup('10.0.2.1').next_hop,
+                         '10.0.0.2')
+        # The route with the lowest metric is selected
+        self.assertEqual(self._table.lookup('10.0.1.7').next_hop,
+                         '10.0.1.3')
+        self.assertEqual(self._table.lookup('8.8.8.8').next_hop,
+                         '10.0.1.1')
+
+    def test_lookup_no_route(self):
+        table = routingtable.RoutingTable.from_routes(_ROUTES[2:])
+        self.assertIsNone(table.lookup('8.8.8.8'))
+
+    def test_empty(self):
+        table = routingtable.RoutingTable([], [], [], [], [])
+        self.assertEqual(len(table), 0)
+        self.assertIsNone(table.lookup('8.8.8.8'))
+
+    def test_from_mib_ipforwardrows(self):
+        data = ''
+        for (dest, mask, next_hop, if_index, metric) in _ROUTES[:2]:
+            # Addresses are in network byte order, other values are native
+            data += struct.pack('!II', routingtable.ip_to_int(dest),
+                                routingtable.ip_to_int(mask))
+            data += struct.pack('=I', 0)
+            data += struct.pack('!I', routingtable.ip_to_int(next_hop))
+            data += struct.pack('=10I', if_index, 0, 0, 0, 0, metric,
+                                0, 0, 0, 0)
+        # Trailing data after the entries is ignored
+        data += '\x00' * 8
+
+        table = routingtable.RoutingTable.from_mib_ipforwardrows(data, 2)
+
+        self.assertEqual([tuple(r) for r in table], _ROUTES[:2])
@@ -0,0 +1,107 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from oslo.config import cfg
+
+from cloudbaseinit.utils import tracing
+
+CONF = cfg.CONF
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._trace_file = os.path.join(self._temp_dir, 'trace.json')
+        tracing.clear()
+
+    def tearDown(self):
+        CONF.clear_override('trace_file')
+        CONF.clear_override('trace_log_summary')
+        tracing.clear()
+        shutil.rmtree(self._temp_dir)
+
+    def test_span_disabled(self):
+        with tracing.span('fake span') as span:
+            span.set_arg('fake arg', 1)
+        self.assertEqual(tracing.get_events(), [])
+
+    def test_span(self):
+        CONF.set_override('trace_file', self._trace_file)
+        with tracing.span('fake span', 'fake category', arg1=1) as span:
+            span.set_arg('arg2', 2)
+
+        events = tracing.get_events()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], 'fake span')
+        self.assertEqual(events[0]['cat'], 'fake category')
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertEqual(events[0]['args'], {'arg1': 1, 'arg2': 2})
+        self.assertEqual(events[0]['pid'], os.getpid())
+        self.assertTrue(events[0]['dur'] >= 0)
+
+    def test_span_exception(self):
+        CONF.set_override('trace_file', self._trace_file)
+
+        def _raise():
+            with tracing.span('fake span'):
+                raise ValueError('fake error')
+
+        self.assertRaises(ValueError, _raise)
+        self.assertEqual(tracing.get_events()[0]['args'],
+                         {'error': repr(ValueError('fake error'))})
+
+    def test_counter_disabled(self):
+        tracing.counter('fake counter', hits=1)
+        self.assertEqual(tracing.get_events(), [])
+
+    def test_counter(self):
+        CONF.set_override('trace_file', self._trace_file)
+        tracing.counter('fake counter', 'fake category', hits=1, misses=2)
+
+        events = tracing.get_events()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], 'fake counter')
+        self.assertEqual(events[0]['cat'], 'fake category')
+        self.assertEqual(events[0]['ph'], 'C')
+        self.assertEqual(events[0]['args'], {'hits': 1, 'misses': 2})
+
+    def test_save(self):
+        CONF.set_override('trace_file', self._trace_file)
+        with tracing.span('fake span'):
+            pass
+
+        tracing.save()
+
+        with open(self._trace_file, 'rb') as f:
+            trace = json.load(f)
+        self.assertEqual(trace['traceEvents'], tracing.get_events())
+
+    @mock.patch('cloudbaseinit.utils.tracing.LOG')
+    def test_save_log_summary(self, mock_log):
+        CONF.set_override('trace_log_summary', True)
+        with tracing.span('fake span'):
+            pass
+
+        tracing.save()
+
+        self.assertFalse(os.path.exists(self._trace_file))
+        self.assertEqual(mock_log.info.call_count, 2)
+        self.assertTrue('fake span' in mock_log.info.call_args[0][0])
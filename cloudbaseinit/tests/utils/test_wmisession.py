@@ -0,0 +1,103 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest
+
+from oslo.config import cfg
+
+from cloudbaseinit.utils import tracing
+from cloudbaseinit.utils import wmisession
+
+CONF = cfg.CONF
+
+_DISKS_WQL = 'SELECT DeviceID FROM Win32_DiskDrive'
+
+
+class WMISessionTests(unittest.TestCase):
+
+    def setUp(self):
+        self._wmi = mock.MagicMock()
+        self._conn = self._wmi.WMI.return_value
+        self._conn.query.return_value = [mock.MagicMock(DeviceID='disk0')]
+        self._session = wmisession.WMISession()
+        self._patcher = mock.patch.dict('sys.modules', {'wmi': self._wmi})
+        self._patcher.start()
+
+    def tearDown(self):
+        self._patcher.stop()
+        CONF.clear_override('wmi_query_cache_ttl')
+        CONF.clear_override('trace_file')
+        tracing.clear()
+
+    def test_get_connection(self):
+        response = self._session.get_connection()
+        self.assertEqual(self._session.get_connection(), response)
+        self._wmi.WMI.assert_called_once_with(
+            moniker=wmisession.CIMV2_MONIKER)
+        self.assertEqual(response, self._conn)
+
+    def test_query(self):
+        response = self._session.query('fake wql')
+        self._conn.query.assert_called_once_with('fake wql')
+        self.assertEqual(response, self._conn.query.return_value)
+
+    def test_query_properties_no_cache(self):
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+        response = self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+
+        self.assertEqual(self._conn.query.call_count, 2)
+        self.assertEqual([r.DeviceID for r in response], ['disk0'])
+        self.assertEqual(self._session.get_stats(),
+                         {'hits': 0, 'misses': 0})
+
+    def test_query_properties_cached(self):
+        CONF.set_override('wmi_query_cache_ttl', 10)
+        CONF.set_override('trace_file', 'fake trace file')
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+        response = self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+
+        self._conn.query.assert_called_once_with(_DISKS_WQL)
+        self.assertEqual([r.DeviceID for r in response], ['disk0'])
+        self.assertEqual(self._session.get_stats(),
+                         {'hits': 1, 'misses': 1})
+        counters = [e for e in tracing.get_events() if e['ph'] == 'C']
+        self.assertEqual(counters[-1]['args'], {'hits': 1, 'misses': 1})
+
+    @mock.patch('time.time')
+    def test_query_properties_expired(self, mock_time):
+        CONF.set_override('wmi_query_cache_ttl', 10)
+        mock_time.return_value = 100
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+        mock_time.return_value = 111
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+
+        self.assertEqual(self._conn.query.call_count, 2)
+
+    def test_invalidate(self):
+        CONF.set_override('wmi_query_cache_ttl', 10)
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+        self._session.invalidate('Win32_NetworkAdapter')
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+        self._session.invalidate('win32_diskdrive')
+        self._session.query_properties(_DISKS_WQL, ['DeviceID'])
+
+        self.assertEqual(self._conn.query.call_count, 2)
+
+    def test_get_session(self):
+        wmisession.reset()
+        response = wmisession.get_session()
+        self.assertIs(wmisession.get_session(), response)
+        wmisession.reset()
+        self.assertIsNot(wmisession.get_session(), response)
@@ -0,0 +1,67 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import zlib
+
+GZIP_MAGIC = '\x1f\x8b'
+
+_CHUNK_SIZE = 64 * 1024
+# Adding 16 to the window size selects the gzip header and trailer
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class DecompressedSizeExceededException(Exception):
+    pass
+
+
+def is_gzip(data):
+    return data[:len(GZIP_MAGIC)] == GZIP_MAGIC
+
+
+class GzipDecompressor(object):
+    """Streaming gzip decompressor with a cap on the decompressed size.
+
+    Output is produced in bounded increments, so that compressed data
+    expanding beyond max_size (e.g. a "zip bomb") is detected without
+    decompressing it.
+    """
+
+    def __init__(self, max_size=None, chunk_size=_CHUNK_SIZE):
+        self._decompressobj = zlib.decompressobj(_GZIP_WBITS)
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        self._size = 0
+
+    def _check_size(self, data):
+        self._size += len(data)
+        if self._max_size is not None and self._size > self._max_size:
+            raise DecompressedSizeExceededException(
+                'The decompressed data exceeds %d bytes' % self._max_size)
+        return data
+
+    def decompress(self, data):
+        output = []
+        while data:
+            output.append(self._check_size(
+                self._decompressobj.decompress(data, self._chunk_size)))
+            data = self._decompressobj.unconsumed_tail
+        return ''.join(output)
+
+    def flush(self):
+        return self._check_size(self._decompressobj.flush())
+
+
+def decompress_gzip(data, max_size=None):
+    decompressor = GzipDecompressor(max_size)
+    return decompressor.decompress(data) + decompressor.flush()
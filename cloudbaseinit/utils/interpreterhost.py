@@ -0,0 +1,276 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import base64
+import binascii
+import os
+import Queue
+import subprocess
+import threading
+import time
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import processexecutor
+from cloudbaseinit.utils import threadpool
+
+CONF = cfg.CONF
+CONF.import_opt('process_timeout', 'cloudbaseinit.utils.processexecutor')
+CONF.import_opt('process_output_max_size',
+                'cloudbaseinit.utils.processexecutor')
+
+LOG = logging.getLogger(__name__)
+
+INTERPRETER_BASH = 'bash'
+INTERPRETER_POWERSHELL = 'powershell'
+INTERPRETER_PYTHON = 'python'
+
+# Time given to a host to end after its stdin is closed
+_CLOSE_TIMEOUT = 10
+_MAX_LINE_SIZE = 64 * 1024
+
+# The hosts read one "<token> <script path>" request per line from stdin.
+# Once the script ends, "\n<token> <exit code>" is written to stdout and
+# "\n<token>" to stderr. The random token cannot be forged by the scripts.
+# The protocol stdin is replaced with an empty one for the scripts.
+
+_BASH_HOST = r'''
+exec 3<&0 0</dev/null
+while IFS=' ' read -r token path <&3; do
+    ( . "$path" )
+    code=$?
+    printf '\n%s %d\n' "$token" "$code"
+    printf '\n%s\n' "$token" >&2
+done
+'''
+
+_PYTHON_HOST = r'''
+import os
+import sys
+import traceback
+
+requests = os.fdopen(os.dup(0), 'r')
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+cwd = os.getcwd()
+for line in iter(requests.readline, ''):
+    (token, path) = line.rstrip('\r\n').split(' ', 1)
+    code = 0
+    sys.argv = [path]
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        exec(compile(source, path, 'exec'),
+             {'__name__': '__main__', '__file__': path})
+    except SystemExit as ex:
+        if ex.code is None or isinstance(ex.code, int):
+            code = ex.code or 0
+        else:
+            sys.stderr.write('%s\n' % ex.code)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    os.chdir(cwd)
+    sys.stdout.write('\n%s %d\n' % (token, code))
+    sys.stdout.flush()
+    sys.stderr.write('\n%s\n' % token)
+    sys.stderr.flush()
+'''
+
+_POWERSHELL_HOST = r'''
+$requests = [Console]::In
+while (($line = $requests.ReadLine()) -ne $null) {
+    $token, $path = $line.Split(' ', 2)
+    $global:LASTEXITCODE = 0
+    $code = 0
+    try {
+        $null | & $path | Out-Default
+        if ($LASTEXITCODE) { $code = $LASTEXITCODE }
+    } catch {
+        [Console]::Error.WriteLine($_)
+        $code = 1
+    }
+    [Console]::Out.Write("`n$token $code`n")
+    [Console]::Out.Flush()
+    [Console]::Error.Write("`n$token`n")
+    [Console]::Error.Flush()
+}
+'''
+
+
+def get_host_args(interpreter, executable):
+    """Returns the command line starting a host for the interpreter."""
+    if interpreter == INTERPRETER_BASH:
+        return [executable, '-c', _BASH_HOST]
+    elif interpreter == INTERPRETER_PYTHON:
+        return [executable, '-u', '-c', _PYTHON_HOST]
+    elif interpreter == INTERPRETER_POWERSHELL:
+        return [executable, '-NoProfile', '-NonInteractive',
+                '-ExecutionPolicy', 'RemoteSigned', '-EncodedCommand',
+                base64.b64encode(_POWERSHELL_HOST.encode('utf-16-le'))]
+    raise ValueError('Unsupported interpreter: %s' % interpreter)
+
+
+class InterpreterHostException(Exception):
+    pass
+
+
+class InterpreterHost(object):
+    """Long running interpreter executing scripts one at a time."""
+
+    def __init__(self, args, kill_process_tree=None):
+        self._kill_process_tree = kill_process_tree
+        self._lock = threading.Lock()
+        self._failed = False
+        self._process = subprocess.Popen(args,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        LOG.debug('Started interpreter host %(pid)d: %(executable)s' %
+                  {'pid': self._process.pid, 'executable': args[0]})
+        self._queues = {}
+        for name in ['stdout', 'stderr']:
+            self._queues[name] = Queue.Queue()
+            threadpool.start_thread(self._read_output,
+                                    getattr(self._process, name),
+                                    self._queues[name])
+
+    def _read_output(self, stream, queue):
+        for line in iter(lambda: stream.readline(_MAX_LINE_SIZE), ''):
+            queue.put(line)
+        stream.close()
+        # End of output
+        queue.put(None)
+
+    def is_alive(self):
+        return not self._failed and self._process.poll() is None
+
+    def _read_script_output(self, name, token, buf, deadline):
+        pending_line_ending = ''
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0)
+            try:
+                line = self._queues[name].get(timeout=timeout)
+            except Queue.Empty:
+                line = None
+                ex = InterpreterHostException('Script timed out')
+            else:
+                ex = InterpreterHostException('Interpreter host ended')
+            if line is None:
+                # No token follows, the last line ending is part of the output
+                buf.write(pending_line_ending)
+                raise ex
+
+            content = line.rstrip('\r\n')
+            if content.split(' ')[0] == token:
+                # The line ending preceding the token is written by the host
+                return content[len(token) + 1:]
+
+            LOG.debug('Interpreter host %(pid)d %(name)s: %(line)s' %
+                      {'pid': self._process.pid, 'name': name,
+                       'line': content})
+            buf.write(pending_line_ending + content)
+            pending_line_ending = line[len(content):]
+
+    def _kill(self):
+        self._failed = True
+        try:
+            if not self._kill_process_tree:
+                raise NotImplementedError()
+            self._kill_process_tree(self._process.pid)
+        except Exception:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+        return self._process.wait()
+
+    def execute(self, script_path, timeout=None, output_max_size=None):
+        """Returns the (stdout, stderr, exit_code) tuple of a script."""
+        if timeout is None:
+            timeout = CONF.process_timeout
+        if output_max_size is None:
+            output_max_size = CONF.process_output_max_size
+
+        out_buf = processexecutor.OutputBuffer(output_max_size)
+        err_buf = processexecutor.OutputBuffer(output_max_size)
+        token = binascii.hexlify(os.urandom(16))
+        deadline = time.time() + timeout if timeout else None
+
+        with self._lock:
+            if not self.is_alive():
+                raise InterpreterHostException('Interpreter host not running')
+            try:
+                self._process.stdin.write('%s %s\n' % (token, script_path))
+                self._process.stdin.flush()
+
+                exit_code = int(self._read_script_output(
+                    'stdout', token, out_buf, deadline))
+                self._read_script_output('stderr', token, err_buf, deadline)
+            except (InterpreterHostException, IOError, ValueError), ex:
+                # The host is recycled, the next script starts a new one
+                LOG.warning('Interpreter host %(pid)d failed: %(ex)s' %
+                            {'pid': self._process.pid, 'ex': ex})
+                exit_code = self._kill()
+
+        return (out_buf.getvalue(), err_buf.getvalue(), exit_code)
+
+    def close(self):
+        with self._lock:
+            if self._process.poll() is not None:
+                return
+            # The host loop ends when its stdin is closed
+            self._process.stdin.close()
+            deadline = time.time() + _CLOSE_TIMEOUT
+            while self._process.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            if self._process.poll() is None:
+                self._kill()
+
+
+class InterpreterHostPool(object):
+    """Keeps one interpreter host per interpreter and executable."""
+
+    def __init__(self, kill_process_tree=None):
+        self._kill_process_tree = kill_process_tree
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _get_host(self, interpreter, executable):
+        key = (interpreter, executable)
+        with self._lock:
+            host = self._hosts.get(key)
+            if not host or not host.is_alive():
+                if host:
+                    LOG.info('Restarting the %s interpreter host' %
+                             interpreter)
+                host = InterpreterHost(get_host_args(interpreter, executable),
+                                       self._kill_process_tree)
+                self._hosts[key] = host
+            return host
+
+    def execute(self, interpreter, executable, script_path, timeout=None,
+                output_max_size=None):
+        host = self._get_host(interpreter, executable)
+        return host.execute(script_path, timeout, output_max_size)
+
+    def close(self):
+        with self._lock:
+            hosts = self._hosts.values()
+            self._hosts = {}
+        for host in hosts:
+            host.close()
@@ -0,0 +1,168 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import hashlib
+import hmac
+import imp
+import marshal
+import os
+import threading
+
+from cloudbaseinit.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ModuleCache(object):
+    """Loads Python modules from their source, compiling each one once.
+
+    Modules are identified by the SHA-256 hash of their source. The
+    bytecode is kept in cache_dir, if provided, so that the same source is
+    not compiled again on later boots, and the loaded modules are kept in
+    memory for the lifetime of the process.
+
+    As the cached bytecode is executed, cache_dir must already exist and
+    be accessible only by privileged users. Each entry is authenticated
+    with an HMAC, using a random key stored in cache_dir, and entries
+    failing the check are compiled again.
+    """
+
+    _BYTECODE_EXT = '.pyc'
+    _KEY_FILE_NAME = 'cache.key'
+    _KEY_SIZE = 32
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        self._key = None
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_hash(source):
+        return hashlib.sha256(source).hexdigest()
+
+    def _get_bytecode_path(self, source_hash):
+        return os.path.join(self._cache_dir, source_hash + self._BYTECODE_EXT)
+
+    def _create_key(self, path):
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                     getattr(os, 'O_BINARY', 0), 0600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(os.urandom(self._KEY_SIZE))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            # Another process created the key in the meantime
+            if not os.path.exists(path):
+                raise
+
+    def _get_key(self):
+        if self._key is None:
+            path = os.path.join(self._cache_dir, self._KEY_FILE_NAME)
+            if not os.path.exists(path):
+                self._create_key(path)
+            with open(path, 'rb') as f:
+                key = f.read()
+            if len(key) != self._KEY_SIZE:
+                raise ValueError('Invalid cache key file: \'%s\'' % path)
+            self._key = key
+        return self._key
+
+    def _get_digest(self, source_hash, data):
+        # The source hash is authenticated as well, so that a valid entry
+        # cannot be used in place of another one
+        return hmac.new(self._get_key(), source_hash + data,
+                        hashlib.sha256).digest()
+
+    def _read_bytecode(self, source_hash):
+        path = self._get_bytecode_path(source_hash)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError, ex:
+            if ex.errno != errno.ENOENT:
+                raise
+            return None
+
+        digest_size = hashlib.sha256().digest_size
+        data, digest = data[digest_size:], data[:digest_size]
+        if not hmac.compare_digest(digest,
+                                   self._get_digest(source_hash, data)):
+            LOG.warning('Ignoring unauthenticated cached bytecode: \'%s\'' %
+                        path)
+            return None
+
+        magic = imp.get_magic()
+        if data[:len(magic)] != magic:
+            LOG.debug('Ignoring bytecode compiled by another Python version: '
+                      '\'%s\'' % path)
+            return None
+        try:
+            return marshal.loads(data[len(magic):])
+        except (EOFError, ValueError, TypeError), ex:
+            LOG.warning('Invalid cached bytecode \'%(path)s\': %(ex)s' %
+                        {'path': path, 'ex': ex})
+            return None
+
+    def _write_bytecode(self, source_hash, code):
+        data = imp.get_magic() + marshal.dumps(code)
+        path = self._get_bytecode_path(source_hash)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._get_digest(source_hash, data))
+            f.write(data)
+        # os.rename does not overwrite existing files on Windows
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+    def _get_code(self, source, source_hash, filename):
+        code = None
+        if self._cache_dir:
+            try:
+                code = self._read_bytecode(source_hash)
+            except (IOError, OSError, ValueError), ex:
+                LOG.warning('Failed to read the cached bytecode of module '
+                            '\'%(filename)s\': %(ex)s' %
+                            {'filename': filename, 'ex': ex})
+        if code is None:
+            LOG.debug('Compiling module: \'%s\'' % filename)
+            code = compile(source.replace('\r\n', '\n'), filename, 'exec')
+            if self._cache_dir:
+                try:
+                    self._write_bytecode(source_hash, code)
+                except (IOError, OSError, ValueError), ex:
+                    LOG.warning('Failed to cache the bytecode of module '
+                                '\'%(filename)s\': %(ex)s' %
+                                {'filename': filename, 'ex': ex})
+        return code
+
+    def load_source(self, source, filename):
+        source_hash = self._get_hash(source)
+        with self._lock:
+            module = self._modules.get(source_hash)
+            if not module:
+                module_name = os.path.splitext(os.path.basename(filename))[0]
+                code = self._get_code(source, source_hash, filename)
+
+                module = imp.new_module(module_name)
+                module.__file__ = filename
+                exec code in module.__dict__
+                self._modules[source_hash] = module
+        return module
@@ -0,0 +1,317 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import binascii
+import re
+import zlib
+
+from email import parser
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import compression
+
+LOG = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+
+_STATE_HEADERS = 0
+_STATE_BODY = 1
+# Preamble and epilogue lines are skipped
+_STATE_SKIP = 2
+
+
+class MimePart(object):
+    """Headers and decoded payload of a MIME part.
+
+    Provides the subset of the email.message.Message interface used by the
+    user data plugins. The payload of multipart containers is None.
+    """
+
+    def __init__(self, headers, payload):
+        self._headers = headers
+        self._payload = payload
+
+    def get(self, name, failobj=None):
+        return self._headers.get(name, failobj)
+
+    def get_content_type(self):
+        return self._headers.get_content_type()
+
+    def get_filename(self, failobj=None):
+        return self._headers.get_filename(failobj)
+
+    def get_param(self, param, failobj=None):
+        return self._headers.get_param(param, failobj)
+
+    def is_multipart(self):
+        return self._payload is None
+
+    def get_payload(self):
+        return self._payload
+
+
+class _IdentityDecoder(object):
+    def decode(self, data):
+        return data
+
+    def flush(self):
+        return ''
+
+
+class _Base64Decoder(object):
+    def __init__(self):
+        self._pending = ''
+
+    def decode(self, data):
+        # Only whole 4 characters groups can be decoded
+        data = self._pending + re.sub(r'\s+', '', data)
+        size = len(data) // 4 * 4
+        self._pending = data[size:]
+        return binascii.a2b_base64(data[:size]) if size else ''
+
+    def flush(self):
+        data = self._pending
+        self._pending = ''
+        if not data:
+            return ''
+        try:
+            return binascii.a2b_base64(data + '=' * (-len(data) % 4))
+        except binascii.Error, ex:
+            LOG.warning('Ignoring invalid base64 data: %s' % ex)
+            return ''
+
+
+class _QuotedPrintableDecoder(object):
+    def __init__(self):
+        self._pending = ''
+
+    def decode(self, data):
+        # Soft line breaks are decoded only along with their line ending
+        data = self._pending + data
+        pos = data.rfind('\n') + 1
+        self._pending = data[pos:]
+        return binascii.a2b_qp(data[:pos])
+
+    def flush(self):
+        data = self._pending
+        self._pending = ''
+        return binascii.a2b_qp(data)
+
+
+class _GzipDecoder(object):
+    """Decompresses the payload if it starts with the gzip magic bytes."""
+
+    def __init__(self, decoder, max_size):
+        self._decoder = decoder
+        self._max_size = max_size
+        self._header = ''
+        self._decompressor = None
+        self._detected = False
+
+    def _decompress(self, data):
+        if not self._detected:
+            data = self._header + data
+            if len(data) < len(compression.GZIP_MAGIC):
+                self._header = data
+                return ''
+            self._header = ''
+            self._detected = True
+            if compression.is_gzip(data):
+                self._decompressor = compression.GzipDecompressor(
+                    self._max_size)
+
+        if self._decompressor and data:
+            return self._decompressor.decompress(data)
+        return data
+
+    def decode(self, data):
+        return self._decompress(self._decoder.decode(data))
+
+    def flush(self):
+        data = self._decompress(self._decoder.flush())
+        if not self._detected:
+            # Payloads shorter than the magic bytes
+            data = self._header
+        elif self._decompressor:
+            data += self._decompressor.flush()
+        return data
+
+
+def _get_decoder(transfer_encoding, max_decompressed_size):
+    transfer_encoding = (transfer_encoding or '').strip().lower()
+    if transfer_encoding == 'base64':
+        decoder = _Base64Decoder()
+    elif transfer_encoding == 'quoted-printable':
+        decoder = _QuotedPrintableDecoder()
+    else:
+        decoder = _IdentityDecoder()
+    return _GzipDecoder(decoder, max_decompressed_size)
+
+
+def _split_line_ending(line):
+    if line.endswith('\r\n'):
+        return (line[:-2], '\r\n')
+    elif line.endswith('\n'):
+        return (line[:-1], '\n')
+    return (line, '')
+
+
+class MultipartFeedParser(object):
+    """Incremental MIME parser returning each part as soon as it ends.
+
+    Unlike email.feedparser.FeedParser, no message tree is kept: the
+    decoded payload of a part is held only until the part is returned.
+    Multipart containers, including nested ones, are returned before their
+    parts, in the same order as email.message.Message.walk().
+
+    Gzip compressed payloads are decompressed, up to max_decompressed_size
+    bytes per part. Parts exceeding it are skipped.
+    """
+
+    def __init__(self, max_decompressed_size=None):
+        self._max_decompressed_size = max_decompressed_size
+        self._part_failed = False
+        self._buffer = ''
+        self._boundaries = []
+        self._state = _STATE_HEADERS
+        self._header_lines = []
+        self._headers = None
+        self._decoder = None
+        self._payload = []
+        self._pending_line_ending = ''
+        self._parts = []
+
+    def _get_completed_parts(self):
+        parts = self._parts
+        self._parts = []
+        return parts
+
+    def feed(self, data):
+        """Parses data, returning the list of the parts completed by it."""
+        lines = (self._buffer + data).split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line + '\n')
+        return self._get_completed_parts()
+
+    def close(self):
+        """Returns the remaining parts, including an unterminated one."""
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ''
+        self._end_part(at_boundary=False)
+        self._state = _STATE_SKIP
+        return self._get_completed_parts()
+
+    def _match_boundary(self, line):
+        line = line.rstrip()
+        # The innermost boundary is the most likely
+        for i in reversed(range(len(self._boundaries))):
+            delimiter = '--' + self._boundaries[i]
+            if line == delimiter:
+                return (i, False)
+            elif line == delimiter + '--':
+                return (i, True)
+        return (None, False)
+
+    def _parse_line(self, line):
+        if self._boundaries and line.startswith('--'):
+            (index, is_close) = self._match_boundary(line)
+            if index is not None:
+                self._end_part()
+                # Closes any nested multipart left unterminated
+                del self._boundaries[index + 1:]
+                if is_close:
+                    self._boundaries.pop()
+                    self._state = _STATE_SKIP
+                else:
+                    self._state = _STATE_HEADERS
+                return
+
+        if self._state == _STATE_HEADERS:
+            if line.strip():
+                self._header_lines.append(line)
+            else:
+                self._start_part()
+        elif self._state == _STATE_BODY:
+            (content, line_ending) = _split_line_ending(line)
+            # The line ending preceding a boundary belongs to the boundary
+            self._decode(self._pending_line_ending + content)
+            self._pending_line_ending = line_ending
+
+    def _start_part(self):
+        headers = parser.HeaderParser().parsestr(''.join(self._header_lines))
+        self._header_lines = []
+
+        boundary = headers.get_param('boundary')
+        if headers.get_content_maintype() == 'multipart' and boundary:
+            self._parts.append(MimePart(headers, None))
+            self._boundaries.append(boundary)
+            self._state = _STATE_SKIP
+        else:
+            self._headers = headers
+            self._decoder = _get_decoder(
+                headers.get('Content-Transfer-Encoding'),
+                self._max_decompressed_size)
+            self._state = _STATE_BODY
+
+    def _decode(self, data, flush=False):
+        if self._part_failed:
+            return
+        try:
+            if data:
+                data = self._decoder.decode(data)
+            if flush:
+                data += self._decoder.flush()
+        except (compression.DecompressedSizeExceededException,
+                zlib.error), ex:
+            LOG.error('Skipping MIME part %(content_type)s, %(filename)s: '
+                      '%(ex)s' %
+                      {'content_type': self._headers.get_content_type(),
+                       'filename': self._headers.get_filename(),
+                       'ex': ex})
+            self._part_failed = True
+            self._payload = []
+            return
+        if data:
+            self._payload.append(data)
+
+    def _end_part(self, at_boundary=True):
+        if self._state == _STATE_HEADERS and self._header_lines:
+            # Part without body
+            self._start_part()
+        if self._state != _STATE_BODY:
+            return
+
+        self._decode('' if at_boundary else self._pending_line_ending,
+                     flush=True)
+        if not self._part_failed:
+            self._parts.append(MimePart(self._headers,
+                                        ''.join(self._payload)))
+
+        self._part_failed = False
+        self._headers = None
+        self._decoder = None
+        self._payload = []
+        self._pending_line_ending = ''
+
+
+def iter_parts(data, chunk_size=_CHUNK_SIZE, max_decompressed_size=None):
+    """Yields the MIME parts of data as they are parsed."""
+    feed_parser = MultipartFeedParser(max_decompressed_size)
+    for offset in range(0, len(data), chunk_size):
+        for part in feed_parser.feed(data[offset:offset + chunk_size]):
+            yield part
+    for part in feed_parser.close():
+        yield part
@@ -0,0 +1,192 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import subprocess
+import threading
+import time
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import threadpool
+from cloudbaseinit.utils import tracing
+
+opts = [
+    cfg.IntOpt('process_timeout', default=0,
+               help='Max. number of seconds a process can run before it is '
+               'killed along with its child processes. Set to 0 (default) '
+               'to wait indefinitely.'),
+    cfg.IntOpt('process_output_max_size', default=1024 * 1024,
+               help='Max. number of bytes of stdout and of stderr kept for '
+               'each process. Older output is discarded, but all the lines '
+               'are logged as they are produced.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = logging.getLogger(__name__)
+
+# Time given to the output readers to drain the pipes after a process ends
+_READER_JOIN_TIMEOUT = 10
+# Longer lines, e.g. progress output without line feeds, are split
+_MAX_LINE_SIZE = 64 * 1024
+
+
+def get_executable(args):
+    # Only the executable is traced or logged, the arguments can contain
+    # secrets, e.g. the password passed to "NET USER"
+    if isinstance(args, basestring):
+        args = args.split()
+    if args:
+        return args[0]
+
+
+class OutputBuffer(object):
+    """Ring buffer keeping the last max_size bytes written to it."""
+
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._chunks = collections.deque()
+        self._size = 0
+        self._total_size = 0
+
+    def write(self, data):
+        with self._lock:
+            self._chunks.append(data)
+            self._size += len(data)
+            self._total_size += len(data)
+            while (self._chunks and
+                   self._size - len(self._chunks[0]) >= self._max_size):
+                self._size -= len(self._chunks.popleft())
+
+    def get_total_size(self):
+        return self._total_size
+
+    def is_truncated(self):
+        return self._total_size > self._max_size
+
+    def getvalue(self):
+        with self._lock:
+            data = ''.join(self._chunks)
+        return data[-self._max_size:] if self._max_size else ''
+
+
+class ProcessExecutor(object):
+    """Runs processes streaming their output lines to the log.
+
+    stdout and stderr are read line by line by dedicated threads, so
+    neither pipe can fill up and block the process, and only the last
+    output_max_size bytes of each are kept. Processes still running after
+    timeout seconds are killed with kill_process_tree(pid), falling back to
+    killing the process itself.
+    """
+
+    def __init__(self, kill_process_tree=None, timeout=None,
+                 output_max_size=None):
+        self._kill_process_tree = kill_process_tree
+        self._timeout = timeout
+        self._output_max_size = output_max_size
+
+    def _read_output(self, stream, buf, name, pid):
+        for line in iter(lambda: stream.readline(_MAX_LINE_SIZE), ''):
+            buf.write(line)
+            LOG.debug('Process %(pid)d %(name)s: %(line)s' %
+                      {'pid': pid, 'name': name, 'line': line.rstrip()})
+        stream.close()
+
+    def _kill(self, p, status):
+        # Polling here would race with the wait in execute()
+        if p.returncode is not None:
+            return
+        status['timed_out'] = True
+        LOG.warning('Process %(pid)d timed out after %(timeout)d seconds, '
+                    'killing it' %
+                    {'pid': p.pid, 'timeout': status['timeout']})
+        try:
+            if not self._kill_process_tree:
+                raise NotImplementedError()
+            self._kill_process_tree(p.pid)
+        except Exception, ex:
+            if not isinstance(ex, NotImplementedError):
+                LOG.warning('Failed to kill the process tree of %(pid)d: '
+                            '%(ex)s' % {'pid': p.pid, 'ex': ex})
+            try:
+                p.kill()
+            except OSError:
+                # The process ended in the meantime
+                pass
+
+    def execute(self, args, shell=True):
+        """Returns the (stdout, stderr, exit_code) tuple of a process."""
+        timeout = self._timeout
+        if timeout is None:
+            timeout = CONF.process_timeout
+        output_max_size = self._output_max_size
+        if output_max_size is None:
+            output_max_size = CONF.process_output_max_size
+
+        with tracing.span('execute_process', 'process',
+                          executable=get_executable(args)) as span:
+            start_time = time.time()
+            p = subprocess.Popen(args,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE,
+                                 shell=shell)
+            out_buf = OutputBuffer(output_max_size)
+            err_buf = OutputBuffer(output_max_size)
+            readers = [
+                threadpool.start_thread(self._read_output, p.stdout,
+                                        out_buf, 'stdout', p.pid),
+                threadpool.start_thread(self._read_output, p.stderr,
+                                        err_buf, 'stderr', p.pid),
+            ]
+
+            status = {'timed_out': False, 'timeout': timeout}
+            timer = None
+            if timeout:
+                timer = threading.Timer(timeout, self._kill, [p, status])
+                timer.daemon = True
+                timer.start()
+            try:
+                exit_code = p.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+
+            for reader in readers:
+                # Child processes inheriting the pipes can keep them open
+                reader.join(_READER_JOIN_TIMEOUT)
+            duration = time.time() - start_time
+
+            span.set_arg('exit_code', exit_code)
+            span.set_arg('timed_out', status['timed_out'])
+            span.set_arg('stdout_size', out_buf.get_total_size())
+            span.set_arg('stderr_size', err_buf.get_total_size())
+
+        LOG.debug('Process %(pid)d ended with exit code %(exit_code)d in '
+                  '%(duration).3f seconds, output: %(out_size)d bytes on '
+                  'stdout, %(err_size)d bytes on stderr' %
+                  {'pid': p.pid, 'exit_code': exit_code, 'duration': duration,
+                   'out_size': out_buf.get_total_size(),
+                   'err_size': err_buf.get_total_size()})
+        for (name, buf) in [('stdout', out_buf), ('stderr', err_buf)]:
+            if buf.is_truncated():
+                LOG.info('Only the last %(max_size)d bytes of the process '
+                         '%(name)s are kept' %
+                         {'max_size': output_max_size, 'name': name})
+
+        return (out_buf.getvalue(), err_buf.getvalue(), exit_code)
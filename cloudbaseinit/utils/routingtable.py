@@ -0,0 +1,141 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import array
+import collections
+import socket
+import struct
+import sys
+
+Route = collections.namedtuple(
+    'Route',
+    ['destination', 'mask', 'next_hop', 'interface_index', 'metric'])
+
+# MIB_IPFORWARDROW is made of 14 DWORDs, the following are the offsets of
+# the fields used here
+_MIB_IPFORWARDROW_SIZE = 14
+_MIB_DEST = 0
+_MIB_MASK = 1
+_MIB_NEXT_HOP = 3
+_MIB_IF_INDEX = 4
+_MIB_METRIC1 = 9
+
+# 32 bit unsigned integers on all the supported platforms
+_ARRAY_TYPECODE = 'I'
+
+
+def ip_to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class RoutingTable(object):
+    """Immutable snapshot of an IPv4 routing table.
+
+    The routes are stored in packed arrays of integers in host byte order
+    and indexed by destination, for exact matches, and by mask, for
+    longest prefix matches.
+    """
+
+    def __init__(self, destinations, masks, next_hops, interface_indexes,
+                 metrics):
+        self._destinations = array.array(_ARRAY_TYPECODE, destinations)
+        self._masks = array.array(_ARRAY_TYPECODE, masks)
+        self._next_hops = array.array(_ARRAY_TYPECODE, next_hops)
+        self._interface_indexes = array.array(_ARRAY_TYPECODE,
+                                              interface_indexes)
+        self._metrics = array.array(_ARRAY_TYPECODE, metrics)
+        self._build_indexes()
+
+    @classmethod
+    def from_routes(cls, routes):
+        """Creates a table from (destination, mask, next hop, interface
+        index, metric) tuples, with addresses in dotted decimal notation.
+        """
+        routes = list(routes)
+        return cls([ip_to_int(r[0]) for r in routes],
+                   [ip_to_int(r[1]) for r in routes],
+                   [ip_to_int(r[2]) for r in routes],
+                   [r[3] for r in routes],
+                   [r[4] for r in routes])
+
+    @classmethod
+    def from_mib_ipforwardrows(cls, data, num_entries):
+        """Creates a table from a buffer of MIB_IPFORWARDROW structs."""
+        data = data[:num_entries * _MIB_IPFORWARDROW_SIZE * 4]
+        values = array.array(_ARRAY_TYPECODE, data)
+        # Addresses are in network byte order
+        addresses = array.array(_ARRAY_TYPECODE, data)
+        if sys.byteorder == 'little':
+            addresses.byteswap()
+
+        size = _MIB_IPFORWARDROW_SIZE
+        return cls(addresses[_MIB_DEST::size],
+                   addresses[_MIB_MASK::size],
+                   addresses[_MIB_NEXT_HOP::size],
+                   values[_MIB_IF_INDEX::size],
+                   values[_MIB_METRIC1::size])
+
+    def _build_indexes(self):
+        self._destination_index = {}
+        mask_indexes = {}
+        for i in xrange(len(self._destinations)):
+            destination = self._destinations[i]
+            mask = self._masks[i]
+            self._destination_index.setdefault(destination, []).append(i)
+
+            network_index = mask_indexes.setdefault(mask, {})
+            network = destination & mask
+            j = network_index.get(network)
+            # The route with the lowest metric wins, then the first one
+            if j is None or self._metrics[i] < self._metrics[j]:
+                network_index[network] = i
+
+        # Masks are sorted from the longest to the shortest prefix
+        self._mask_indexes = sorted(
+            mask_indexes.items(), key=lambda m: bin(m[0]).count('1'),
+            reverse=True)
+
+    def _get_route(self, i):
+        return Route(int_to_ip(self._destinations[i]),
+                     int_to_ip(self._masks[i]),
+                     int_to_ip(self._next_hops[i]),
+                     self._interface_indexes[i],
+                     self._metrics[i])
+
+    def __len__(self):
+        return len(self._destinations)
+
+    def __iter__(self):
+        for i in xrange(len(self._destinations)):
+            yield self._get_route(i)
+
+    def get_routes(self, destination):
+        """Returns the routes with the given destination, in table order."""
+        return [self._get_route(i) for i in
+                self._destination_index.get(ip_to_int(destination), [])]
+
+    def has_destination(self, destination):
+        return ip_to_int(destination) in self._destination_index
+
+    def lookup(self, address):
+        """Returns the route used to reach the given address, or None."""
+        address = ip_to_int(address)
+        for (mask, network_index) in self._mask_indexes:
+            i = network_index.get(address & mask)
+            if i is not None:
+                return self._get_route(i)
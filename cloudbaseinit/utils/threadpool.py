@@ -0,0 +1,43 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+import threading
+
+from multiprocessing import pool
+
+
+def _init_worker_thread():
+    if sys.platform == 'win32':
+        # COM based APIs (e.g. WMI) require COM to be initialized
+        # on every thread using them
+        import pythoncom
+        pythoncom.CoInitialize()
+
+
+def get_thread_pool(max_workers):
+    return pool.ThreadPool(max_workers, _init_worker_thread)
+
+
+def start_thread(target, *args):
+    # Unlike pool workers, the thread keeps running regardless of the
+    # lifetime of the caller
+    def _run():
+        _init_worker_thread()
+        target(*args)
+
+    thread = threading.Thread(target=_run)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,159 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import threading
+import time
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+
+opts = [
+    cfg.StrOpt('trace_file', default=None,
+               help='File where the boot timeline is saved in the Chrome '
+               'trace event format, e.g. for viewing it in '
+               'chrome://tracing. Set to None (default) to disable.'),
+    cfg.BoolOpt('trace_log_summary', default=False,
+                help='Logs a summary of the boot timeline, including the '
+                'duration of each traced operation'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_events = []
+
+
+def is_enabled():
+    return bool(CONF.trace_file or CONF.trace_log_summary)
+
+
+def _get_timestamp():
+    # Trace event timestamps are expressed in microseconds
+    return int(time.time() * 1000000)
+
+
+def _add_event(event):
+    event['pid'] = os.getpid()
+    event['tid'] = threading.current_thread().ident
+    with _lock:
+        _events.append(event)
+
+
+class _Span(object):
+    def __init__(self, name, category, args):
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = None
+
+    def set_arg(self, name, value):
+        self._args[name] = value
+
+    def __enter__(self):
+        self._start = _get_timestamp()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type:
+            self._args['error'] = repr(exc_value)
+        _add_event({'name': self._name,
+                    'cat': self._category,
+                    'ph': 'X',
+                    'ts': self._start,
+                    'dur': _get_timestamp() - self._start,
+                    'args': self._args})
+
+
+class _NullSpan(object):
+    def set_arg(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+def span(name, category='cloudbaseinit', **kwargs):
+    if not is_enabled():
+        return _null_span
+    return _Span(name, category, kwargs)
+
+
+def counter(name, category='cloudbaseinit', **values):
+    # Counter events are displayed as a chart of their values over time
+    if is_enabled():
+        _add_event({'name': name,
+                    'cat': category,
+                    'ph': 'C',
+                    'ts': _get_timestamp(),
+                    'args': values})
+
+
+def get_events():
+    with _lock:
+        return list(_events)
+
+
+def clear():
+    with _lock:
+        del _events[:]
+
+
+def _write_trace_file(path, events):
+    with open(path, 'wb') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def _log_summary(events):
+    spans = sorted([e for e in events if e['ph'] == 'X'],
+                   key=lambda e: e['ts'])
+    if not spans:
+        return
+
+    start = spans[0]['ts']
+    LOG.info('Boot timeline summary:')
+    for e in spans:
+        LOG.info('%(offset)10.3fs %(duration)10.3fs  %(name)s' %
+                 {'offset': (e['ts'] - start) / 1000000.0,
+                  'duration': e['dur'] / 1000000.0,
+                  'name': e['name']})
+
+
+def save():
+    if not is_enabled():
+        return
+
+    events = get_events()
+    if CONF.trace_log_summary:
+        _log_summary(events)
+
+    if CONF.trace_file:
+        try:
+            _write_trace_file(CONF.trace_file, events)
+            LOG.debug('Boot timeline saved to: \'%s\'' % CONF.trace_file)
+        except Exception, ex:
+            LOG.error('Failed to save the boot timeline to \'%s\'' %
+                      CONF.trace_file)
+            LOG.exception(ex)
@@ -0,0 +1,145 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import re
+import threading
+import time
+
+from oslo.config import cfg
+
+from cloudbaseinit.openstack.common import log as logging
+from cloudbaseinit.utils import tracing
+
+opts = [
+    cfg.FloatOpt('wmi_query_cache_ttl', default=0,
+                 help='Number of seconds the results of read-only WMI '
+                 'queries, e.g. on Win32_DiskDrive or Win32_NetworkAdapter, '
+                 'are cached. Set to 0 (default) to disable.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = logging.getLogger(__name__)
+
+CIMV2_MONIKER = '//./root/cimv2'
+
+_WQL_CLASS_REGEX = re.compile(r'\bFROM\s+(\w+)', re.IGNORECASE)
+
+
+class WMIResult(object):
+    """Property values of a WMI object, usable from any thread."""
+
+    def __init__(self, **properties):
+        self.__dict__.update(properties)
+
+
+class WMISession(object):
+    """Process wide access to a WMI namespace.
+
+    COM objects cannot be shared across threads, so each thread lazily
+    opens its own connection, which is then reused for all its queries.
+    Read-only queries returning property values can be cached for
+    wmi_query_cache_ttl seconds, callers changing the queried objects
+    must invalidate the cache of the related classes.
+    """
+
+    def __init__(self, moniker=CIMV2_MONIKER):
+        self._moniker = moniker
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import wmi
+            LOG.debug('Connecting to WMI namespace: \'%s\'' % self._moniker)
+            with tracing.span('wmi connect', 'wmi', moniker=self._moniker):
+                conn = wmi.WMI(moniker=self._moniker)
+            self._local.conn = conn
+        return conn
+
+    def query(self, wql):
+        return self.get_connection().query(wql)
+
+    def _query_properties(self, wql, properties):
+        return [WMIResult(**dict([(p, getattr(r, p)) for p in properties]))
+                for r in self.query(wql)]
+
+    def _get_cached(self, wql, properties):
+        key = (wql, tuple(properties))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.time():
+                self._hits += 1
+                result = entry[1]
+            else:
+                self._misses += 1
+                result = None
+            tracing.counter('wmi query cache', 'wmi', hits=self._hits,
+                            misses=self._misses)
+        return (key, result)
+
+    def query_properties(self, wql, properties):
+        """Returns the given properties of the objects matching the query.
+
+        The results are WMIResult objects and are cached when
+        wmi_query_cache_ttl is set.
+        """
+        if not CONF.wmi_query_cache_ttl:
+            return self._query_properties(wql, properties)
+
+        (key, result) = self._get_cached(wql, properties)
+        if result is None:
+            result = self._query_properties(wql, properties)
+            with self._lock:
+                self._cache[key] = (time.time() + CONF.wmi_query_cache_ttl,
+                                    result)
+        return list(result)
+
+    def invalidate(self, *class_names):
+        """Removes the cached queries on the given classes, or all."""
+        class_names = set([c.lower() for c in class_names])
+        with self._lock:
+            for key in self._cache.keys():
+                match = _WQL_CLASS_REGEX.search(key[0])
+                if (not class_names or not match or
+                        match.group(1).lower() in class_names):
+                    del self._cache[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if not _session:
+            _session = WMISession()
+        return _session
+
+
+def reset():
+    # Drops the connections and cached results, e.g. between unit tests
+    global _session
+    with _session_lock:
+        _session = None
@@ -0,0 +1,98 @@
+# Copyright 2014 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the config drive extraction throughput of the block reader.
+
+Usage (from the source root):
+
+    PYTHONPATH=. python tools/bench_block_reader.py [image MB] [chunk KB]
+
+A config drive image is generated in a temporary folder and its files
+are extracted twice: reading 4 KB at a time with a seek and a new buffer
+per read, as done by the former raw disk code, and with the BlockReader.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from cloudbaseinit.metadata.services.configdrive import blocksource
+from cloudbaseinit.metadata.services.configdrive import iso9660
+from cloudbaseinit.tests.metadata.services.configdrive import fake_iso_image
+
+MB = 1024 * 1024
+
+
+class UnbufferedFileBlockSource(blocksource.BaseBlockSource):
+    def __init__(self, path, read_size=4096):
+        self._file = open(path, 'rb')
+        self._read_size = read_size
+
+    def read_at(self, offset, size):
+        data = []
+        end = offset + size
+        while offset < end:
+            self._file.seek(offset)
+            buf = bytearray(self._read_size)
+            bytes_read = self._file.readinto(buf)
+            if not bytes_read:
+                break
+            data.append(str(buf[:min(bytes_read, end - offset)]))
+            offset += bytes_read
+        return ''.join(data)
+
+    def close(self):
+        self._file.close()
+
+
+def _extract(block_source, target_path):
+    start = time.time()
+    try:
+        iso9660.ISO9660Reader(block_source).extract(target_path)
+    finally:
+        block_source.close()
+    return time.time() - start
+
+
+def main():
+    image_size = int(sys.argv[1]) * MB if len(sys.argv) > 1 else 64 * MB
+    chunk_size = (int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else
+                  blocksource.BlockReader.DEFAULT_CHUNK_SIZE)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        image_path = os.path.join(tmp_dir, 'config-drive.iso')
+        files = {'openstack/latest/meta_data.json': '{}',
+                 'openstack/content/0000': os.urandom(image_size)}
+        with open(image_path, 'wb') as f:
+            f.write(fake_iso_image.build_iso_image(files))
+
+        benchmarks = [
+            ('4 KB reads', lambda: UnbufferedFileBlockSource(image_path)),
+            ('BlockReader, %d KB chunks' % (chunk_size / 1024),
+             lambda: blocksource.BlockReader(
+                 blocksource.FileBlockDevice(image_path), chunk_size))]
+
+        for (i, (name, get_block_source)) in enumerate(benchmarks):
+            duration = _extract(get_block_source(),
+                                os.path.join(tmp_dir, str(i)))
+            print('%-30s %8.1f MB/s' % (name, image_size / MB / duration))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()